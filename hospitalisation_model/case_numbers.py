@@ -9,11 +9,11 @@ martin.bicher@dwh.at or visit
 https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
-import csv
 from datetime import datetime
 
 from config import Config
-from utils import TimeSeries, parse_date
+from csv_columns import CsvColumns
+from utils import TimeSeries, parse_dates
 
 
 class CaseNumbers:
@@ -29,25 +29,19 @@ class CaseNumbers:
         """
         self.cases = {i: TimeSeries(list(), list()) for i in range(config.get_column_number())}
         # load case numbers until "forecast_day"
-        with open(config.get_filename_case_numbers()) as f:
-            r = csv.reader(f, delimiter=';')
-            hdr = next(r)
-            inds = [hdr.index(x) for x in config.get_columns_case_numbers()]
-            for line in r:
-                day = parse_date(line[0])
-                if day <= config.get_forecast_day():
-                    for i in range(len(inds)):
-                        self.cases[i].append_value(day, float(line[inds[i]]))
+        columns = CsvColumns(config.get_filename_case_numbers())
+        values = [columns[x].tolist() for x in config.get_columns_case_numbers()]
+        for k, day in enumerate(parse_dates(columns[columns.header[0]])):
+            if day <= config.get_forecast_day():
+                for i in range(len(values)):
+                    self.cases[i].append_value(day, float(values[i][k]))
         # load case forecast from "forecast_day+1" onwards
-        with open(config.get_filename_forecast()) as f:
-            r = csv.reader(f, delimiter=';')
-            hdr = next(r)
-            inds = [hdr.index(x) for x in config.get_columns_forecast()]
-            for line in r:
-                day = parse_date(line[0])
-                if day > config.get_forecast_day():
-                    for i in range(len(inds)):
-                        self.cases[i].append_value(day, float(line[inds[i]]))
+        columns = CsvColumns(config.get_filename_forecast())
+        values = [columns[x].tolist() for x in config.get_columns_forecast()]
+        for k, day in enumerate(parse_dates(columns[columns.header[0]])):
+            if day > config.get_forecast_day():
+                for i in range(len(values)):
+                    self.cases[i].append_value(day, float(values[i][k]))
 
     def get_cases(self, index: int) -> TimeSeries:
         """
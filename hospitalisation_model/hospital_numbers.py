@@ -9,11 +9,11 @@ martin.bicher@dwh.at or visit
 https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
-import csv
 from datetime import datetime
 
 from config import Config
-from utils import TimeSeries, parse_date
+from csv_columns import CsvColumns
+from utils import TimeSeries, parse_dates
 
 
 class HospitalNumbers:
@@ -27,14 +27,11 @@ class HospitalNumbers:
         :param config: config instance
         """
         self.beds = {i: TimeSeries(list(), list()) for i in range(config.get_column_number())}
-        with open(config.get_filename_hospitalized()) as f:
-            r = csv.reader(f, delimiter=';')
-            hdr = next(r)
-            inds = [hdr.index(x) for x in config.get_columns_hospitalized()]
-            for line in r:
-                day = parse_date(line[0])
-                for i in range(len(inds)):
-                    self.beds[i].append_value(day, float(line[inds[i]]))
+        columns = CsvColumns(config.get_filename_hospitalized())
+        values = [columns[x].tolist() for x in config.get_columns_hospitalized()]
+        for k, day in enumerate(parse_dates(columns[columns.header[0]])):
+            for i in range(len(values)):
+                self.beds[i].append_value(day, float(values[i][k]))
 
     def get_beds(self, index: int) -> TimeSeries:
         """
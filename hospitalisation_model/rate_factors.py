@@ -9,10 +9,9 @@ martin.bicher@dwh.at or visit
 https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
-import csv
-
 from config import Config
-from utils import TimeSeries, parse_date
+from csv_columns import CsvColumns
+from utils import TimeSeries, parse_dates
 
 
 class RateFactors:
@@ -29,14 +28,11 @@ class RateFactors:
             self.rateFactors = {i: None for i in range(config.get_column_number())}
         else:
             self.rateFactors = {i: TimeSeries(list(), list(), default=1.0) for i in range(config.get_column_number())}
-            with open(config.get_filename_rate_factors()) as f:
-                r = csv.reader(f, delimiter=';')
-                hdr = next(r)
-                inds = [hdr.index(x) for x in config.get_columns_rate_factors()]
-                for line in r:
-                    day = parse_date(line[0])
-                    for i in range(len(inds)):
-                        self.rateFactors[i].append_value(day, float(line[inds[i]]))
+            columns = CsvColumns(config.get_filename_rate_factors())
+            values = [columns[x].tolist() for x in config.get_columns_rate_factors()]
+            for k, day in enumerate(parse_dates(columns[columns.header[0]])):
+                for i in range(len(values)):
+                    self.rateFactors[i].append_value(day, float(values[i][k]))
 
     def get_factors(self, index: int) -> TimeSeries:
         """
@@ -10,6 +10,7 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
 import datetime as dt
+import numpy as np
 
 
 class TimeSeries:
@@ -159,3 +160,14 @@ def parse_date(datestring: str) -> dt.date:
         except:
             print(datestring)
             raise ()
+
+
+def parse_dates(column: np.array) -> list[dt.date]:
+    """
+    convenience method to parse a whole column of dates, either already converted to datetime64 (see :class:CsvColumns) or given as date strings (see :func:parse_date)
+    :param column: array of dates or date strings
+    :return: list of dates
+    """
+    if np.issubdtype(column.dtype, np.datetime64):
+        return column.astype('datetime64[D]').tolist()
+    return [parse_date(str(x)) for x in column]
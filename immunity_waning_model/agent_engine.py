@@ -0,0 +1,141 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AggregateCounters
+from engine import Engine
+from event_calendar import EventCalendar
+from event_type import EventType
+from population import Population, NONE
+
+
+class AgentEngine(Engine):
+    def __init__(self,simulation,population:Population,calendar:EventCalendar,counters:AggregateCounters) -> None:
+        """
+        Reference engine distributing the daily cases and vaccinations by walking over the shuffled agents one by one.
+        :param simulation: simulation instance providing config and parameter classes
+        :param population: population store to operate on
+        :param calendar: event calendar to schedule the state changes of the agents
+        :param counters: aggregate counters to keep up to date when agents change their category
+        """
+        super().__init__(simulation,population,calendar,counters)
+        self.variantTargets = [self.observables.index(v) for v in self.variants] #observable column of each variant
+        self.order = np.arange(population.size) #agent indices in the order they are visited each day
+
+    def _immunize(self,p:int,cause:str,immDay:int,keepLater:bool) -> None:
+        """
+        Samples base immunity and immunity loss of an immunization event and schedules the immunization and loss dates of the agent.
+        :param p: index of the agent
+        :param cause: immunization cause, i.e. VACC1,2,.. or ALPHA,DELTA,...
+        :param immDay: day at which the agent becomes immune
+        :param keepLater: if true, a currently scheduled later immunity loss date is kept (recoveries), otherwise it is overwritten (vaccinations)
+        :return:
+        """
+        pop = self.pop
+        baseImm,loseDays = self.batchSampler.sample_immunization(cause,1)  # sample where the event leads to immunity at all and day of immunity loss
+        for k, bi, ld in zip(range(len(self.observables)), baseImm[0], loseDays[0]):
+            if bi:
+                pop.immDate[p,k] = immDay
+                lossDate = immDay + ld
+                # if the agent currently has a future immunity loss date defined, take the maximum
+                if keepLater and pop.lossDate[p,k]!=NONE:
+                    pop.lossDate[p,k] = max(pop.lossDate[p,k],lossDate)
+                else:
+                    pop.lossDate[p,k] = lossDate
+                self.calendar.schedule(EventType.StartImmune,immDay,p,k)
+                self.calendar.schedule(EventType.EndImmune,pop.lossDate[p,k],p,k)
+
+    def step(self,i:int,t:dt.datetime,cases:list[int],vaccinations:list[int]) -> np.array:
+        """
+        Distributes the cases and vaccinations of one day among the agents.
+        :param i: current simulation day
+        :param t: current date
+        :param cases: number of new detected and undetected cases
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: detected (re)infections of the day as matrix (previous variant x new variant), whereas the first row corresponds to no previous confirmed infection
+        """
+        pop = self.pop
+        c1,c2 = cases
+        v1,v2,v3,v4 = vaccinations
+        reinfections = np.zeros((len(self.variants)+1,len(self.variants)))
+        ratios = self.variantParameters.get_variant_ratio(t.date())
+
+        #shuffle the agent order - expensive but necessary
+        self.batchSampler.generator.shuffle(self.order)
+
+        #loop over agents
+        for p in self.order:
+            if c1==0 and c2==0 and v1==0 and v2==0 and v3==0 and v4==0:
+                break #state changes are applied via the event calendar, the summary is evaluated by the simulation
+            #as long as cases (c1,c2) or vaccines (v1,v2,v3) are available, we try to distribute them among the persons
+            if c1>0 and not pop.active[p]:
+                code = self.batchSampler.sample_variant_codes(ratios,1)[0]
+                cause = self.variants[code]
+                if pop.immune[p,self.variantTargets[code]]==False:
+                    self.counters.remove(p)
+                    pop.confDate[p] = i + self.batchSampler.sample_det_delays(1)[0] # day of detection
+                    rday = i + self.batchSampler.sample_recovery_delays(True,1)[0] # day of recovery
+                    pop.recDate[p] = rday
+                    self.calendar.schedule(EventType.SwitchUndetDet,pop.confDate[p],p)
+                    self.calendar.schedule(EventType.EndDetActive,rday,p)
+                    self._immunize(p,cause,rday,True) # render immune after recovery
+                    #state changes
+                    pop.conf[p] = False
+                    pop.active[p] = True
+                    reinfections[pop.variant[p]+1,code]+=1
+                    pop.variant[p] = code #variant is only CONFIRMED variant
+                    self.counters.add(p)
+                    c1-=1 #reduce number of confirmed infections
+            elif c2>0 and not pop.active[p]: #analogous to detected infections
+                code = self.batchSampler.sample_variant_codes(ratios,1)[0]
+                cause = self.variants[code]
+                if pop.immune[p,self.variantTargets[code]] == False:
+                    self.counters.remove(p)
+                    rday = i + self.batchSampler.sample_recovery_delays(False,1)[0]
+                    pop.recDate[p] = rday
+                    self.calendar.schedule(EventType.EndUndetActive,rday,p)
+                    self._immunize(p,cause,rday,True)
+                    pop.conf[p] = False
+                    pop.active[p] = True
+                    self.counters.add(p)
+                    c2-=1
+            elif pop.vacc[p]==0 and pop.active[p]==False and v1>0: #first vaccinations only for persons who are not active and are not vaccinated yet
+                self.counters.remove(p)
+                pop.vaccDate[p] = i
+                self._immunize(p,'VACC1',i + self.config.vaccDelay,False)
+                pop.vacc[p] = 1
+                self.counters.add(p)
+                v1 -= 1
+            elif pop.vacc[p]==1 and pop.active[p]== False and v2>0 and (i-pop.vaccDate[p])>self.config.vaccIntervals[0]: #second vaccinations only for persons who are not active, have already got a first shot, and time between vaccinations is at least x -days
+                self.counters.remove(p)
+                pop.vaccDate[p] = i
+                self._immunize(p,'VACC2',i + self.config.vaccDelay,False)
+                pop.vacc[p] = 2
+                self.counters.add(p)
+                v2 -= 1
+            elif pop.vacc[p]==2 and pop.active[p]== False and v3>0 and (i-pop.vaccDate[p])>self.config.vaccIntervals[1]: #third vaccinations only for persons who are not active, have already got a second shot, and time between vaccinations is at least x -days
+                self.counters.remove(p)
+                pop.vaccDate[p] = i
+                self._immunize(p,'VACC3',i + self.config.vaccDelay,False)
+                pop.vacc[p] = 3
+                self.counters.add(p)
+                v3 -= 1
+            elif pop.vacc[p]==3 and pop.active[p]== False and v4>0 and (i-pop.vaccDate[p])>self.config.vaccIntervals[2]: #fourth vaccinations only for persons who are not active, have already got a second shot, and time between vaccinations is at least x -days
+                self.counters.remove(p)
+                pop.vaccDate[p] = i
+                self._immunize(p,'VACC4',i + self.config.vaccDelay,False)
+                pop.vacc[p] = 4
+                self.counters.add(p)
+                v4 -= 1
+        return reinfections
@@ -0,0 +1,138 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+from population import Population
+
+#categories of agents, active cases are split by detection status and vaccination status
+NOTHING = 0
+VACCINATED = 1
+VACCINATED_RECOVERED = 2
+VACCINATED_RECOVERED_UNDET = 3
+RECOVERED = 4
+RECOVERED_UNDET = 5
+ACTIVE_VACCINATED = 6
+ACTIVE = 7
+ACTIVE_UNDET_VACCINATED = 8
+ACTIVE_UNDET = 9
+NCATEGORIES = 10
+
+#mapping of the categories to the aggregates of the simulation result. Active cases also count as recovered and immune against all observables.
+AGGREGATES = {'vaccinated':[VACCINATED],
+              'past detected':[RECOVERED,ACTIVE],
+              'past undetected':[RECOVERED_UNDET,ACTIVE_UNDET],
+              'past detected + vaccinated':[VACCINATED_RECOVERED,ACTIVE_VACCINATED],
+              'past undetected + vaccinated':[VACCINATED_RECOVERED_UNDET,ACTIVE_UNDET_VACCINATED],
+              'active detected':[ACTIVE,ACTIVE_VACCINATED],
+              'active undetected':[ACTIVE_UNDET,ACTIVE_UNDET_VACCINATED]}
+
+
+class AggregateCounters:
+    def __init__(self,population:Population) -> None:
+        """
+        Running counters of the number of persons (and immune persons per observable) in each category, i.e. agents are counted with their weight.
+        Whenever an agent might change its category or immunity, remove it before and add it again after the change. This way, the daily aggregates can be read in O(#categories).
+        :param population: population store to count
+        """
+        self.pop = population
+        self.counts = np.zeros(NCATEGORIES,dtype=np.int64)
+        self.immunes = np.zeros((NCATEGORIES,len(population.observables)),dtype=np.int64)
+        for chunk in population.chunks():
+            self.add(chunk)
+
+    def get_categories(self,idx:np.array) -> np.array:
+        """
+        :param idx: indices of the agents
+        :return: category codes of the agents
+        """
+        pop = self.pop
+        vaccinated = pop.vacc[idx]>0
+        conf = pop.conf[idx]
+        active = pop.active[idx]
+        rec = pop.rec[idx]
+        inactiveCategories = np.where(vaccinated,
+                                      np.where(rec,np.where(conf,VACCINATED_RECOVERED,VACCINATED_RECOVERED_UNDET),VACCINATED),
+                                      np.where(rec,np.where(conf,RECOVERED,RECOVERED_UNDET),NOTHING))
+        activeCategories = np.where(conf,np.where(vaccinated,ACTIVE_VACCINATED,ACTIVE),np.where(vaccinated,ACTIVE_UNDET_VACCINATED,ACTIVE_UNDET))
+        return np.where(active,activeCategories,inactiveCategories)
+
+    def get_category(self,p:int) -> int:
+        """
+        Scalar version of :func:get_categories avoiding array overhead for single agents
+        :param p: index of the agent
+        :return: category code of the agent
+        """
+        pop = self.pop
+        vaccinated = pop.vacc[p]>0
+        if pop.active[p]:
+            if pop.conf[p]:
+                return ACTIVE_VACCINATED if vaccinated else ACTIVE
+            return ACTIVE_UNDET_VACCINATED if vaccinated else ACTIVE_UNDET
+        if pop.rec[p]:
+            if pop.conf[p]:
+                return VACCINATED_RECOVERED if vaccinated else RECOVERED
+            return VACCINATED_RECOVERED_UNDET if vaccinated else RECOVERED_UNDET
+        return VACCINATED if vaccinated else NOTHING
+
+    def _update(self,idx,sign:int) -> None:
+        """
+        Adds or subtracts the contribution of the given agents to the counters
+        :param idx: index or indices of the agents, must be unique
+        :param sign: +1 to add, -1 to remove
+        :return:
+        """
+        if np.isscalar(idx):
+            category = self.get_category(idx)
+            weight = sign*self.pop.weight[idx]
+            self.counts[category] += weight
+            if category>=ACTIVE_VACCINATED:
+                self.immunes[category] += weight
+            else:
+                self.immunes[category] += weight*self.pop.immune[idx]
+            return
+        if len(idx)==0:
+            return
+        categories = self.get_categories(idx)
+        weights = self.pop.weight[idx]
+        self.counts += sign*np.bincount(categories,weights=weights,minlength=NCATEGORIES).astype(np.int64)
+        immune = self.pop.immune[idx] | (categories>=ACTIVE_VACCINATED)[:,None]
+        for k in range(immune.shape[1]):
+            self.immunes[:,k] += sign*np.bincount(categories,weights=weights*immune[:,k],minlength=NCATEGORIES).astype(np.int64)
+
+    def add(self,idx) -> None:
+        """
+        Adds the contribution of the given agents to the counters. Call after their state changed.
+        :param idx: index or unique indices of the agents
+        :return:
+        """
+        self._update(idx,1)
+
+    def remove(self,idx) -> None:
+        """
+        Removes the contribution of the given agents from the counters. Call before their state changes.
+        :param idx: index or unique indices of the agents
+        :return:
+        """
+        self._update(idx,-1)
+
+    def get_totals(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of agents
+        """
+        return {k:self.counts[v].sum() for k,v in AGGREGATES.items()}
+
+    def get_immunes(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of immune agents per observable
+        """
+        return {k:self.immunes[v].sum(axis=0) for k,v in AGGREGATES.items()}
@@ -0,0 +1,175 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+from typing import Tuple
+
+import numpy as np
+
+from config import Config
+from immunization_table import ImmunizationTable
+from random_pool import RandomPool
+
+
+class BatchSampler:
+    def __init__(self,config:Config,immunizationTable:ImmunizationTable,seed) -> None:
+        """
+        Batched sampling layer for all stochastic draws of the simulation (delays, variants, base immunity, immunity loss and the selection of agents).
+        Each distribution is served from its own refillable :class:RandomPool, so single draws only cost an array lookup.
+        Every purpose draws from its own :class:numpy.random.Generator stream derived from the seed with :class:numpy.random.SeedSequence, i.e. detection delays, recovery delays (detected and undetected), variants, base immunity, immunity loss (one stream per cause) and agent selection.
+        Hence, the values of a stream do not depend on how many values other streams consumed before, and no global random state is involved.
+        :param config: config instance of the simulation
+        :param immunizationTable: precompiled immunization parameters, defines the column order of the immunization samples
+        :param seed: integer seed, list of integers or :class:numpy.random.SeedSequence, e.g. spawned for a shard
+        """
+        self.immunizationTable = immunizationTable
+        seedSequence = seed if isinstance(seed,np.random.SeedSequence) else np.random.SeedSequence(seed)
+        detection,recovery,variant,base,loss,selection = seedSequence.spawn(6)
+        self.detGenerator = np.random.default_rng(detection)
+        self.recoveryGenerators = [np.random.default_rng(s) for s in recovery.spawn(2)]
+        self.variantGenerator = np.random.default_rng(variant)
+        self.baseGenerator = np.random.default_rng(base)
+        self.lossGenerators = [np.random.default_rng(s) for s in loss.spawn(len(immunizationTable.causes))] #one stream per row of the immunization table
+        self.generator = np.random.default_rng(selection) #used to select agents, e.g. for permutations
+        self.detDelays = RandomPool(lambda n: self.detGenerator.choice(config.detDelay,size=n))
+        self.recoveryDelays = [RandomPool(lambda n,k=k: self.recoveryGenerators[k].choice(config.recoveryDelay[k],size=n)) for k in range(2)]
+        self.variantUniforms = RandomPool(lambda n: self.variantGenerator.random(n))
+        self.baseUniforms = RandomPool(lambda n: self.baseGenerator.random(n))
+        self.uniforms = RandomPool(lambda n: self.generator.random(n)) #used to select agents from pools
+        self.losses = [None]*len(immunizationTable.causes) #row of the cause -> pool of waning duration vectors
+        self.delayClasses = [self._get_delay_classes(config.detDelay,config.recoveryDelay[0]),self._get_delay_classes([0],config.recoveryDelay[1])] #distinct delay pairs and their probabilities of detected and undetected cases
+
+    def _get_streams(self) -> tuple[list,list]:
+        """
+        :return: list of all generators and list of all pools, whereas loss pools which were not used yet are None
+        """
+        generators = [self.detGenerator]+self.recoveryGenerators+[self.variantGenerator,self.baseGenerator,self.generator]+self.lossGenerators
+        pools = [self.detDelays]+self.recoveryDelays+[self.variantUniforms,self.baseUniforms,self.uniforms]+self.losses
+        return generators,pools
+
+    def get_state(self) -> dict:
+        """
+        :return: state of all random streams, i.e. the states of the generators and the values left in the pools, e.g. to save a checkpoint
+        """
+        generators,pools = self._get_streams()
+        return {'generators':[g.bit_generator.state for g in generators],
+                'pools':[None if p is None else p.buffer[p.position:].copy() for p in pools]}
+
+    def set_state(self,state:dict,keepPools:bool=True) -> None:
+        """
+        Continues the random streams from a state returned by :func:get_state
+        :param state: state of all random streams
+        :param keepPools: use the values left in the pools. Requires a sampler created with the same delays and immunization parameters, otherwise the pools are refilled from the continued generators.
+        :return:
+        """
+        if not keepPools:
+            state = {'generators':state['generators'],'pools':[None]*len(state['pools'])}
+        for row,values in enumerate(state['pools'][-len(self.losses):]):
+            if values is not None:
+                self._get_loss_pool(row) #create the loss pools used so far before restoring the generators
+        generators,pools = self._get_streams()
+        for generator,generatorState in zip(generators,state['generators']):
+            generator.bit_generator.state = generatorState
+        for pool,values in zip(pools,state['pools']):
+            if values is not None:
+                pool.buffer = values
+                pool.position = 0
+
+    def _get_loss_pool(self,row:int) -> RandomPool:
+        """
+        :param row: row of the immunization cause in the immunization table
+        :return: pool of waning duration vectors for the cause, created on first use
+        """
+        if self.losses[row] is None:
+            self.losses[row] = RandomPool(lambda n: self.immunizationTable.sample_loss(row,n,self.lossGenerators[row]))
+        return self.losses[row]
+
+    @staticmethod
+    def _get_delay_classes(detDelays:list[int],recoveryDelays:list[int]) -> tuple[np.array,np.array]:
+        """
+        :param detDelays: detection delays, a random entry is drawn
+        :param recoveryDelays: recovery delays, a random entry is drawn independently
+        :return: array of the distinct pairs of detection and recovery delays with shape (number of classes, 2) and their probabilities
+        """
+        det,detCounts = np.unique(detDelays,return_counts=True)
+        rec,recCounts = np.unique(recoveryDelays,return_counts=True)
+        classes = np.column_stack([np.repeat(det,len(rec)),np.tile(rec,len(det))])
+        probabilities = np.outer(detCounts,recCounts).ravel()
+        return classes,probabilities/probabilities.sum()
+
+    def sample_det_delays(self,n:int) -> np.array:
+        """
+        :param n: number of samples
+        :return: delays between infection and detection
+        """
+        return self.detDelays.draw(n)
+
+    def sample_recovery_delays(self,detected:bool,n:int) -> np.array:
+        """
+        :param detected: whether the delays are sampled for detected cases
+        :param n: number of samples
+        :return: delays between infection and recovery
+        """
+        return self.recoveryDelays[0 if detected else 1].draw(n)
+
+    def sample_variant_codes(self,ratios:list[float],n:int) -> np.array:
+        """
+        Samples variants by inverting the cumulative variant split
+        :param ratios: variant split, sums up to one
+        :param n: number of samples
+        :return: indices of the variants
+        """
+        cumulative = np.cumsum(ratios)
+        return np.minimum(np.searchsorted(cumulative,self.variantUniforms.draw(n),side='right'),len(ratios)-1)
+
+    def sample_variant_counts(self,ratios:np.array,n:int) -> np.array:
+        """
+        Splits n cases among the variants with a single multinomial draw
+        :param ratios: variant split, sums up to one
+        :param n: number of cases
+        :return: number of cases of each variant
+        """
+        return self.variantGenerator.multinomial(n,ratios)
+
+    def sample_immunization(self,cause:str,n:int) -> Tuple[np.array,np.array]:
+        """
+        Samples base immunity and waning durations of n immunization events with the same cause
+        :param cause: typically either VACC1,2,.. or ALPHA,DELTA,...
+        :param n: number of events
+        :return: boolean base immunity array and waning duration array, both with shape (n, number of targets)
+        """
+        row = self.immunizationTable.get_row(cause)
+        baseImm = self.immunizationTable.base_immunity_from_uniform(row,self.baseUniforms.draw(n))
+        loseDays = self._get_loss_pool(row).draw(n)
+        return baseImm,loseDays
+
+    def sample_delay_counts(self,detected:bool,n:np.array) -> tuple[np.array,np.array]:
+        """
+        Splits groups of cases among the distinct pairs of detection and recovery delays with one multinomial draw per group
+        :param detected: whether the cases are detected, undetected cases have detection delay zero
+        :param n: number of cases of each group
+        :return: array of the delay pairs with shape (number of classes, 2) and number of cases of each group and class with shape (number of groups, number of classes)
+        """
+        classes,probabilities = self.delayClasses[0 if detected else 1]
+        generator = self.detGenerator if detected else self.recoveryGenerators[1]
+        return classes,generator.multinomial(n,probabilities)
+
+    def sample_immunization_counts(self,cause:str,n:np.array,resolution:int) -> tuple[np.array,np.array,np.array]:
+        """
+        Splits groups of immunization events with the same cause among the distinct combinations of base immunity vector and waning duration bin with one multinomial draw per group
+        :param cause: typically either VACC1,2,.. or ALPHA,DELTA,...
+        :param n: number of events of each group
+        :param resolution: width of the waning duration bins in days, see :func:ImmunizationTable.get_loss_classes
+        :return: boolean base immunity array and waning duration array, both with shape (number of classes, number of targets), and number of events of each group and class with shape (number of groups, number of classes)
+        """
+        row = self.immunizationTable.get_row(cause)
+        baseImm,loseDays,probabilities = self.immunizationTable.get_immunization_classes(row,resolution)
+        return baseImm,loseDays,self.lossGenerators[row].multinomial(n,probabilities)
@@ -10,69 +10,69 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
 
-import csv
 from config import Config
+from csv_columns import CsvColumns
 import datetime as dt
+import numpy as np
 
 from detection_parameters import DetectionParameters
 
+EXTRAPOLATION = 7 #number of days the national timeseries is extrapolated beyond the data
+
 class CaseParameters:
     def __init__(self,config:Config) -> None:
         """
         Class for managing the data interface between epidemiological case data and simulation.
+        The detected and estimated undetected cases are stored as dense arrays (undetected/detected x regions x days) whereas the last region holds the national totals. The smoothing over config.detDelay is precomputed, so that :func:get is a plain array read.
         :param config: config file of the simulation
         """
         self.config=config
-        self.cases = dict()
-        self.casesFed = dict()
         file = config.filenameEpidata
         detection_parameters = DetectionParameters(config)
 
         #parse epidemiological data
-        with open(file, 'r') as f:
-            r = csv.reader(f, delimiter=';')
-            next(r)
-            for line in r:
-                date = dt.datetime.strptime(line[0], "%Y-%m-%d")
-                fed = line[1]
-                count = int(line[2])
-                try:
-                    self.cases[date][True] += count
-                    self.cases[date][False] += count/detection_parameters.get_detection_probability(date)*(1-detection_parameters.get_detection_probability(date))
-                except:
-                    try:
-                        self.cases[date][True] = count
-                        self.cases[date][False] = count / detection_parameters.get_detection_probability(date) * (
-                                    1 - detection_parameters.get_detection_probability(date))
-                    except:
-                        self.cases[date] = dict()
-                        self.cases[date][True] = count
-                        self.cases[date][False] = count / detection_parameters.get_detection_probability(date) * (
-                                    1 - detection_parameters.get_detection_probability(date))
-                if fed not in self.casesFed.keys():
-                    self.casesFed[fed]=dict()
-                try:
-                    self.casesFed[fed][date][True] += count
-                    self.casesFed[fed][date][False] += count / detection_parameters.get_detection_probability(date) * (
-                            1 - detection_parameters.get_detection_probability(date))
-                except:
-                    try:
-                        self.casesFed[fed][date][True] = count
-                        self.casesFed[fed][date][False] = count / detection_parameters.get_detection_probability(date) * (
-                                1 - detection_parameters.get_detection_probability(date))
-                    except:
-                        self.casesFed[fed][date] = dict()
-                        self.casesFed[fed][date][True] = count
-                        self.casesFed[fed][date][False] = count / detection_parameters.get_detection_probability(date) * (
-                                1 - detection_parameters.get_detection_probability(date))
+        columns = CsvColumns(file)
+        dates = columns['date']
+        regions,regionIdx = np.unique(columns['region'],return_inverse=True)
+        count = columns['cases']
+        t0 = dates.min()
+        days = (dates-t0).astype(np.int64)
+        nDays = int(days.max())+1
+        probability = detection_parameters.get_detection_probabilities(dates)
+        cases = np.zeros((2,len(regions)+1,nDays+EXTRAPOLATION)) #index 1 of the first axis refers to detected cases
+        np.add.at(cases[1],(regionIdx,days),count)
+        np.add.at(cases[0],(regionIdx,days),count/probability*(1-probability))
+        cases[:,-1] = cases[:,:-1].sum(axis=1) #national totals
         #extrapolate timeseries a little - otherwise undetected cases stop increase/decrease "too early"
-        date = max(self.cases.keys())
-        count = sum([self.cases[date-dt.timedelta(k)][True] for k in range(7)])/7
-        for k in range(1,8):
-            self.cases[date + dt.timedelta(k)] = dict()
-            self.cases[date + dt.timedelta(k)][True] = count
-            self.cases[date + dt.timedelta(k)][False] = count / detection_parameters.get_detection_probability(date) * (
-                    1 - detection_parameters.get_detection_probability(date))
+        last = detection_parameters.get_detection_probability(dt.datetime.strptime(str(t0+nDays-1),'%Y-%m-%d'))
+        cases[1,-1,nDays:] = cases[1,-1,nDays-7:nDays].sum()/7
+        cases[0,-1,nDays:] = cases[1,-1,nDays:]/last*(1-last)
+
+        self.t0 = dt.datetime.strptime(str(t0),'%Y-%m-%d')
+        self.regionIndex = {fed:k for k,fed in enumerate(regions)} #regionID -> index of the region axis
+        self.regionIndex[None] = len(regions) #national totals
+        self.cases = cases
+        self.smoothed,self.first = self.smooth(cases,config.detDelay)
+        self._cases = cases.tolist() #nested lists for fast scalar lookups
+        self._smoothed = self.smoothed.tolist()
+
+    @staticmethod
+    def smooth(cases:np.array,delays:list[int]) -> tuple:
+        """
+        Averages the cases over the given delays, i.e. convolves the timeseries with the delay kernel. Days outside the data count as zero cases.
+        :param cases: array (... x days) of daily cases
+        :param delays: offsets in days averaged for every day
+        :return: array (... x days) of smoothed cases and the day of its first entry relative to the first day of cases, i.e. non-positive
+        """
+        length = cases.shape[-1]
+        first = min(-max(delays),0)
+        last = length+max(-min(delays),0)
+        smoothed = np.zeros(cases.shape[:-1]+(last-first,))
+        for k in delays:
+            start,stop = max(first,-k),min(last,length-k)
+            if start<stop:
+                smoothed[...,start-first:stop-first] += cases[...,start+k:stop+k]
+        return smoothed/len(delays),first
 
     def get(self,date:dt.datetime,detected:bool,fed=None) -> float:
         """
@@ -82,27 +82,22 @@ class CaseParameters:
         :param fed: Austrian federalstate (e.g. AT-9 for Vienna)
         :return: number of new cases for given date, region and detection status
         """
-        x = 0
-        #smooth weekly bias
-        for k in self.config.detDelay:
-            x+=self._get(date+dt.timedelta(k),detected,fed)
-        return x/len(self.config.detDelay)
+        day = (date-self.t0).days-self.first
+        region = self.regionIndex.get(fed)
+        if region is None or not 0<=day<len(self._smoothed[0][0]):
+            return 0
+        return self._smoothed[int(detected)][region][day]
 
-    def _get(self,date:dt.datetime,detected:bool,fed=None) -> int:
+    def get_daily(self,date:dt.datetime,detected:bool,fed=None) -> float:
         """
-        Called seven times by "get" to smooth the numbers. Returns an estimate for number of detected or undetected cases for the given confirmation-date, i.e. the date they are registered in the surveillance system. For undetected cases, the method returns an estimate. Note that those undetected cases would have become registered at the given date, if they would have made a test.
+        Returns the number of detected or undetected cases for the given confirmation-date without smoothing, see :func:get
         :param date: date to get data for
         :param detected: true returns confirmed cases, false return extimate for undetected cases
         :param fed: Austrian federalstate (e.g. AT-9 for Vienna)
         :return: number of new cases for given date, region and detection status
         """
-        if fed==None:
-            try:
-                return self.cases[date][detected]
-            except:
-                return 0
-        else:
-            try:
-                return self.casesFed[fed][date][detected]
-            except:
-                return 0
\ No newline at end of file
+        day = (date-self.t0).days
+        region = self.regionIndex.get(fed)
+        if region is None or not 0<=day<len(self._cases[0][0]):
+            return 0
+        return self._cases[int(detected)][region][day]
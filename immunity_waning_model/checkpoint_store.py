@@ -0,0 +1,90 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import os
+import pickle
+
+
+class CheckpointStore:
+    def __init__(self,folder:str,interval:int,keep:int=0) -> None:
+        """
+        Content-addressed store for snapshots of the simulation state, used to resume simulations whose inputs only changed after some day, e.g. daily updates which extend tend by one day and add one day of data.
+        The snapshot of a day is named by a digest of everything the simulation state after this day depends on, see :func:Simulation.get_input_digests. Hence, it can be reused by every run with the same digest on that day, independent of its tend.
+        :param folder: folder for the snapshot files
+        :param interval: number of days between two snapshots
+        :param keep: number of latest snapshots kept along the inputs of a run, see :func:prune. Zero keeps all snapshots
+        """
+        self.folder = folder
+        self.interval = max(interval,1)
+        self.keep = keep
+        os.makedirs(folder,exist_ok=True)
+
+    def get_filename(self,digest:str,shard:int=0) -> str:
+        """
+        :param digest: input digest of the day of the snapshot
+        :param shard: index of the shard the snapshot belongs to
+        :return: filepath as string
+        """
+        return os.path.join(self.folder,'{}_{}.pickle'.format(digest,shard))
+
+    def is_due(self,i:int) -> bool:
+        """
+        :param i: current simulation day
+        :return: True if a snapshot is to be taken after the day
+        """
+        return (i+1)%self.interval==0
+
+    def save(self,digest:str,state:dict,shard:int=0) -> None:
+        """
+        Saves a snapshot unless it exists already. The file is written under a temporary name first, so that concurrent runs never read incomplete snapshots.
+        :param digest: input digest of the day of the snapshot
+        :param state: simulation state as dictionary
+        :param shard: index of the shard the snapshot belongs to
+        :return:
+        """
+        filename = self.get_filename(digest,shard)
+        if os.path.isfile(filename):
+            return
+        temporary = filename+'.'+str(os.getpid())
+        with open(temporary,'wb') as f:
+            pickle.dump(state,f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary,filename)
+
+    def prune(self,digests:list[str],i:int,shard:int=0) -> None:
+        """
+        Deletes the snapshots matching the inputs of the current run which are older than the latest keep snapshot days up to the given day, including the ones saved by former runs with the same inputs.
+        :param digests: input digest of every simulation day
+        :param i: day of the latest snapshot
+        :param shard: index of the shard
+        :return:
+        """
+        if self.keep<=0:
+            return
+        for j in range(i+1-self.keep*self.interval):
+            try:
+                os.remove(self.get_filename(digests[j],shard))
+            except FileNotFoundError:
+                pass
+
+    def load_latest(self,digests:list[str],shard:int=0) -> tuple[int,dict]:
+        """
+        Looks for the latest snapshot matching the inputs of the current run
+        :param digests: input digest of every simulation day
+        :param shard: index of the shard
+        :return: day and simulation state of the latest matching snapshot, or -1 and None if there is none
+        """
+        for i in reversed(range(len(digests))):
+            filename = self.get_filename(digests[i],shard)
+            if os.path.isfile(filename):
+                with open(filename,'rb') as f:
+                    return i,pickle.load(f)
+        return -1,None
@@ -0,0 +1,438 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AGGREGATES, NCATEGORIES, NOTHING, VACCINATED, VACCINATED_RECOVERED, VACCINATED_RECOVERED_UNDET, RECOVERED, RECOVERED_UNDET, ACTIVE_VACCINATED, ACTIVE, ACTIVE_UNDET_VACCINATED, ACTIVE_UNDET
+from engine import Engine
+
+#infection status of a cohort
+SUSCEPTIBLE = 0 #never infected
+RECOVERED_UNDETECTED = 1 #recovered, last infection was not confirmed
+RECOVERED_DETECTED = 2 #recovered, last infection was confirmed
+ACTIVE_UNDETECTED = 3 #active case which is not (yet) confirmed
+ACTIVE_DETECTED = 4 #confirmed active case
+NSTATUS = 5
+NDOSES = 5 #dose levels 0,1,2,3,4
+AFTERRECOVERY = np.array([SUSCEPTIBLE,RECOVERED_UNDETECTED,RECOVERED_DETECTED,RECOVERED_UNDETECTED,RECOVERED_DETECTED]) #infection status after the recovery of an active case
+AFTERCONFIRMATION = np.array([SUSCEPTIBLE,RECOVERED_DETECTED,RECOVERED_DETECTED,ACTIVE_DETECTED,ACTIVE_DETECTED]) #infection status after the confirmation of a case
+
+LOSSSAMPLES = 1000000 #number of samples used to tabulate the waning distributions
+EPS = 1e-9 #counts below this value are treated as zero
+WAITRESOLUTION = 14 #number of days whose vaccinated agents share a waiting cohort, i.e. they become eligible for their next dose within that many days
+
+
+class CohortEngine(Engine):
+    def __init__(self,simulation,size:int,steps:int) -> None:
+        """
+        Engine which tracks expected numbers of agents in cohorts instead of individual agents, so that the computation time does not depend on the population size.
+        A cohort is defined by the dose level, the infection status, the last confirmed variant and, for agents waiting for the vaccination interval to pass, the period in which they become eligible for their next dose. For each cohort and observable the number of immune agents is stored together with a day-bucketed calendar of the future immunity losses and starts.
+        Immunity losses are tabulated from the same waning distributions and base probabilities as used by the agent based engines.
+        Cases and vaccinations are distributed proportionally among the cohorts, mimicking the per-agent walk: an infection with a variant is assigned proportional to the variant ratio times the number of non-active agents susceptible to it.
+        Compared to the agent based engines, the following simplifications apply:
+        - immunity of different observables is assumed to be comonotone within a cohort, i.e. agents immune against an observable with fewer immune agents are also immune against the other one. Only agents whose vaccination did not achieve base immunity against a variant are tracked separately, see _infect_variant
+        - the immunity of reinfected agents is replaced by the immunity of the new infection instead of keeping the later loss date
+        - agents becoming eligible for their next dose within the same period of WAITRESOLUTION days are released proportionally from their waiting cohorts
+        :param simulation: simulation instance providing config and parameter classes
+        :param size: number of agents
+        :param steps: number of simulation days
+        """
+        super().__init__(simulation,None,None,None)
+        self.steps = steps
+        self.variantTargets = np.array([self.observables.index(v) for v in self.variants]) #observable column of each variant
+        nVariants = len(self.variants)
+        self.nPeriods = (max(self.config.vaccIntervals)+1)//WAITRESOLUTION+2 #number of waiting periods, which are used cyclically
+        # eligible cohorts for all dose levels, waiting cohorts only for dose levels followed by a vaccination interval
+        period,dose,status,variant = np.meshgrid(np.arange(self.nPeriods+1),np.arange(NDOSES),np.arange(NSTATUS),np.arange(-1,nVariants),indexing='ij')
+        mask = (period==0) | ((dose>0) & (dose<=len(self.config.vaccIntervals)))
+        nGroups = mask.sum()
+        self.index = np.full(mask.shape,-1) #waiting period x dose level x infection status x last confirmed variant+1 -> cohort
+        self.index[mask] = np.arange(nGroups)
+        self.period = period[mask] #waiting period of each cohort, 0 for agents which are eligible for their next dose
+        self.dose = dose[mask] #dose level of each cohort
+        self.status = status[mask] #infection status of each cohort
+        self.variant = variant[mask] #last confirmed variant of each cohort, -1 if there is none
+        self.recovered = self._group(self.dose,AFTERRECOVERY[self.status],self.variant,self.period) #cohort of each active cohort after recovery
+        self.confirmed = self._group(self.dose,AFTERCONFIRMATION[self.status],self.variant,self.period) #cohort of each undetected cohort after confirmation
+        self.categories = self._get_categories()
+        self.inactive = self.status<=RECOVERED_DETECTED
+
+        self.n = np.zeros(nGroups) #number of agents in each cohort
+        self.n[self._group(0,SUSCEPTIBLE,-1)] = size
+        self.immune = np.zeros((nGroups,len(self.observables))) #number of immune agents per cohort and observable
+        self.losses = np.zeros((nGroups,len(self.observables),steps)) #number of immune agents losing their immunity per day
+        self.unbased = np.zeros((nGroups,len(self.observables),nVariants)) #number of immune agents per cohort and observable whose vaccination did not immunize them against the variant, see _infect_variant
+        self.starts = dict() #day -> number of agents per cohort and observable becoming immune (after vaccination)
+        self.releases = dict() #day -> agents per dose level which become eligible for their next dose
+        self.recoveries = dict() #day -> number of active agents per cohort and variant of their infection which recover
+        self.confirmations = dict() #day -> number of agents per cohort which get confirmed
+
+        self.pmfs = self._get_loss_pmfs() #cause row x observable x days
+        self.vaccRows = np.array([-1]+[self.immunizationTable.get_row('VACC'+str(dose)) for dose in range(1,NDOSES)]) #cause row of the vaccine of each dose level
+        self.variantRows = np.array([self.immunizationTable.get_row(v) for v in self.variants]) #cause row of the infection with each variant
+        self.detDelays = self._get_delay_pmf(self.config.detDelay)
+        self.recoveryDelays = [self._get_delay_pmf(x) for x in self.config.recoveryDelay]
+
+    def attach(self,simulation) -> None:
+        """
+        If the engine is attached to a simulation with other waning parameters, e.g. a scenario branch, the loss distributions are tabulated again. Already scheduled immunity losses are kept.
+        :param simulation: simulation instance providing config and parameter classes
+        :return:
+        """
+        changed = hasattr(self,'config') and self.config.observables!=simulation.config.observables
+        super().attach(simulation)
+        self.immunizationTable = simulation.immunizationTable
+        if changed:
+            self.pmfs = self._get_loss_pmfs()
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state.pop('immunizationTable')
+        return state
+
+    def extend(self,steps:int) -> None:
+        """
+        Immunity losses after the simulation horizon are not tabulated, so the horizon of the cohorts cannot be extended. Checkpoints of this engine are only shared by runs with the same horizon.
+        :param steps: new number of simulation days, must equal the current one
+        :return:
+        """
+        if steps!=self.steps:
+            raise ValueError('The simulation horizon of the cohort engine cannot be changed')
+
+    def _group(self,dose,status,variant,period=0):
+        """
+        :param dose: dose level(s)
+        :param status: infection status(es)
+        :param variant: last confirmed variant code(s), -1 if there is none
+        :param period: waiting period(s), 0 for agents which are eligible for their next dose
+        :return: index or indices of the cohort(s)
+        """
+        return self.index[period,dose,status,variant+1]
+
+    def _get_period(self,day:int) -> int:
+        """
+        :param day: first day on which agents are eligible for their next dose
+        :return: waiting period of the agents
+        """
+        return (day//WAITRESOLUTION)%self.nPeriods+1
+
+    def _get_categories(self) -> np.array:
+        """
+        :return: category code (see :class:AggregateCounters) of each cohort
+        """
+        vaccinated = self.dose>0
+        categories = np.full(len(self.dose),NOTHING)
+        categories[vaccinated] = VACCINATED
+        for status,category,vaccCategory in [(RECOVERED_UNDETECTED,RECOVERED_UNDET,VACCINATED_RECOVERED_UNDET),
+                                             (RECOVERED_DETECTED,RECOVERED,VACCINATED_RECOVERED),
+                                             (ACTIVE_UNDETECTED,ACTIVE_UNDET,ACTIVE_UNDET_VACCINATED),
+                                             (ACTIVE_DETECTED,ACTIVE,ACTIVE_VACCINATED)]:
+            mask = self.status==status
+            categories[mask] = np.where(vaccinated[mask],vaccCategory,category)
+        return categories
+
+    def _get_loss_pmfs(self) -> np.array:
+        """
+        Tabulates the distribution of the waning durations for all causes and observables. Waning durations beyond the simulation horizon (or negative ones) never lead to a loss of immunity during the simulation.
+        :return: array with shape (causes, observables, days) containing the probability to lose immunity after the given number of days
+        """
+        table = self.immunizationTable
+        pmfs = np.zeros((len(table.causes),len(self.observables),self.steps))
+        for row in range(len(table.causes)):
+            samples = table.sample_loss(row,LOSSSAMPLES,self.batchSampler.lossGenerators[row])
+            for k in range(len(self.observables)):
+                x = samples[:,k]
+                x = x[(x>=0) & (x<self.steps)]
+                pmfs[row,k] = np.bincount(x,minlength=self.steps)[:self.steps]/LOSSSAMPLES
+        return pmfs
+
+    def _get_base_gaps(self,rows) -> np.array:
+        """
+        :param rows: cause row(s)
+        :return: array with shape ([rows,] observables, variants) containing the probability to achieve base immunity against the observable but not against the observable of the variant
+        """
+        base = self.immunizationTable.base[rows]
+        return np.maximum(base[...,:,None]-base[...,None,self.variantTargets],0)
+
+    def _get_delay_pmf(self,delays:list[int]) -> list[tuple[int,float]]:
+        """
+        :param delays: list of delays which are sampled uniformly
+        :return: list of distinct delays and their probabilities
+        """
+        values,counts = np.unique(delays,return_counts=True)
+        return [(int(v),c/len(delays)) for v,c in zip(values,counts)]
+
+    def _schedule(self,calendar:dict,day:int,index:tuple,count) -> None:
+        """
+        Schedules a transition of agents between cohorts. Transitions after the simulation horizon are discarded.
+        :param calendar: either recoveries or confirmations
+        :param day: day of the transition
+        :param index: source cohort(s) (and variant code(s) of the infection for recoveries)
+        :param count: number(s) of agents
+        :return:
+        """
+        if day<self.steps:
+            if day not in calendar:
+                calendar[day] = np.zeros((len(self.n),len(self.variants)) if len(index)>1 else len(self.n))
+            np.add.at(calendar[day],index,count)
+
+    def _move(self,i:int,sources:np.array,targets:np.array,counts:np.array) -> None:
+        """
+        Moves agents between cohorts together with their share of immunity and immunity calendars
+        :param i: current simulation day
+        :param sources: distinct source cohorts
+        :param targets: distinct target cohorts
+        :param counts: number of agents per source cohort, capped at its size
+        :return:
+        """
+        f = np.minimum(np.divide(counts,self.n[sources],out=np.zeros(len(sources)),where=self.n[sources]>EPS),1.0)
+        moved = f*self.n[sources]
+        self.n[sources] -= moved
+        self.n[targets] += moved
+        for x in [self.immune,self.unbased]+list(self.starts.values()):
+            moved = f.reshape((-1,)+(1,)*(x.ndim-1))*x[sources]
+            x[sources] -= moved
+            x[targets] += moved
+        moved = f[:,None,None]*self.losses[sources,:,i:]
+        self.losses[sources,:,i:] -= moved
+        self.losses[targets,:,i:] += moved
+
+    def _vaccinate(self,i:int,dose:int,count:int) -> None:
+        """
+        Administers a dose uniformly among the eligible agents. Vaccinated agents which achieve base immunity against an observable get their immunity (re)scheduled, the others keep their current immunity.
+        :param i: current simulation day
+        :param dose: number of the dose (1,2,3,4)
+        :param count: number of doses
+        :return:
+        """
+        sources = np.flatnonzero((self.dose==dose-1) & self.inactive & (self.period==0))
+        available = self.n[sources].sum()
+        if count<=0 or available<=EPS:
+            return
+        count = min(count,available)
+        f = count/available
+        day = i+self.config.vaccIntervals[dose-1]+1 if dose<NDOSES-1 else self.steps #first day of the next dose, like (i-vaccDate)>vaccIntervals in the agent engines
+        period = self._get_period(day) if day<self.steps else 0
+        targets = self._group(dose,self.status[sources],self.variant[sources],period)
+        n = f*self.n[sources]
+        immune = f*self.immune[sources]
+        unbased = f*self.unbased[sources]
+        losses = f*self.losses[sources,:,i:]
+        self.n[sources] -= n
+        self.immune[sources] -= immune
+        self.unbased[sources] -= unbased
+        self.losses[sources,:,i:] -= losses
+        # agents with base immunity get new immunization and loss dates, the others keep their current ones
+        row = self.vaccRows[dose]
+        base = self.immunizationTable.base[row][None,:]
+        losses *= 1-base[:,:,None]
+        for starts in self.starts.values():
+            moved = f*starts[sources]
+            starts[sources] -= moved
+            starts[targets] += (1-base)*moved
+        # immune agents with base immunity against an observable but not against a variant, unless they keep their immunity against the variant
+        kept = np.minimum(immune[:,None,self.variantTargets],immune[:,:,None])
+        unbased = (1-base[:,:,None])*unbased+self._get_base_gaps(row)[None]*(immune[:,:,None]-kept)
+        delay = self.config.vaccDelay
+        if delay<self.steps-i:
+            self.starts.setdefault(i+delay,np.zeros_like(self.immune))[targets] += base*(n[:,None]-immune) #non-immune agents become immune after the delay
+            losses[:,:,delay:] += (base*immune)[:,:,None]*self.pmfs[row][None,:,:self.steps-i-delay] #immune agents stay immune until the new loss date
+        self.n[targets] += n
+        self.immune[targets] += immune
+        self.unbased[targets] += unbased
+        self.losses[targets,:,i:] += losses
+        if period>0:
+            self.releases.setdefault(day,np.zeros(NDOSES))[dose] += count
+
+    def _release(self,i:int,dose:int,count:float) -> None:
+        """
+        Moves agents whose vaccination interval passed from their waiting cohorts into the eligible cohorts of their dose level. Their scheduled recoveries and confirmations are moved along.
+        :param i: current simulation day
+        :param dose: dose level
+        :param count: number of agents becoming eligible for their next dose
+        :return:
+        """
+        period = self._get_period(i)
+        sources = np.flatnonzero((self.dose==dose) & (self.period==period))
+        total = self.n[sources].sum()
+        last = (i+1)%WAITRESOLUTION==0 #the last day of the period releases all remaining agents
+        if total<=EPS or (count<=EPS and not last):
+            return
+        f = 1.0 if last else min(count/total,1.0)
+        targets = self._group(dose,self.status[sources],self.variant[sources])
+        self._move(i,sources,targets,f*self.n[sources])
+        for bucket in list(self.recoveries.values())+list(self.confirmations.values()):
+            moved = f*bucket[sources]
+            bucket[sources] -= moved
+            bucket[targets] += moved
+
+    def _infect_variant(self,i:int,counts:np.array,code:int,detectedShare:float,reinfections:np.array) -> None:
+        """
+        Infects the given number of susceptible agents in each cohort with a variant and schedules their confirmation and recovery.
+        The infected agents immune against other observables but not against the variant either never achieved base immunity against the variant with their last vaccination (unbased) or lost it already (waned). Unbased agents lose their remaining immunity like all immune agents of the cohort, so their share of the scheduled losses is removed uniformly. Waned agents lose their remaining immunity first, since the waning durations of an immunization are comonotone, so they account for the earliest scheduled losses.
+        :param i: current simulation day
+        :param counts: number of infections per cohort
+        :param code: variant code
+        :param detectedShare: share of confirmed cases
+        :param reinfections: matrix of the detected (re)infections of the day, updated in place
+        :return:
+        """
+        idx = np.flatnonzero(counts>EPS)
+        counts = counts[idx]
+        target = self.variantTargets[code]
+        susceptible = self.n[idx]-self.immune[idx,target]
+        f = np.minimum(np.divide(counts,susceptible,out=np.ones_like(counts),where=susceptible>EPS),1.0)
+        # agents immune against other observables but not against the variant, assuming comonotone immunity
+        immune = self.immune[idx]
+        exposed = immune-np.minimum(immune,immune[:,target][:,None])
+        removed = f[:,None]*exposed
+        unbased = np.minimum(exposed,self.unbased[idx,:,code])
+        waned = exposed-unbased
+        rows,columns = np.nonzero(removed>EPS)
+        groups = idx[rows]
+        keep = 1-f[rows]*unbased[rows,columns]/immune[rows,columns]
+        losses = keep[:,None]*self.losses[groups,columns,i:]
+        cumulated = np.minimum(np.cumsum(losses,axis=1),(keep*waned[rows,columns])[:,None])
+        losses -= f[rows,None]*np.diff(cumulated,axis=1,prepend=0)
+        self.losses[groups,columns,i:] = losses
+        for starts in self.starts.values():
+            starts[idx] *= (1-f)[:,None]
+        remaining = self.unbased[idx,:,code]-f[:,None]*unbased
+        self.unbased[idx] *= np.divide(immune-removed,immune,out=np.ones_like(immune),where=immune>EPS)[:,:,None]
+        self.unbased[idx,:,code] = remaining
+        self.immune[idx] -= removed
+        self.n[idx] -= counts
+        # infected agents become active cases, confirmed cases are assigned the new variant
+        detected = counts*detectedShare
+        undetected = counts-detected
+        np.add.at(reinfections,(self.variant[idx]+1,np.full(len(idx),code)),detected)
+        active = self._group(self.dose[idx],ACTIVE_UNDETECTED,code,self.period[idx])
+        np.add.at(self.n,active,detected)
+        for detDelay,p1 in self.detDelays:
+            for recDelay,p2 in self.recoveryDelays[0]:
+                if detDelay<recDelay:
+                    self._schedule(self.confirmations,i+detDelay,(active,),detected*p1*p2)
+                    self._schedule(self.recoveries,i+recDelay,(self.confirmed[active],code),detected*p1*p2)
+                else:
+                    self._schedule(self.recoveries,i+recDelay,(active,code),detected*p1*p2)
+                    self._schedule(self.confirmations,i+detDelay,(self.recovered[active],),detected*p1*p2)
+        active = self._group(self.dose[idx],ACTIVE_UNDETECTED,self.variant[idx],self.period[idx])
+        np.add.at(self.n,active,undetected)
+        for recDelay,p in self.recoveryDelays[1]:
+            self._schedule(self.recoveries,i+recDelay,(active,code),undetected*p)
+
+    def _infect(self,i:int,t:dt.datetime,c1:int,c2:int,reinfections:np.array) -> None:
+        """
+        Distributes the infections of the day among the variants and cohorts proportional to the variant ratio times the number of susceptible non-active agents.
+        :param i: current simulation day
+        :param t: current date
+        :param c1: number of detected cases
+        :param c2: number of undetected cases
+        :param reinfections: matrix of the detected (re)infections of the day, updated in place
+        :return:
+        """
+        remaining = c1+c2
+        if remaining<=0:
+            return
+        ratios = np.array(self.variantParameters.get_variant_ratio(t.date()))
+        detectedShare = c1/(c1+c2)
+        while remaining>EPS:
+            susceptible = np.maximum(self.n[:,None]-self.immune[:,self.variantTargets],0)*self.inactive[:,None]
+            weights = ratios*susceptible.sum(axis=0)
+            if weights.sum()<=EPS:
+                break #nobody left to infect
+            shares = remaining*weights/weights.sum()
+            infected = 0
+            for code in np.flatnonzero(shares>EPS):
+                # the susceptibles are re-evaluated since previous variants of the same round changed the cohorts
+                s = np.maximum(self.n-self.immune[:,self.variantTargets[code]],0)*self.inactive
+                count = min(shares[code],s.sum())
+                if count<=EPS:
+                    continue
+                self._infect_variant(i,count*s/s.sum(),code,detectedShare,reinfections)
+                infected += count
+            if infected<=EPS:
+                break
+            remaining -= infected
+
+    def step(self,i:int,t:dt.datetime,cases:list[int],vaccinations:list[int]) -> np.array:
+        """
+        Distributes the cases and vaccinations of one day among the cohorts.
+        :param i: current simulation day
+        :param t: current date
+        :param cases: number of new detected and undetected cases
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: expected detected (re)infections of the day as matrix (previous variant x new variant), whereas the first row corresponds to no previous confirmed infection
+        """
+        for dose,count in enumerate(self.releases.pop(i,np.zeros(NDOSES))):
+            self._release(i,dose,count)
+        reinfections = np.zeros((len(self.variants)+1,len(self.variants)))
+        self._infect(i,t,cases[0],cases[1],reinfections)
+        for dose,count in zip(range(1,NDOSES),vaccinations):
+            self._vaccinate(i,dose,count)
+        return reinfections
+
+    def apply_events(self,i:int) -> dict:
+        """
+        Applies the recoveries, confirmations, immunizations and immunity losses of the given day.
+        :param i: current simulation day
+        :return: empty dict, since there are no agent events
+        """
+        recoveries = self.recoveries.pop(i,None)
+        if recoveries is not None:
+            for code in np.flatnonzero(recoveries.max(axis=0)>EPS):
+                sources = np.flatnonzero(recoveries[:,code]>EPS)
+                targets = self.recovered[sources]
+                counts = np.minimum(recoveries[sources,code],self.n[sources])
+                self.n[sources] -= counts
+                self.n[targets] += counts
+                row = self.variantRows[code]
+                immune = counts[:,None]*self.immunizationTable.base[row][None,:]
+                self.immune[targets] += immune
+                self.losses[targets,:,i:] += immune[:,:,None]*self.pmfs[row][None,:,:self.steps-i]
+        confirmations = self.confirmations.pop(i,None)
+        if confirmations is not None:
+            sources = np.flatnonzero(confirmations>EPS)
+            self._move(i,sources,self.confirmed[sources],confirmations[sources])
+        # vaccinated agents become immune, the cause is given by their dose level
+        starts = self.starts.pop(i,None)
+        if starts is not None:
+            idx = np.flatnonzero(starts.sum(axis=1)>EPS)
+            rows = self.vaccRows[self.dose[idx]]
+            base = self.immunizationTable.base[rows]
+            gaps = self._get_base_gaps(rows)
+            self.unbased[idx] += starts[idx,:,None]*np.divide(gaps,base[:,:,None],out=np.zeros_like(gaps),where=base[:,:,None]>EPS)
+            self.immune[idx] += starts[idx]
+            self.losses[idx,:,i:] += starts[idx,:,None]*self.pmfs[rows,:,:self.steps-i]
+        # the immunity losses are spread uniformly over the agents without base immunity against a variant
+        self.unbased *= 1-np.divide(self.losses[:,:,i],self.immune,out=np.zeros_like(self.immune),where=self.immune>EPS)[:,:,None]
+        self.immune -= self.losses[:,:,i]
+        self.immune = np.clip(self.immune,0,self.n[:,None])
+        self.unbased = np.clip(self.unbased,0,self.immune[:,:,None])
+        return dict()
+
+    def get_totals(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of agents
+        """
+        counts = np.bincount(self.categories,weights=self.n,minlength=NCATEGORIES)
+        return {k:counts[v].sum() for k,v in AGGREGATES.items()}
+
+    def get_immunes(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of immune agents per observable, active cases count as immune
+        """
+        immune = np.where(self.inactive[:,None],self.immune,self.n[:,None])
+        immunes = np.zeros((NCATEGORIES,len(self.observables)))
+        np.add.at(immunes,self.categories,immune)
+        return {k:immunes[v].sum(axis=0) for k,v in AGGREGATES.items()}
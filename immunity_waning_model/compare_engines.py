@@ -0,0 +1,65 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import sys
+import numpy as np
+
+from config import Config
+from ensemble_runner import EnsembleRunner
+import datetime as dt
+
+PREFIXES = ['immune','vaccinated immune '] #compared result keys are given by prefix and observable
+MINSHARE = 0.01 #days on which the reference is below this share of its maximum are left out, relative deviations are dominated by noise there
+
+
+def run_engine(config:Config,engine:str) -> dict:
+    """
+    :param config: config instance
+    :param engine: name of the engine
+    :return: ensemble statistics of config.replicates replicates simulated with the given engine
+    """
+    return EnsembleRunner(config.for_branch(engine,{'engine':engine})).run()[1]
+
+
+def compare(result:dict,reference:dict,observables:list[str]) -> list[tuple]:
+    """
+    :param result: ensemble statistics of the compared engine
+    :param reference: ensemble statistics of the reference engine
+    :param observables: list of observables
+    :return: list of result key, mean and worst relative deviation of the ensemble means and mean relative standard deviation of the reference replicates
+    """
+    rows = list()
+    for prefix in PREFIXES:
+        for o in observables:
+            key = prefix+o
+            mean = reference[key+' mean']
+            mask = mean>=MINSHARE*mean.max()
+            deviation = result[key+' mean'][mask]/mean[mask]-1
+            worst = deviation[np.argmax(np.abs(deviation))]
+            rows.append((key,deviation.mean(),worst,np.mean(reference[key+' std'][mask]/mean[mask])))
+    return rows
+
+
+if __name__=='__main__':
+    """
+    Compares the immunity levels simulated by an engine with the ones of a reference engine, e.g.
+    python compare_engines.py config.json cohort vectorized
+    Both engines simulate config.replicates replicates, deviations of the ensemble means are reported relative to the reference. The relative standard deviation of the reference replicates indicates the seed noise of a single run.
+    """
+    config = Config(sys.argv[1],dt.datetime.now().strftime('%Y%m%d%H%M%S'))
+    engine = sys.argv[2]
+    referenceEngine = sys.argv[3] if len(sys.argv)>3 else 'agent'
+    result = run_engine(config,engine)
+    reference = run_engine(config,referenceEngine)
+    print('%-40s %10s %10s %10s'%('key','mean dev','worst dev','ref std'))
+    for key,mean,worst,std in compare(result,reference,config.observables):
+        print('%-40s %+9.1f%% %+9.1f%% %9.1f%%'%(key,100*mean,100*worst,100*std))
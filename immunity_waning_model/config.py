@@ -9,15 +9,23 @@ martin.bicher@dwh.at or visit
 https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
+import copy
 import hashlib
 import json
 import os
 import shutil
+import tempfile
 import datetime as dt
+import numpy as np
 from loss_sampler import LossSampler
+from population import CHUNKSIZE
 from fit_distribution_means import fit_distribution_mean, adjust_vacc_values, FitPlotter
 from utils import vname_function
 
+NONSTATEFIELDS = ['tend','scenario','resultFolder','plotPdfs','plotFits','populationFolder','replicates','quantiles','checkpointFolder','checkpointInterval','checkpointKeep','forkDate','branches','cacheFolder','cacheSize','exportCsv',
+               'detectionProbability','filenameEpidata','filenameVaccdata','filenameVariantdata','filenamePopulationdata'] #fields without influence on the simulation state of a given day apart from the daily inputs, see Config.state_hash
+FITSTREAM = 0xF17 #mixed into the seed for the stream of the waning distribution fits, keeps it apart from the simulation streams
+
 
 class Config:
     def __init__(self,filename:str,experimentTimestamp:str):
@@ -27,11 +35,11 @@ class Config:
         :param filename: path to json config file as string
         :param experimentTimestamp: timestamp when the experiment is started
         """
+        self.filename = filename
         with open(filename,'r') as f:
             self.file_content = json.load(f)
         # make hash from json
-        dumped = json.dumps(self.file_content, sort_keys=True).encode("utf-8")
-        self._hash = hashlib.md5(dumped).hexdigest()
+        self._hash = self._make_hash(self.file_content)
 
         self._experimentTimestamp = experimentTimestamp
         self.seed = int(self.file_content['seed']) #integer seed for RNG
@@ -42,7 +50,7 @@ class Config:
         else: #if not defined manually, set to default name
             self.scenario = 'immunizationLevel_'+self.tend.strftime('%Y%m%d')
 
-        if 'federalstate' in self.file_content.keys(): #restrict to certain federalstate. Some plot routines might not work for specific federalstate
+        if 'federalstate' in self.file_content.keys(): #restrict to certain federalstate. Some plot routines might not work for specific federalstate. "all" runs every federalstate in parallel, see RegionalRunner
             self.federalstate = self.file_content['federalstate']
             self._folderstamp = self.scenario+'_'+self.federalstate+'_'+self._experimentTimestamp
         else:
@@ -73,18 +81,18 @@ class Config:
             'recoveryDelayUndet']])  # recovery time (in days) of undetected cases. A random vector entry is drawn.
 
         self.observables = self.file_content['observables']
+        fitSeeds = np.random.SeedSequence([self.seed,FITSTREAM]) #the fitted parameters only depend on the config, not on the process
         for key1,value1 in self.observables.items():
             for key2, value2 in value1.items():
                 ls = LossSampler(value2['distribution'], 1)
-                samplefun = lambda x:ls.sample_with_mean(x)
+                samplefun = lambda x,size,rng,ls=ls: ls.sample_with_mean(x,size=size,rng=rng)
                 if 'mean' not in value2.keys():
                     print('fitting '+key2+' against '+key1)
                     if 'VACC' in key2:
                         refs = [[int(x[0])-self.vaccDelay, int(x[1])-self.vaccDelay, float(x[2])] for x in value2['values']]
                     else:
                         refs = [[int(x[0]),int(x[1]),float(x[2])] for x in value2['values']]
-                    ls = LossSampler(value2['distribution'],1)
-                    base,mean = fit_distribution_mean(refs,samplefun)
+                    base,mean = fit_distribution_mean(refs,samplefun,fitSeeds)
                     print([base,mean])
                     value2['mean'] = mean
                     value2['base'] = base
@@ -115,7 +123,7 @@ class Config:
                         value2 = self.observables[target]['DEFAULT']
                     print(vname_function(cause) + ' against ' + vname_function(target))
                     ls = LossSampler(value2['distribution'], 1)
-                    samplefun = lambda x: ls.sample_with_mean(x)
+                    samplefun = lambda x,size,rng,ls=ls: ls.sample_with_mean(x,size=size,rng=rng)
                     if 'VACC' in cause:
                         refs = [[int(x[0]) - self.vaccDelay, int(x[1]) - self.vaccDelay, float(x[2])] for x in
                                 value2['values']]
@@ -125,9 +133,10 @@ class Config:
                         label = value2["source"]
                     else:
                         label = ""
-                    plotter.plot_fit( value2['distribution'], refs, samplefun, value2['base'],value2['mean'], vname_function(cause) + ' against ' + vname_function(target), label)
+                    plotter.plot_fit( value2['distribution'], refs, samplefun, value2['base'],value2['mean'], vname_function(cause) + ' against ' + vname_function(target), label, fitSeeds)
             plotter.finish_plot_fit(self.resultfolder)
 
+        fitGenerator = np.random.default_rng(fitSeeds)
         for key1,value1 in self.observables.items():
             aPriorBases = list()
             samplefuns = list()
@@ -138,15 +147,78 @@ class Config:
                     means.append(vacc['mean'])
                     aPriorBases.append(vacc['base'])
                     ls = LossSampler(vacc['distribution'], 1)
-                    samplefun = lambda x: ls.sample_with_mean(x)
+                    samplefun = lambda x,size,rng,ls=ls: ls.sample_with_mean(x,size=size,rng=rng)
                     samplefuns.append(samplefun)
                 else:
                     break
-            aPosteriorBases = adjust_vacc_values(samplefuns,means,aPriorBases,self.vaccIntervals)
+            aPosteriorBases = adjust_vacc_values(samplefuns,means,aPriorBases,self.vaccIntervals,fitGenerator)
             for i in range(len(aPosteriorBases)):
                 vacc = value1['VACC' + str(i+1)]
                 vacc['base']=aPosteriorBases[i]
 
+        if 'engine' in self.file_content.keys(): #engine to distribute cases and vaccinations. "agent" walks over all agents one by one, "vectorized" and "indexed" use array operations, "weighted" uses super-agents representing several persons, "cohort" tracks aggregated cohorts instead of agents
+            self.engine = self.file_content['engine']
+        else:
+            self.engine = 'agent'
+        if 'lossResolution' in self.file_content.keys(): #width of the waning duration bins in days for the "weighted" engine. Coarser resolutions lead to fewer agents
+            self.lossResolution = int(self.file_content['lossResolution'])
+        else:
+            self.lossResolution = 7
+        if 'populationFolder' in self.file_content.keys(): #folder for memory-mapped agent columns. Allows populations larger than the main memory, agents are kept in memory if not defined
+            self.populationFolder = self.file_content['populationFolder']
+        else:
+            self.populationFolder = None
+        if 'chunkSize' in self.file_content.keys(): #number of agents processed at once in passes over the whole population. Bounds the size of temporary arrays
+            self.chunkSize = int(self.file_content['chunkSize'])
+        else:
+            self.chunkSize = CHUNKSIZE
+        if 'shards' in self.file_content.keys(): #number of worker processes, each simulating its share of the population
+            self.shards = int(self.file_content['shards'])
+        else:
+            self.shards = 1
+        if 'singlePass' in self.file_content.keys(): #simulate all regions in one pass over the days instead of parallel worker processes, only relevant if federalstate is "all"
+            self.singlePass = bool(self.file_content['singlePass'])
+        else:
+            self.singlePass = False
+        if 'replicates' in self.file_content.keys(): #number of replicates with independent seeds, the first one uses seed. Mean and quantile bands are exported additionally if larger than one
+            self.replicates = int(self.file_content['replicates'])
+        else:
+            self.replicates = 1
+        if 'quantiles' in self.file_content.keys(): #probabilities of the quantile bands of replicate ensembles
+            self.quantiles = [float(x) for x in self.file_content['quantiles']]
+        else:
+            self.quantiles = [0.05,0.5,0.95]
+        if 'checkpointFolder' in self.file_content.keys(): #folder for snapshots of the simulation state. Later runs whose inputs are identical up to a snapshot resume from it instead of starting at t0
+            self.checkpointFolder = self.file_content['checkpointFolder']
+        else:
+            self.checkpointFolder = None
+        if 'checkpointInterval' in self.file_content.keys(): #number of days between two snapshots of the simulation state
+            self.checkpointInterval = int(self.file_content['checkpointInterval'])
+        else:
+            self.checkpointInterval = 28
+        if 'checkpointKeep' in self.file_content.keys(): #number of latest snapshots kept along the inputs of a run, older ones are deleted. Zero keeps all snapshots
+            self.checkpointKeep = int(self.file_content['checkpointKeep'])
+        else:
+            self.checkpointKeep = 4
+        if 'exportCsv' in self.file_content.keys(): #export the results to csv files in addition to the columnar binary format
+            self.exportCsv = bool(self.file_content['exportCsv'])
+        else:
+            self.exportCsv = True
+        if 'cacheFolder' in self.file_content.keys(): #folder of the result cache
+            self.cacheFolder = self.file_content['cacheFolder']
+        else:
+            self.cacheFolder = 'cache'
+        if 'cacheSize' in self.file_content.keys(): #maximum size of the result cache in MB, the least recently used results are removed beyond. 0 disables the cache
+            self.cacheSize = float(self.file_content['cacheSize'])
+        else:
+            self.cacheSize = 1000
+        if 'branches' in self.file_content.keys(): #scenario branches sharing the simulated history up to forkDate. Maps branch names to the config fields which are replaced after the fork, see ScenarioRunner
+            self.branches = self.file_content['branches']
+            self.forkDate = dt.datetime.strptime(self.file_content['forkDate'],'%Y-%m-%d') #first day simulated separately for each branch
+        else:
+            self.branches = dict()
+            self.forkDate = None
+
         self.scale = float(self.file_content['scale']) #the model is run with scale*population agents. Heavy impact on computation time. Typically ~100000 agents is sufficient. So scale 0.01 is ok for AUstria
 
         self.filenameEpidata = self.file_content['filenameEpidata'] #path to file with COVID-19 case data
@@ -171,6 +243,73 @@ class Config:
         """
         return self.scenario+'.csv'
 
+    @staticmethod
+    def _make_hash(fileContent:dict) -> str:
+        """
+        :param fileContent: parsed json config
+        :return: md5 hash of the json content, independent of the order of the fields
+        """
+        dumped = json.dumps(fileContent, sort_keys=True).encode("utf-8")
+        return hashlib.md5(dumped).hexdigest()
+
+    def for_federalstate(self,federalstate:str):
+        """
+        Creates a copy of the config restricted to another federalstate, e.g. to run several regions from one config file. The copy shares the result folder, its scenario name is extended by the federalstate.
+        :param federalstate: regionID or None for the whole country
+        :return: new config instance
+        """
+        config = copy.copy(self)
+        config.file_content = dict(self.file_content)
+        if federalstate is None:
+            config.file_content.pop('federalstate',None)
+        else:
+            config.file_content['federalstate'] = federalstate
+            config.scenario = self.scenario+'_'+federalstate
+        config.federalstate = federalstate
+        config._hash = self._make_hash(config.file_content)
+        return config
+
+    def for_replicate(self,replicate:int):
+        """
+        Creates a copy of the config for a replicate of an ensemble. Replicate 0 is the config itself, all others get independent seeds derived from seed and replicate number.
+        :param replicate: number of the replicate
+        :return: config instance
+        """
+        if replicate==0:
+            return self
+        config = copy.copy(self)
+        config.seed = int(np.random.SeedSequence([self.seed,replicate]).generate_state(1)[0])
+        config.file_content = dict(self.file_content)
+        config.file_content['seed'] = config.seed
+        config._hash = self._make_hash(config.file_content)
+        return config
+
+    def state_hash(self) -> str:
+        """
+        Hash of the config fields the simulation state depends on, i.e. without tend and output related fields. The case, vaccination, variant and detection data are left out as well, since they only enter the simulation via the daily quotas and variant ratios, which are hashed day by day, see :func:Simulation.get_input_digests.
+        :return: md5 hash of the remaining json content
+        """
+        return self._make_hash({k:v for k,v in self.file_content.items() if k not in NONSTATEFIELDS})
+
+    def for_branch(self,name:str,overrides:dict):
+        """
+        Creates the config of a scenario branch, see :class:ScenarioRunner. It is parsed from the original config file with the given fields replaced, its scenario name is extended by the branch name.
+        :param name: name of the branch
+        :param overrides: config fields to replace
+        :return: new config instance with its own result folder
+        """
+        with open(self.filename,'r') as f:
+            fileContent = json.load(f)
+        fileContent.update(overrides)
+        fileContent['scenario'] = self.scenario+'_'+name
+        fileContent.pop('branches',None)
+        fileContent.pop('forkDate',None)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder,os.path.split(self.filename)[-1])
+            with open(filename,'w') as f:
+                json.dump(fileContent,f,indent=2)
+            return Config(filename,self._experimentTimestamp)
+
     def hash(self):
         """
         :return: semantic hash for config json file to check for cached results
@@ -0,0 +1,144 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import csv
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+import numpy as np
+
+SUFFIX = '.columns' #suffix of the sidecar files, i.e. <file>.columns.npy and <file>.columns.json
+
+
+class CsvColumns(Mapping):
+    def __init__(self,filename:str,delimiter:str=';') -> None:
+        """
+        Read-only dict view on the columns of a csv file with header line, mapping the column names to arrays.
+        On first load, the file is parsed and converted into a binary columnar sidecar next to it, i.e. <file>.columns.npy with one field per column and <file>.columns.json with the header and the key of the file. Later loads memory-map the sidecar instead of parsing the file again.
+        The key consists of size, modification time and md5 hash of the file. The hash is only computed if size or modification time changed, so that a file that is merely touched does not trigger a new conversion.
+        Columns are converted to int64 if possible, to float64 otherwise, then to datetime64[D] for ISO dates (YYYY-mm-dd) and stay strings otherwise.
+        Sidecar files are written atomically, failing to write them, e.g. in a read-only data folder, is ignored.
+        :param filename: path to the csv file
+        :param delimiter: column delimiter of the csv file
+        """
+        self.filename = filename
+        self.delimiter = delimiter
+        stat = os.stat(filename)
+        key = {'size':stat.st_size,'mtime':stat.st_mtime_ns}
+        base = filename+SUFFIX
+        metadata = self._load_metadata(base)
+        if metadata is not None and metadata['delimiter']==delimiter:
+            if metadata['size']==key['size'] and metadata['mtime']!=key['mtime'] and metadata['md5']==self._hash(filename):
+                metadata['mtime'] = key['mtime'] #touched but unchanged
+                self._write(base+'.json',lambda f: f.write(json.dumps(metadata).encode('utf-8')))
+            if metadata['size']==key['size'] and metadata['mtime']==key['mtime']:
+                try:
+                    self.header = metadata['header']
+                    self.data = np.load(base+'.npy',mmap_mode='r')
+                    return
+                except (OSError,ValueError):
+                    pass #sidecar removed or incomplete, convert again
+        self.header,self.data = self.parse(filename,delimiter)
+        metadata = {'header':self.header,'delimiter':delimiter,'md5':self._hash(filename),**key}
+        self._write(base+'.npy',lambda f: np.save(f,self.data))
+        self._write(base+'.json',lambda f: f.write(json.dumps(metadata).encode('utf-8')))
+
+    @staticmethod
+    def _hash(filename:str) -> str:
+        """
+        :param filename: path to a file
+        :return: md5 hash of the file content
+        """
+        digest = hashlib.md5()
+        with open(filename,'rb') as f:
+            for block in iter(lambda: f.read(1<<20),b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _load_metadata(base:str) -> dict:
+        """
+        :param base: path of the sidecar files without extension
+        :return: metadata of the sidecar, None if there is none
+        """
+        try:
+            with open(base+'.json','r') as f:
+                return json.load(f)
+        except (OSError,ValueError):
+            return None
+
+    @staticmethod
+    def _write(filename:str,write) -> None:
+        """
+        Writes a file atomically, i.e. into a temporary file which is renamed afterwards. Errors are ignored.
+        :param filename: path of the file
+        :param write: function writing the content into the given binary file object
+        :return:
+        """
+        temporary = filename+'.'+str(os.getpid())
+        try:
+            with open(temporary,'wb') as f:
+                write(f)
+            os.replace(temporary,filename)
+        except OSError:
+            pass
+
+    @staticmethod
+    def convert(values:list[str]) -> np.array:
+        """
+        :param values: entries of a column
+        :return: array of the first type of int64, float64, datetime64[D] and string which all entries can be converted to
+        """
+        values = np.array(values,dtype=str)
+        for dtype in [np.int64,np.float64]:
+            try:
+                return values.astype(dtype)
+            except ValueError:
+                continue
+        if len(values)>0 and np.all(np.char.str_len(values)==10): #ISO dates only, empty entries would become NaT
+            try:
+                return values.astype('datetime64[D]')
+            except ValueError:
+                pass
+        return values
+
+    @staticmethod
+    def parse(filename:str,delimiter:str) -> tuple:
+        """
+        Parses the csv file
+        :param filename: path to the csv file
+        :param delimiter: column delimiter of the csv file
+        :return: list of the column names and structured array with one field per column
+        """
+        with open(filename,'r') as f:
+            r = csv.reader(f,delimiter=delimiter)
+            header = next(r)
+            rows = [line for line in r if len(line)>0]
+        columns = [CsvColumns.convert([line[k] for line in rows]) for k in range(len(header))]
+        data = np.empty(len(rows),dtype=[('f'+str(k),column.dtype) for k,column in enumerate(columns)])
+        for k,column in enumerate(columns):
+            data['f'+str(k)] = column
+        return header,data
+
+    def __getitem__(self,key:str) -> np.array:
+        """
+        :param key: column name
+        :return: read-only column
+        """
+        return self.data['f'+str(self.header.index(key))]
+
+    def __iter__(self):
+        return iter(self.header)
+
+    def __len__(self) -> int:
+        return len(self.header)
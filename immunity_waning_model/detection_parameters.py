@@ -12,33 +12,36 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 
 from config import Config
 import datetime as dt
+import numpy as np
 
 
 class DetectionParameters:
     def __init__(self, config: Config) -> None:
         """
         Interface between detection rate parameters and simulation.
+        The detection probability is interpolated linearly between the given dates and constant before the first and after the last one.
         :param config: config instance of the simulation
         """
-        self.detection_probabilities = dict()
         self.detection_probabilities_raw = config.detectionProbability
         self.mintime = min(self.detection_probabilities_raw.keys())
         self.maxtime = max(self.detection_probabilities_raw.keys())
+        times = sorted(self.detection_probabilities_raw.keys())
+        self.days = np.array([(x-self.mintime).days for x in times],dtype=float) #days of the given probabilities since mintime
+        self.probabilities = np.array([self.detection_probabilities_raw[x] for x in times],dtype=float)
+
+    def get_detection_probabilities(self,dates:np.array) -> np.array:
+        """
+        Interpolates the detection probabilities for many dates at once
+        :param dates: array of dates (datetime64)
+        :return: array of numbers between [0,1]
+        """
+        days = (dates.astype('datetime64[D]')-np.datetime64(self.mintime,'D')).astype(float)
+        return np.interp(days,self.days,self.probabilities)
 
     def get_detection_probability(self,time:dt.datetime) -> float:
         """
-        Returns the internally used list of variants
+        Returns the detection probability of the given date
         :param time: current time
         :return: number between [0,1]
         """
-        if not (time in self.detection_probabilities.keys()):
-            if (time <= self.mintime):
-                self.detection_probabilities[time] = self.detection_probabilities_raw[self.mintime]
-            elif (time >= self.maxtime):
-                self.detection_probabilities[time] = self.detection_probabilities_raw[self.maxtime]
-            else:
-                time1 = max([x for x in self.detection_probabilities_raw.keys() if x<= time])
-                time2 = min([x for x in self.detection_probabilities_raw.keys() if x> time])
-                fac = (time2-time).days/(time2-time1).days
-                self.detection_probabilities[time] = fac*self.detection_probabilities_raw[time2]+(1-fac)*self.detection_probabilities_raw[time1]
-        return self.detection_probabilities[time]
\ No newline at end of file
+        return float(self.get_detection_probabilities(np.array([np.datetime64(time,'D')]))[0])
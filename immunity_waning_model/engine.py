@@ -0,0 +1,115 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AggregateCounters
+from event_calendar import EventCalendar
+from population import Population
+
+
+class Engine:
+    def __init__(self,simulation,population:Population,calendar:EventCalendar,counters:AggregateCounters) -> None:
+        """
+        Base class for engines distributing the daily cases and vaccinations among the agents
+        :param simulation: simulation instance providing config and parameter classes
+        :param population: population store to operate on
+        :param calendar: event calendar to schedule the state changes of the agents
+        :param counters: aggregate counters to keep up to date when agents change their category
+        """
+        self.attach(simulation)
+        self.pop = population
+        self.calendar = calendar
+        self.counters = counters
+        self.observables = list(simulation.config.observables.keys())
+        self.variants = self.variantParameters.get_variants()
+
+    def attach(self,simulation) -> None:
+        """
+        Binds the engine to the config, parameter classes and random streams of a simulation, e.g. after it was restored from a checkpoint
+        :param simulation: simulation instance providing config and parameter classes
+        :return:
+        """
+        self.config = simulation.config
+        self.variantParameters = simulation.variantParameters
+        self.batchSampler = simulation.batchSampler
+
+    def __getstate__(self) -> dict:
+        """
+        The references to the simulation are not pickled with the engine, see :func:attach
+        :return: state of the engine
+        """
+        state = dict(self.__dict__)
+        for name in ['config','variantParameters','batchSampler']:
+            state.pop(name)
+        return state
+
+    def extend(self,steps:int) -> None:
+        """
+        Extends the simulation horizon, e.g. if a simulation is resumed from a checkpoint with a later end date. Requires an event calendar which keeps the events after the horizon.
+        :param steps: new number of simulation days
+        :return:
+        """
+        self.calendar.extend(steps)
+
+    def step(self,i:int,t:dt.datetime,cases:list[int],vaccinations:list[int]) -> np.array:
+        """
+        Distributes the cases and vaccinations of one day among the agents.
+        :param i: current simulation day
+        :param t: current date
+        :param cases: number of new detected and undetected cases
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: detected (re)infections of the day as matrix (previous variant x new variant), whereas the first row corresponds to no previous confirmed infection
+        """
+        raise NotImplementedError()
+
+    def apply_events(self,i:int) -> dict:
+        """
+        Applies the state changes scheduled for the given day and updates the aggregate counters accordingly.
+        :param i: current simulation day
+        :return: the applied events, see :func:EventCalendar.pop_events
+        """
+        events = self.calendar.pop_events(i)
+        touched = self.calendar.get_agents(events)
+        self.counters.remove(touched)
+        self.pop.apply_events(i,events)
+        self.counters.add(touched)
+        return events
+
+    def get_totals(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of agents
+        """
+        return self.counters.get_totals()
+
+    def get_immunes(self) -> dict:
+        """
+        :return: dict mapping the aggregate names (see AGGREGATES) to the current number of immune agents per observable
+        """
+        return self.counters.get_immunes()
+
+    def detach(self) -> None:
+        """
+        Prepares the engine to continue in a forked process independently of its parent, see :func:Population.detach
+        :return:
+        """
+        if self.pop is not None:
+            self.pop.detach()
+
+    def close(self) -> None:
+        """
+        Releases the resources of the engine, i.e. the memory-mapped population files. Call after the last simulation day.
+        :return:
+        """
+        if self.pop is not None:
+            self.pop.close()
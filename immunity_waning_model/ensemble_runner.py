@@ -0,0 +1,54 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import copy
+import os
+
+from config import Config
+from ensemble_statistics import EnsembleStatistics
+from simulation import Simulation
+from worker_pool import WorkerPool
+
+
+class EnsembleRunner:
+    def __init__(self,config:Config) -> None:
+        """
+        Runs config.replicates replicates of the simulation with independent seeds in parallel worker processes, see :class:WorkerPool.
+        The first replicate uses the seed of the config and serves as point estimate, i.e. it equals a single run. The results of all replicates are reduced to mean and quantile bands on the fly, see :class:EnsembleStatistics, so that only few results are kept in memory at once.
+        :param config: config instance
+        """
+        self.config = config
+        self.simulation = Simulation(config) #parses the input data once for all replicates
+        self.configs = [config.for_replicate(r) for r in range(config.replicates)]
+        self.processes = min(config.replicates,os.cpu_count() or 1) #number of replicates simulated at once
+
+    def run_replicate(self,r:int) -> dict:
+        """
+        :param r: number of the replicate
+        :return: simulation result of the replicate as dictionary
+        """
+        simulation = copy.copy(self.simulation)
+        simulation.config = self.configs[r]
+        return simulation.run()
+
+    def run(self) -> tuple[dict,dict]:
+        """
+        Simulates all replicates, at most processes at once. The results are added to the statistics in the order of the replicates, so the quantile estimates are reproducible.
+        :return: result of the first replicate and the ensemble statistics in the format of a simulation result
+        """
+        statistics = EnsembleStatistics(self.config.quantiles)
+        pointEstimate = None
+        for r,result in WorkerPool(self.processes).imap(self.run_replicate,range(self.config.replicates)):
+            statistics.add(result)
+            if r==0:
+                pointEstimate = result
+        return pointEstimate,statistics.get_result()
@@ -0,0 +1,76 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+from p2_quantile import P2Quantile
+
+BUFFERSIZE = 20 #number of replicates kept exactly before switching to streaming quantile estimates
+
+
+class EnsembleStatistics:
+    def __init__(self,quantiles:list[float]) -> None:
+        """
+        Streaming statistics over the results of several simulation replicates. Results are added one after the other and can be discarded afterwards.
+        For every result key and day, mean and standard deviation are updated with Welford's algorithm. Quantiles are computed exactly for the first BUFFERSIZE replicates, afterwards they are estimated with :class:P2Quantile which is initialized with these replicates.
+        :param quantiles: probabilities of the quantile bands, e.g. [0.05,0.5,0.95]
+        """
+        self.quantiles = list(quantiles)
+        self.count = 0
+        self.time = None
+        self.means = dict() #result key -> running mean
+        self.squares = dict() #result key -> running sum of squared deviations from the mean
+        self.buffers = dict() #result key -> list of the first replicates, replaced by the estimators once full
+        self.estimators = dict() #result key -> list of quantile estimators
+
+    def add(self,result:dict) -> None:
+        """
+        :param result: simulation result as dictionary, all replicates must have the same keys and time window
+        :return:
+        """
+        self.count += 1
+        self.time = result['time']
+        for key,values in result.items():
+            if key=='time':
+                continue
+            values = np.asarray(values,dtype=float)
+            if key not in self.means.keys():
+                self.means[key] = np.zeros(values.shape)
+                self.squares[key] = np.zeros(values.shape)
+                self.buffers[key] = list()
+            delta = values-self.means[key]
+            self.means[key] += delta/self.count
+            self.squares[key] += delta*(values-self.means[key])
+            if key in self.estimators.keys():
+                for estimator in self.estimators[key]:
+                    estimator.add(values)
+            else:
+                self.buffers[key].append(values)
+                if len(self.buffers[key])==BUFFERSIZE:
+                    sample = self.buffers.pop(key)
+                    self.estimators[key] = [P2Quantile(p,sample) for p in self.quantiles]
+
+    def get_result(self) -> dict:
+        """
+        :return: dict in the format of a simulation result, containing the mean ("<key> mean"), the sample standard deviation ("<key> std") and the quantiles (e.g. "<key> q5" for the 5% quantile) of every result key
+        """
+        result = {'time':self.time}
+        for key in self.means.keys():
+            result[key+' mean'] = self.means[key].copy()
+            result[key+' std'] = np.sqrt(self.squares[key]/max(self.count-1,1))
+            if key in self.estimators.keys():
+                quantiles = [estimator.get() for estimator in self.estimators[key]]
+            else:
+                quantiles = np.quantile(self.buffers[key],self.quantiles,axis=0)
+            for p,values in zip(self.quantiles,quantiles):
+                result[key+' q{:g}'.format(100*p)] = values
+        return result
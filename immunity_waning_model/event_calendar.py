@@ -0,0 +1,153 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+from event_type import EventType
+
+
+class EventCalendar:
+    def __init__(self,steps:int,keepLater:bool=False) -> None:
+        """
+        Day-bucketed calendar for the discrete state changes of the agents. Each transition is scheduled when it is drawn, so that every simulation day only touches the agents with events on that day.
+        Events are never removed when an agent is rescheduled. Instead, an event is only applied if it still matches the corresponding day column of the population (e.g. immDate, lossDate), i.e. outdated events are skipped lazily.
+        :param steps: number of simulation days. Events after the simulation horizon are discarded unless keepLater is set.
+        :param keepLater: keep the events after the simulation horizon, so that the calendar can be extended later on, see :func:extend
+        """
+        self.steps = steps
+        self.buckets = [dict() for _ in range(steps)] #day -> {EventType: ([agent arrays],[observable arrays],[single agents],[single observables])}
+        self.later = dict() if keepLater else None #day after the horizon -> bucket, None if these events are discarded
+
+    def __getstate__(self) -> dict:
+        """
+        The arrays of each event type are merged into a single pair of arrays with the smallest sufficient integer types, since pickling many small arrays is slow and bloats checkpoints.
+        :return: state of the calendar
+        """
+        state = dict(self.__dict__)
+        state['buckets'] = [self._merge(bucket) for bucket in self.buckets]
+        if self.later is not None:
+            state['later'] = {day:self._merge(bucket) for day,bucket in self.later.items()}
+        return state
+
+    @staticmethod
+    def _merge(bucket:dict) -> dict:
+        """
+        :param bucket: bucket of a day
+        :return: equivalent bucket with one array of agents and observables per event type
+        """
+        merged = dict()
+        for eventType,entry in bucket.items():
+            agents,observables = EventCalendar._concatenate(entry)
+            if len(agents)>0:
+                merged[eventType] = ([agents.astype(np.min_scalar_type(agents.max()))],[observables.astype(np.min_scalar_type(-max(observables.max(),1)))],list(),list())
+        return merged
+
+    @staticmethod
+    def _concatenate(entry:tuple) -> tuple:
+        """
+        :param entry: entry of an event type within a bucket
+        :return: tuple of all agent indices and all observable indices of the entry
+        """
+        return np.concatenate(entry[0]+[np.array(entry[2],dtype=np.int64)]),np.concatenate(entry[1]+[np.array(entry[3],dtype=np.int64)])
+
+    def _get_bucket(self,day:int) -> dict:
+        """
+        :param day: day of an event
+        :return: bucket of the day, None if events of this day are discarded
+        """
+        if 0<=day<self.steps:
+            return self.buckets[day]
+        if day>=self.steps and self.later is not None:
+            return self.later.setdefault(day,dict())
+        return None
+
+    def extend(self,steps:int) -> None:
+        """
+        Extends the simulation horizon, e.g. if a simulation is resumed from a checkpoint with a later end date. Events after the former horizon are moved into the calendar in their original order if they were kept.
+        :param steps: new number of simulation days, a smaller number is ignored
+        :return:
+        """
+        for day in range(self.steps,steps):
+            self.buckets.append(self.later.pop(day,dict()) if self.later is not None else dict())
+        self.steps = max(self.steps,steps)
+
+    def schedule(self,eventType:EventType,day:int,agent:int,observable:int=-1) -> None:
+        """
+        Schedules a single event
+        :param eventType: type of the event
+        :param day: day of the event
+        :param agent: index of the agent
+        :param observable: column index of the observable for StartImmune and EndImmune events
+        :return:
+        """
+        bucket = self._get_bucket(day)
+        if bucket is not None:
+            entry = bucket.setdefault(eventType,(list(),list(),list(),list()))
+            entry[2].append(agent)
+            entry[3].append(observable)
+
+    def schedule_many(self,eventType:EventType,days:np.array,agents:np.array,observables:np.array=None) -> None:
+        """
+        Schedules several events of the same type at once
+        :param eventType: type of the events
+        :param days: days of the events
+        :param agents: indices of the agents
+        :param observables: column indices of the observables for StartImmune and EndImmune events
+        :return:
+        """
+        days = np.asarray(days)
+        agents = np.asarray(agents)
+        if observables is None:
+            observables = np.full(len(agents),-1)
+        mask = (days>=0) & ((days<self.steps) | (self.later is not None))
+        days,agents,observables = days[mask],agents[mask],np.asarray(observables)[mask]
+        if len(days)==0:
+            return
+        order = np.argsort(days,kind='stable')
+        days,agents,observables = days[order],agents[order],observables[order]
+        uniqueDays,starts = np.unique(days,return_index=True)
+        ends = np.append(starts[1:],len(days))
+        for day,start,end in zip(uniqueDays,starts,ends):
+            entry = self._get_bucket(day).setdefault(eventType,(list(),list(),list(),list()))
+            entry[0].append(agents[start:end])
+            entry[1].append(observables[start:end])
+
+    def pop_events(self,day:int) -> dict:
+        """
+        Removes and returns all events of the given day
+        :param day: current simulation day
+        :return: dict mapping the event types to tuples of agent indices and observable indices
+        """
+        bucket = self.buckets[day]
+        self.buckets[day] = dict()
+        return {k:self._concatenate(v) for k,v in bucket.items()}
+
+    def clear(self,day:int) -> None:
+        """
+        Removes all events from the given day on, e.g. since the agents got renumbered and are rescheduled
+        :param day: first day to clear
+        :return:
+        """
+        for d in range(max(day,0),self.steps):
+            self.buckets[d] = dict()
+        if self.later is not None:
+            self.later = {d:bucket for d,bucket in self.later.items() if d<day}
+
+    @staticmethod
+    def get_agents(events:dict) -> np.array:
+        """
+        :param events: events as returned by :func:pop_events
+        :return: unique indices of all agents affected by the events
+        """
+        if len(events)==0:
+            return np.zeros(0,dtype=int)
+        return np.unique(np.concatenate([v[0] for v in events.values()]))
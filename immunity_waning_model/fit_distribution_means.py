@@ -20,17 +20,18 @@ from scipy.optimize import minimize
 
 ITERS = 2000
 
-def estimate_kaplan_meier_kurve(samplefun:Callable,maxT:int,base:float,mean:float) -> np.array:
+def estimate_kaplan_meier_kurve(samplefun:Callable,maxT:int,base:float,mean:float,seedSequence:np.random.SeedSequence) -> np.array:
     """
     The function estimates the ratio of persons to be immune t days after the immunization event. This is done using a kaplan meier estimator given by the 'lifelines' package.
-    :param samplefun: function to sample from
+    The samples are drawn from a new generator of the given seed sequence on every call, so that the curves of different parameters are estimated with the same random numbers.
+    :param samplefun: function to sample from, called with mean value, number of samples and generator
     :param maxT: evaluate the kaplan meier curve for all t in [0,1,...,maxT]
     :param base: base probability that intervention leads to immunity
     :param mean: mean value parameter for the waning distribution
+    :param seedSequence: seed sequence of the sampling stream
     :return: array of the survival function to times [0,1,...,maxT]
     """
-    np.random.seed(12345)
-    X = np.array([samplefun(mean) for i in range(ITERS)])
+    X = samplefun(mean,ITERS,np.random.default_rng(seedSequence))
     from lifelines import KaplanMeierFitter
     kmf = KaplanMeierFitter()
     kmf.fit(X)
@@ -60,7 +61,7 @@ def error_fun(referenceValues:np.array,modelValues:np.array) -> float:
     """
     return sum(abs(referenceValues-modelValues)/abs(referenceValues))
 
-def fit_distribution_mean(references:list,samplefun:Callable) -> Tuple[float, float]:
+def fit_distribution_mean(references:list,samplefun:Callable,seedSequence:np.random.SeedSequence) -> Tuple[float, float]:
     """
     In literature, effectiveness of an pharmaceutical intervention is typically defined for an observed time span after the event. E.g. vaccine effectiveness 2 to 4 weeks after the vaccination is 0.8, meaning, that compared to a cohort without vaccination, numbers of infections is reduced by 4/5th. We may interpret this result in that way, that the intervention causes that 80% of all vaccinated persons are rendered immune withn the regarded time-period. I.e. the average fraction of immunes is f_data(t)=0.8 for 14<=t<28.
     We may model this behaviour individually by regarding two distinct processes:
@@ -72,36 +73,38 @@ def fit_distribution_mean(references:list,samplefun:Callable) -> Tuple[float, fl
     The optimization is done using the Nelder-Mead downhill simplex algorithm. The survival curve f_model is estimated using sampling of waning dates and fit of the Kaplan Meier curve via a suitable python package.
 
     :param references: list to specify the reference data in the format [[dayStart,dayEnd,measuredEffectivenss],...]
-    :param samplefun: function handle to the sample the waning dates from
+    :param samplefun: function handle to the sample the waning dates from, called with mean value, number of samples and generator
+    :param seedSequence: seed sequence of the sampling stream of the Kaplan Meier estimates
     :return: fitted base and mean value
     """
     maxT = int(max([x[1] for x in references]))
     refValues = np.array([x[2] for x in references])
     t1s = [int(x[0]) for x in references]
     t2s = [int(x[1]) for x in references]
-    minimizefun = lambda p: error_fun(refValues,calculate_average_effectiveness(t1s,t2s,estimate_kaplan_meier_kurve(samplefun,maxT,p[0],p[1])))
+    minimizefun = lambda p: error_fun(refValues,calculate_average_effectiveness(t1s,t2s,estimate_kaplan_meier_kurve(samplefun,maxT,p[0],p[1],seedSequence)))
     #plt.plot(tValues,estimate_kaplan_meier_kurve(samplefun,tValues,0.3058114908088022,50))
     #plt.plot(tValues,refValues,'r')
     #plt.show()
     opt = minimize(minimizefun,np.array([refValues[0],100.0]),bounds=[[0.0,1.0],[10.0,1000.0]],method='Nelder-Mead')
     return opt.x[0],opt.x[1]
 
-def adjust_vacc_values(samplefuns:list,means:list,aPriorBases:list,vaccIntervals:list)->list:
+def adjust_vacc_values(samplefuns:list,means:list,aPriorBases:list,vaccIntervals:list,rng:np.random.Generator)->list:
     """
     In the model, cascading immunization events will provide stacking immunity levels. I.e. chance to become immune after two vaccine doses (+14 days) equals to
     P2 = p1*(1-p12)+(1-p1*(1-p12))*p2
     whereas p1 and p2 refer to the base probabilities that the corresponding first and second shot leads to immunity, whereas p12 refers to the probability to lose immunity betweem shot one and two
     Clearly, only values for P2 are given in literature. Given p1 = P1 and p12 via the estimated waning distribution, we may to calculate p2 in an inverse process. (Analogously for p3,p4,...)
-    :param samplefuns: functions to sample waning of immunity after first, second, ... vaccination
+    :param samplefuns: functions to sample waning of immunity after first, second, ... vaccination, called with mean value, number of samples and generator
     :param means: mean values of the corresponding sample functions
     :param aPriorBases: Values for P1,P2,...
     :param vaccIntervals: Typical intervals between first, second,... dose
+    :param rng: random number generator to sample the waning durations
     :return: values for p1,p2,...
     """
     aPosteriorBases=[aPriorBases[0]]
     for i in range(0,len(aPriorBases)-1):
-        loseCount = [samplefuns[i](means[i]) for k in range(ITERS)]
-        fractionImm = len([x for x in loseCount if x > vaccIntervals[i]]) / ITERS
+        loseCount = samplefuns[i](means[i],ITERS,rng)
+        fractionImm = np.count_nonzero(loseCount > vaccIntervals[i]) / ITERS
         # overallProb2 = overallProb1*waningfactor + (1-overallProb1*waningfactor)*prob2 -> transform to prob2
         prob2 = (aPriorBases[i+1] - aPriorBases[i] * fractionImm) / (
                 1 - aPosteriorBases[-1] * fractionImm)
@@ -119,7 +122,7 @@ class FitPlotter:
         self.labels = dict()
         self.currLabelid = 1
 
-    def plot_fit(self,distributionName:str, references: list, samplefun:Callable, base:float, mean:float, nameStamp:str, label:str) -> None:
+    def plot_fit(self,distributionName:str, references: list, samplefun:Callable, base:float, mean:float, nameStamp:str, label:str, seedSequence:np.random.SeedSequence) -> None:
         """
         Plots the modeled fraction of persons immune after t days. If a fitting process was performed, the fitting data is displayed as well.
         :param resultFolder: folder to save plot into
@@ -130,6 +133,7 @@ class FitPlotter:
         :param mean: mean value for the lose-immunity-date
         :param nameStamp: title of the corresponding subplot
         :param label: source of the data as label to the plot
+        :param seedSequence: seed sequence of the sampling stream of the Kaplan Meier estimate
         :return:
         """
         if label!='':
@@ -140,7 +144,7 @@ class FitPlotter:
 
         self.fig.add_subplot(self.gs[self.currRow,self.currCol])
         tmx = 1000
-        effs = estimate_kaplan_meier_kurve(samplefun,tmx-1, base, mean)
+        effs = estimate_kaplan_meier_kurve(samplefun,tmx-1, base, mean, seedSequence)
         pl = plt.bar(range(tmx), effs,width=1.0,color=[0,0,1],alpha=0.35)
         t1s = [int(x[0]) for x in references]
         t2s = [int(x[1]) for x in references]
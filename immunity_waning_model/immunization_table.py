@@ -0,0 +1,122 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+from base_immunization_parameters import BaseImmunizationParameters
+from loss_parameters import LossParameters
+
+TABULATIONSIZE = 1<<20 #number of samples used to tabulate the distribution of the waning durations
+TABULATIONSEED = 0 #seed of the tabulation samples, kept apart from the simulation streams so that the table does not depend on the seed
+
+
+class ImmunizationTable:
+    def __init__(self,baseImmunizationParameters:BaseImmunizationParameters,lossParameters:LossParameters,causes:list[str],targets:list[str]) -> None:
+        """
+        Precompiled parameter table of all immunization causes. Resolves the DEFAULT fallbacks of the observable parameters once, so that sampling an immunization event for all observables only requires array operations.
+        Each cause is mapped to a row, the columns are ordered like the given targets.
+        :param baseImmunizationParameters: base immunity parameters of the simulation
+        :param lossParameters: immunity loss parameters of the simulation
+        :param causes: immunization causes, typically the variants and VACC1,2,3,4
+        :param targets: list of observables, defines the column order
+        """
+        self.causes = list(causes)
+        self.targets = list(targets)
+        self.rows = {cause:k for k,cause in enumerate(self.causes)} #cause -> row of the table
+        self.base = np.zeros((len(self.causes),len(self.targets))) #probability of base immunity
+        self.means = np.zeros((len(self.causes),len(self.targets))) #mean waning durations
+        self.distributions = np.zeros(len(self.causes),dtype=int) #distribution id of the first target, which is the only one actually sampled
+        self.distributionSamplers = list() #one loss sampler for each distribution id
+        self.classes = dict() #row and resolution -> distinct immunization outcomes and their probabilities, see get_immunization_classes
+        distributionIds = dict()
+        for row,cause in enumerate(self.causes):
+            for col,target in enumerate(self.targets):
+                baseValues = baseImmunizationParameters.baseValues[target]
+                samplers = lossParameters.samplers[target]
+                key = cause if cause in samplers.keys() else 'DEFAULT'
+                self.base[row,col] = baseValues[cause] if cause in baseValues.keys() else baseValues['DEFAULT']
+                self.means[row,col] = samplers[key].mean
+                if col==0:
+                    if samplers[key].distribution not in distributionIds.keys():
+                        distributionIds[samplers[key].distribution] = len(self.distributionSamplers)
+                        self.distributionSamplers.append(samplers[key])
+                    self.distributions[row] = distributionIds[samplers[key].distribution]
+
+    def get_row(self,cause:str) -> int:
+        """
+        :param cause: immunization cause
+        :return: row of the cause in the table
+        """
+        return self.rows[cause]
+
+    def base_immunity_from_uniform(self,row:int,rand:np.array) -> np.array:
+        """
+        Evaluates base immunity vectors for given uniformly distributed random numbers, one random number is used for all targets of an event
+        :param row: row of the immunization cause
+        :param rand: array of random numbers in [0,1), one for each event
+        :return: boolean array with shape (number of events, number of targets)
+        """
+        return rand[:,None]<self.base[row][None,:]
+
+    def sample_loss(self,row:int,n:int,rng:np.random.Generator) -> np.array:
+        """
+        Samples n waning duration vectors of an immunization cause. Only the duration of the first target is drawn, the others are scaled by the ratio of the means.
+        :param row: row of the immunization cause
+        :param n: number of samples
+        :param rng: random number generator
+        :return: array of waning durations in days with shape (n, number of targets)
+        """
+        means = self.means[row]
+        val = self.distributionSamplers[self.distributions[row]].sample_with_mean(means[0],size=n,rng=rng)
+        out = (val[:,None]*means[None,:]/means[0]).astype(np.int64)
+        out[:,0] = val
+        return out
+
+    def get_base_classes(self,row:int) -> tuple[np.array,np.array]:
+        """
+        Tabulates the distinct base immunity vectors of an immunization cause. Since one random number is used for all targets, the sorted base probabilities split [0,1) into intervals with identical base immunity vectors.
+        :param row: row of the immunization cause
+        :return: boolean array of the distinct base immunity vectors with shape (number of classes, number of targets) and their probabilities
+        """
+        bounds = np.unique(np.concatenate([[0.0,1.0],np.clip(self.base[row],0,1)]))
+        probabilities = np.diff(bounds)
+        classes = bounds[:-1,None]<self.base[row][None,:]
+        mask = probabilities>0
+        return classes[mask],probabilities[mask]
+
+    def get_loss_classes(self,row:int,resolution:int) -> tuple[np.array,np.array]:
+        """
+        Tabulates the distribution of the waning duration vectors of an immunization cause in bins of resolution days. Like in :func:sample_loss, only the duration of the first target is binned, the others are scaled by the ratio of the means and rounded to the resolution as well.
+        The probabilities of the bins are estimated from TABULATIONSIZE samples of a separate generator.
+        :param row: row of the immunization cause
+        :param resolution: width of the bins in days
+        :return: array of the waning duration vectors of the bins with shape (number of classes, number of targets) and their probabilities
+        """
+        means = self.means[row]
+        val = self.distributionSamplers[self.distributions[row]].sample_with_mean(means[0],size=TABULATIONSIZE,rng=np.random.default_rng(TABULATIONSEED))
+        bins,counts = np.unique(np.round(val/resolution).astype(np.int64),return_counts=True)
+        classes = np.round(bins[:,None]*means[None,:]/means[0]).astype(np.int64)*resolution
+        return classes,counts/counts.sum()
+
+    def get_immunization_classes(self,row:int,resolution:int) -> tuple[np.array,np.array,np.array]:
+        """
+        Tabulates the distinct outcomes of an immunization event, i.e. all combinations of base immunity vector and waning duration bin. The table is computed on first use.
+        :param row: row of the immunization cause
+        :param resolution: width of the waning duration bins in days
+        :return: boolean base immunity array and waning duration array, both with shape (number of classes, number of targets), and the probabilities of the classes
+        """
+        if (row,resolution) not in self.classes.keys():
+            baseClasses,baseProbabilities = self.get_base_classes(row)
+            lossClasses,lossProbabilities = self.get_loss_classes(row,resolution)
+            probabilities = np.outer(baseProbabilities,lossProbabilities).ravel() #base immunity and immunity loss are drawn independently
+            self.classes[(row,resolution)] = (np.repeat(baseClasses,len(lossClasses),axis=0),np.tile(lossClasses,(len(baseClasses),1)),probabilities/probabilities.sum())
+        return self.classes[(row,resolution)]
@@ -0,0 +1,157 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AggregateCounters
+from event_calendar import EventCalendar
+from event_type import EventType
+from indexed_pool import IndexedPool
+from population import Population
+from vectorized_engine import VectorizedEngine
+
+
+class IndexedEngine(VectorizedEngine):
+    def __init__(self,simulation,population:Population,calendar:EventCalendar,counters:AggregateCounters) -> None:
+        """
+        Vectorized engine which keeps indexed eligibility pools instead of scanning the population.
+        For each dose there is a pool of the non-active agents which are eligible for it, i.e. which got the previous dose more than the vaccination interval ago. Agents waiting for the interval to pass are kept in a day-bucketed readiness queue.
+        Daily doses are drawn uniformly from the corresponding pool in O(quota).
+        Analogously, for each variant there is a pool of the non-active agents which are not immune against it. Infections are drawn directly from these pools, so the costs scale with the number of cases instead of the immunity level of the population.
+        :param simulation: simulation instance providing config and parameter classes
+        :param population: population store to operate on
+        :param calendar: event calendar to schedule the state changes of the agents
+        :param counters: aggregate counters to keep up to date when agents change their category
+        """
+        super().__init__(simulation,population,calendar,counters)
+        self.dosePools = [IndexedPool(population.size) for _ in range(4)] #pool k contains the agents eligible for dose k+1
+        self.readiness = dict() #day -> list of agent arrays which become eligible for their next dose
+        for chunk in population.chunks():
+            self._update_dose_pools(chunk,0)
+        self.susceptiblePools = [IndexedPool(population.size) for _ in self.variants] #pool k contains the agents susceptible to variant k
+        for chunk in population.chunks():
+            self._update_susceptible_pools(chunk)
+
+    def _is_ready(self,idx:np.array,i:int) -> np.array:
+        """
+        :param idx: indices of agents
+        :param i: current simulation day
+        :return: boolean array whether the vaccination interval since the last dose has passed
+        """
+        pop = self.pop
+        vacc = pop.vacc[idx]
+        ready = vacc==0
+        for dose in range(1,4):
+            mask = vacc==dose
+            ready[mask] = (i-pop.vaccDate[idx[mask]])>self.config.vaccIntervals[dose-1]
+        return ready
+
+    def _update_dose_pools(self,idx:np.array,i:int) -> None:
+        """
+        Adds the given agents to the pool of their next dose if they are non-active and ready for it
+        :param idx: indices of agents
+        :param i: current simulation day
+        :return:
+        """
+        pop = self.pop
+        idx = idx[~pop.active[idx] & (pop.vacc[idx]<4)]
+        idx = idx[self._is_ready(idx,i)]
+        vacc = pop.vacc[idx]
+        for dose in range(1,5):
+            self.dosePools[dose-1].add(idx[vacc==dose-1])
+
+    def _remove_from_dose_pools(self,idx:np.array) -> None:
+        """
+        :param idx: indices of agents to remove from all dose pools
+        :return:
+        """
+        for pool in self.dosePools:
+            pool.remove(idx)
+
+    def _update_susceptible_pools(self,idx:np.array) -> None:
+        """
+        Re-evaluates the membership of the given agents in the susceptible pools, i.e. whether they are non-active and not immune against the variant
+        :param idx: indices of agents
+        :return:
+        """
+        pop = self.pop
+        for pool,target in zip(self.susceptiblePools,self.variantTargets):
+            mask = ~pop.active[idx] & ~pop.immune[idx,target]
+            pool.remove(idx[~mask])
+            pool.add(idx[mask])
+
+    def _select_infections(self,t:dt.datetime,n:int) -> tuple[np.array,np.array,np.array]:
+        """
+        Draws the agents to be infected from the susceptible pools.
+        Like in the per-agent walk, an agent-variant pair is chosen with probability proportional to the variant ratio if the agent is susceptible to the variant, i.e. the variant is drawn proportional to ratio times pool size and the agent uniformly from its pool.
+        Agents drawn for several variants at once keep one of them at random, the missing infections are drawn again.
+        :param t: current date
+        :param n: total number of infections
+        :return: indices of the infected agents in random order, variant codes of the infections, and an empty array since no candidates are visited
+        """
+        ratios = np.array(self.variantParameters.get_variant_ratio(t.date()))
+        infected = list()
+        codes = list()
+        while n>0:
+            weights = ratios*np.array([len(pool) for pool in self.susceptiblePools])
+            if weights.sum()<=0:
+                break #nobody left to infect
+            counts = self.batchSampler.sample_variant_counts(weights/weights.sum(),n)
+            drawn = [pool.sample(count,self.batchSampler.uniforms) for pool,count in zip(self.susceptiblePools,counts)]
+            drawnCodes = np.concatenate([np.full(len(d),k) for k,d in enumerate(drawn)])
+            drawn = np.concatenate(drawn)
+            order = np.argsort(self.batchSampler.uniforms.draw(len(drawn)))
+            drawn,drawnCodes = drawn[order],drawnCodes[order]
+            _,first = np.unique(drawn,return_index=True)
+            first = np.sort(first)
+            drawn,drawnCodes = drawn[first],drawnCodes[first]
+            # infected agents are not susceptible anymore, which also prevents drawing them again
+            for pool in self.susceptiblePools:
+                pool.remove(drawn)
+            infected.append(drawn)
+            codes.append(drawnCodes)
+            n -= len(drawn)
+        if len(infected)==0:
+            return np.zeros(0,dtype=int),np.zeros(0,dtype=int),np.zeros(0,dtype=int)
+        return np.concatenate(infected),np.concatenate(codes),np.zeros(0,dtype=int)
+
+    def _select_vaccinations(self,i:int,vaccinations:list[int],candidates:np.array) -> list[np.array]:
+        """
+        Draws the agents for each dose uniformly from the corresponding eligibility pool
+        :param i: current simulation day
+        :param vaccinations: number of first, second, third and fourth doses
+        :param candidates: ignored, the pools only contain eligible agents
+        :return: list with indices of the agents for each dose
+        """
+        if i in self.readiness.keys():
+            self._update_dose_pools(np.concatenate(self.readiness.pop(i)),i)
+        return [pool.sample(max(count,0),self.batchSampler.uniforms) for pool,count in zip(self.dosePools,vaccinations)]
+
+    def _infect(self,idx:np.array,codes:np.array,i:int,detected:bool,reinfections:np.array) -> None:
+        self._remove_from_dose_pools(idx) #active cases are not vaccinated
+        super()._infect(idx,codes,i,detected,reinfections)
+
+    def _vaccinate(self,idx:np.array,i:int,dose:int) -> None:
+        self.dosePools[dose-1].remove(idx)
+        super()._vaccinate(idx,i,dose)
+        if dose<4 and len(idx)>0:
+            # agents become eligible for the next dose once the interval has passed
+            self.readiness.setdefault(i+self.config.vaccIntervals[dose-1]+1,list()).append(idx)
+
+    def apply_events(self,i:int) -> dict:
+        events = super().apply_events(i)
+        self._update_susceptible_pools(self.calendar.get_agents(events)) #immunization, immunity loss and recovery change the susceptibility
+        for eventType in [EventType.EndDetActive,EventType.EndUndetActive]:
+            if eventType in events.keys():
+                self._update_dose_pools(events[eventType][0],i+1) #recovered agents can be vaccinated again from the next day on
+        return events
@@ -0,0 +1,79 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+from random_pool import RandomPool
+
+
+class IndexedPool:
+    def __init__(self,capacity:int) -> None:
+        """
+        Set of agent indices supporting adding, removing and uniform sampling in O(number of affected agents).
+        Members are stored densely in an array, a second array maps each agent to its position, removed members are replaced by members from the tail.
+        :param capacity: number of agents in the population
+        """
+        self.members = np.zeros(capacity,dtype=np.int64)
+        self.positions = np.full(capacity,-1,dtype=np.int64) #position of each agent in members, -1 if not contained
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self,idx:np.array) -> None:
+        """
+        Adds agents to the pool, agents which are already contained are ignored
+        :param idx: indices of agents
+        :return:
+        """
+        idx = np.unique(idx[self.positions[idx]<0])
+        n = len(idx)
+        self.members[self.size:self.size+n] = idx
+        self.positions[idx] = np.arange(self.size,self.size+n)
+        self.size += n
+
+    def remove(self,idx:np.array) -> None:
+        """
+        Removes agents from the pool, agents which are not contained are ignored
+        :param idx: indices of agents
+        :return:
+        """
+        idx = np.unique(idx[self.positions[idx]>=0])
+        if len(idx)==0:
+            return
+        newSize = self.size-len(idx)
+        holes = self.positions[idx]
+        holes = holes[holes<newSize]
+        self.positions[idx] = -1
+        tail = self.members[newSize:self.size]
+        movers = tail[self.positions[tail]>=0]
+        self.members[holes] = movers
+        self.positions[movers] = holes
+        self.size = newSize
+
+    def sample(self,k:int,uniforms:RandomPool) -> np.array:
+        """
+        Samples k distinct members uniformly at random. Draws positions with replacement and redraws duplicates, which is efficient as long as k is small compared to the pool size.
+        :param k: number of members, capped at the pool size
+        :param uniforms: pool of uniformly distributed random numbers
+        :return: indices of the sampled agents in random order
+        """
+        k = min(k,self.size)
+        if 2*k>self.size:
+            positions = np.argsort(uniforms.draw(self.size))[:k]
+            return self.members[positions]
+        positions = np.zeros(0,dtype=np.int64)
+        while len(positions)<k:
+            drawn = np.concatenate([positions,(uniforms.draw(k-len(positions))*self.size).astype(np.int64)])
+            _,first = np.unique(drawn,return_index=True)
+            positions = drawn[np.sort(first)]
+        return self.members[positions]
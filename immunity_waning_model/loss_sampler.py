@@ -21,94 +21,115 @@ class LossSampler:
         :param mean: mean value for the distribution
         """
         self.mean = mean
+        self.distribution = dist
         if dist == "exponential":
-            self.sampleFun = lambda x: self._samplefun_exponential(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_exponential(x,rng,size=size)
         elif dist == "gamma":
-            self.sampleFun = lambda x: self._samplefun_gamma(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_gamma(x,rng,size=size)
         elif dist == "triangular":
-            self.sampleFun = lambda x: self._samplefun_triangular(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_triangular(x,rng,size=size)
         elif dist == "weibull":
-            self.sampleFun = lambda x: self._samplefun_weibull(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_weibull(x,rng,size=size)
         elif dist == "weibull2":
-            self.sampleFun = lambda x: self._samplefun_weibull(x, 2)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_weibull(x,rng,2,size=size)
         elif dist == "uniform":
-            self.sampleFun = lambda x: self._samplefun_uniform(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_uniform(x,rng,size=size)
         elif dist == 'lognormal':
-            self.sampleFun = lambda x: self._samplefun_lognormal(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_lognormal(x,rng,size=size)
         elif dist == 'logistic':
-            self.sampleFun = lambda x: self._samplefun_logistic(x)
+            self.sampleFun = lambda x,rng,size=None: self._samplefun_logistic(x,rng,size=size)
         else:
             raise ValueError('Distribution specified in config is unknown')
 
-    def _samplefun_exponential(self, mean) -> int:
+    def _to_days(self, x):
+        """
+        Truncates sampled waning durations to full days
+        :param x: float or array of floats
+        :return: int or array of ints
+        """
+        if np.isscalar(x):
+            return int(x)
+        return x.astype(np.int64)
+
+    def _samplefun_exponential(self, mean, rng, size=None) -> int:
         """
         Samples an exponentially distributed waning time
         :param mean: mean value of the exponential distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        return int(np.random.exponential(scale=mean))
+        return self._to_days(rng.exponential(scale=mean, size=size))
 
-    def _samplefun_gamma(self, mean) -> int:
+    def _samplefun_gamma(self, mean, rng, size=None) -> int:
         """
         Samples a gamma distributed waning time
         :param mean: mean value of the exponential distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
         shp = 4
-        return int(np.random.gamma(shape=shp, scale=mean / shp))
+        return self._to_days(rng.gamma(shape=shp, scale=mean / shp, size=size))
 
-    def _samplefun_triangular(self, mean) -> int:
+    def _samplefun_triangular(self, mean, rng, size=None) -> int:
         """
         Samples a triangular distributed waning time. The distribution is fully sammetric between 0, mean and 2*mean
         :param mean: mean = mode of the triangular distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
         shp = 3
-        return int(np.random.triangular(0, mean, 2 * mean))
+        return self._to_days(rng.triangular(0, mean, 2 * mean, size=size))
 
-    def _samplefun_weibull(self, scale, shape=1.5) -> int:
+    def _samplefun_weibull(self, scale, rng, shape=1.5, size=None) -> int:
         """
         Samples a weibull distributed waning time. The scale parameter is the one parametrized by the config. If shape!=1.0 this is NOT THE MEAN VALUE for this distribution, but something closely related (~life expectancy).
         :param scale: scale parameter of the weibull distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        return int(np.random.weibull(shape) * scale)
+        return self._to_days(rng.weibull(shape, size=size) * scale)
 
-    def _samplefun_uniform(self, mean) -> int:
+    def _samplefun_uniform(self, mean, rng, size=None) -> int:
         """
         Samples a uniformly distributed waning time on [0,2*mean].
         :param mean: mean the uniform distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        return int(np.random.random() * 2 * mean)
+        return self._to_days(rng.random(size) * 2 * mean)
 
-    def _samplefun_lognormal(self, scale) -> int:
+    def _samplefun_lognormal(self, scale, rng, size=None) -> int:
         """
         Samples a standard lognormal distributed waning time scaled by the scale parameter. Since E(lognormal(0,1))=sqrt(e), the scale parameter is NOT THE MEAN VALUE for this distribution but ~1/1.6 times the mean value.
         :param scale: factor to multiply the standard lognormal distributed variable with
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        return int(scale * np.random.lognormal(mean=0, sigma=1))
+        return self._to_days(scale * rng.lognormal(mean=0, sigma=1, size=size))
 
-    def _samplefun_logistic(self, mean, scale=15) -> int:
+    def _samplefun_logistic(self, mean, rng, scale=15, size=None) -> int:
         """
         Samples a logistic distributed waning time with scale parameter.
         :param mean: mean value of the logoistic distribution
-        :return: waning duration in days
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        x = int(np.random.logistic(mean, scale))
+        x = self._to_days(rng.logistic(mean, scale, size=size))
         return x
 
-    def sample(self) -> int:
-        """
-        Samples a waning duration in days
-        :return: waning duration in days
-        """
-        return self.sampleFun(self.mean)
-
-    def sample_with_mean(self,mean:float):
+    def sample_with_mean(self,mean:float,rng:np.random.Generator,size:int=None):
         """
         Samples a waning duration in days. Use this to ignore the initialized mean.
-        :return: waning duration in days
+        :param mean: mean value for the distribution
+        :param rng: random number generator
+        :param size: optional number of samples
+        :return: waning duration in days, or array of durations if size is given
         """
-        return self.sampleFun(mean)
\ No newline at end of file
+        return self.sampleFun(mean,rng,size=size)
@@ -0,0 +1,67 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+
+class P2Quantile:
+    def __init__(self,p:float,sample:np.array) -> None:
+        """
+        Streaming estimator of the p-quantile of a sequence of arrays, elementwise, using the P-square algorithm of Jain and Chlamtac (1985).
+        Instead of storing all observations, five markers per element are kept whose heights approximate the minimum, the p/2-, p-, (1+p)/2-quantile and the maximum. The markers are adjusted with piecewise-parabolic interpolation for every new observation.
+        The markers are initialized from an exact sample of the first observations, the larger it is, the better extreme quantiles are resolved.
+        :param p: probability of the quantile, between 0 and 1
+        :param sample: first observations as array (observations x shape of the observations), at least five
+        """
+        self.p = p
+        sample = np.sort(np.asarray(sample,dtype=float),axis=0)
+        self.count = len(sample)
+        self.desired = (self.count-1)*np.array([0,p/2,p,(1+p)/2,1]) #desired marker positions, equal for all elements
+        self.increments = np.array([0,p/2,p,(1+p)/2,1])
+        positions = np.round(self.desired).astype(int)
+        for i in range(1,5):
+            positions[i] = min(max(positions[i],positions[i-1]+1),self.count-5+i) #positions must be strictly increasing
+        self.heights = sample[positions] #marker heights
+        self.positions = np.tile(positions.astype(float).reshape((5,)+(1,)*(sample.ndim-1)),(1,)+sample.shape[1:]) #actual marker positions, differ between elements
+
+    def add(self,x:np.array) -> None:
+        """
+        :param x: new observation with the shape of the initial observations
+        :return:
+        """
+        x = np.asarray(x,dtype=float)
+        self.count += 1
+        q = self.heights
+        n = self.positions
+        # adjust the extreme markers and increment the positions of the markers above the observation
+        q[0] = np.minimum(q[0],x)
+        q[4] = np.maximum(q[4],x)
+        n[1:] += x<q[1:]
+        n[4] = self.count-1
+        self.desired += self.increments
+        for i in range(1,4):
+            d = self.desired[i]-n[i]
+            move = ((d>=1) & (n[i+1]-n[i]>1)) | ((d<=-1) & (n[i-1]-n[i]<-1))
+            d = np.sign(d)*move
+            parabolic = q[i]+d/(n[i+1]-n[i-1])*((n[i]-n[i-1]+d)*(q[i+1]-q[i])/(n[i+1]-n[i])+(n[i+1]-n[i]-d)*(q[i]-q[i-1])/(n[i]-n[i-1]))
+            neighbour = np.where(d>0,i+1,i-1)
+            qn = np.take_along_axis(q,neighbour[None],axis=0)[0]
+            nn = np.take_along_axis(n,neighbour[None],axis=0)[0]
+            linear = q[i]+d*(qn-q[i])/np.where(move,nn-n[i],1)
+            q[i] = np.where(move,np.where((q[i-1]<parabolic) & (parabolic<q[i+1]),parabolic,linear),q[i])
+            n[i] += d
+
+    def get(self) -> np.array:
+        """
+        :return: current estimate of the p-quantile of each element
+        """
+        return self.heights[2].copy()
@@ -0,0 +1,73 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import numpy as np
+
+
+class PackedFlags:
+    def __init__(self,bits:np.array,width:int) -> None:
+        """
+        Boolean matrix (rows x width) whose rows are packed into the bits of one unsigned integer each. Behaves like a boolean numpy array for the index patterns used in the simulation:
+        flags[rows] and flags[rows,cols] for reading, flags[rows,cols] = value for writing, whereas rows and cols may be scalars, slices or broadcastable index arrays.
+        :param bits: integer buffer with one entry per row, is modified in place. May be a view on a larger or memory-mapped buffer.
+        :param width: number of columns, at most the number of bits of the buffer's dtype
+        """
+        assert width<=8*bits.dtype.itemsize
+        self.bits = bits
+        self.width = width
+        self.shape = (len(bits),width)
+        self.dtype = np.dtype(bool)
+        self.nbytes = bits.nbytes
+        self._masks = np.left_shift(np.ones(width,dtype=bits.dtype),np.arange(width,dtype=bits.dtype)) #bit mask of each column
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def _split_key(self,key) -> tuple:
+        """
+        :param key: index as passed to __getitem__ or __setitem__
+        :return: row index and column index (None if all columns are addressed)
+        """
+        if isinstance(key,tuple):
+            if len(key)==1:
+                return key[0],None
+            return key
+        return key,None
+
+    def __getitem__(self,key) -> np.array:
+        rows,cols = self._split_key(key)
+        bits = self.bits[rows]
+        if cols is None:
+            return (np.asarray(bits)[...,None] & self._masks)!=0
+        return (bits & self._masks[cols])!=0
+
+    def __setitem__(self,key,value) -> None:
+        rows,cols = self._split_key(key)
+        masks = self._masks if cols is None else self._masks[cols]
+        if cols is None:
+            value = np.broadcast_to(value,np.shape(self.bits[rows])+(self.width,))
+            masks = (value*masks).sum(axis=-1,dtype=self.bits.dtype) #packed representation of the given rows
+            if isinstance(rows,slice) or np.isscalar(rows):
+                self.bits[rows] = masks
+            else:
+                self.bits[np.asarray(rows)] = masks
+            return
+        # rows may occur several times with different columns, so the bits are set and cleared unbuffered
+        rows,masks,value = np.broadcast_arrays(np.arange(len(self.bits))[rows] if isinstance(rows,slice) else rows,masks,np.asarray(value,dtype=bool))
+        if rows.ndim==0:
+            if value:
+                self.bits[rows] |= masks
+            else:
+                self.bits[rows] &= ~masks
+            return
+        np.bitwise_or.at(self.bits,rows[value],masks[value])
+        np.bitwise_and.at(self.bits,rows[~value],~masks[~value])
@@ -0,0 +1,248 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+
+from event_type import EventType
+from packed_flags import PackedFlags
+
+NONE = -1 #marker for undefined days and variants, replaces None of the former Person class
+CHUNKSIZE = 1<<20 #default number of agents processed at once in passes over the whole population
+
+
+class Population:
+    def __init__(self,size:int,observables:list[str],folder:str=None,chunkSize:int=CHUNKSIZE) -> None:
+        """
+        Structure-of-arrays store for all agents of the simulation. Replaces the former list of Person objects.
+        Every agent is identified by its index. Scalar properties are stored as typed columns, per-observable properties as 2D arrays (agents x observables) whereas the column order corresponds to the given observables.
+        The per-observable immunity flags are bit-packed into one integer per agent, see :class:PackedFlags.
+        Undefined days and variants are marked with NONE. Each agent represents weight persons, which is one unless agents are split and copied by the weighted engine.
+        If a folder is given, the columns are stored in memory-mapped files within a temporary subfolder instead of the main memory. This way, the operating system can page out agent data that is not needed at the moment, so that national-scale populations do not have to fit into memory.
+        Passes over the whole population are done in chunks of chunkSize agents to bound the size of temporary arrays.
+        :param size: number of agents
+        :param observables: list of observable names, i.e. the immunization targets
+        :param folder: optional folder for the memory-mapped columns, None to keep them in memory
+        :param chunkSize: number of agents processed at once in passes over the whole population
+        """
+        self.size = size
+        self.observables = list(observables)
+        self.chunkSize = chunkSize
+        self.folder = None
+        if folder is not None:
+            os.makedirs(folder,exist_ok=True)
+            self.folder = tempfile.mkdtemp(prefix='population_',dir=folder)
+            self._finalizer = weakref.finalize(self,shutil.rmtree,self.folder,True) #removes the files even if close is never called
+        self._files = dict() #column name -> file of the underlying buffer if memory-mapped
+        self._allocations = 0 #number of allocated buffers, used for unique file names
+        nObs = len(self.observables)
+        self.columns = dict() #column name -> underlying buffer, the attributes are views on the first size rows
+        self._add_column('weight',np.int64,1) #number of persons represented by the agent
+        self._add_column('vacc',np.int8,0) #number of vaccine shots
+        self._add_column('conf',bool,False) #agent is confirmed case or not
+        self._add_column('active',bool,False) #agent is currently active case
+        self._add_column('rec',bool,False) #agent is recovered
+        self._add_column('vaccDate',np.int32,NONE) #day of last vaccination
+        self._add_column('recDate',np.int32,NONE) #day of recovery
+        self._add_column('confDate',np.int32,NONE) #day of positive test
+        self._add_column('variant',np.int8,NONE) #code of the last CONFIRMED variant
+        self._add_column('immune',np.min_scalar_type((1<<nObs)-1),0) #agent is immune against specific observables, bit k refers to observable k
+        self._add_column('immDate',np.int32,NONE,nObs) #day of immunization
+        self._add_column('lossDate',np.int32,NONE,nObs) #day of immunity loss
+
+    def _allocate(self,name:str,length:int,dtype,width:int=None) -> np.array:
+        """
+        Allocates a new buffer for a column, memory-mapped if the population has a folder. A previous file of the column is removed.
+        :param name: name of the attribute
+        :param length: number of rows
+        :param dtype: data type of the column
+        :param width: number of entries per row for per-observable columns, None for scalar columns
+        :return: uninitialized buffer
+        """
+        shape = (length,) if width is None else (length,width)
+        if self.folder is None:
+            return np.empty(shape,dtype=dtype)
+        old = self._files.get(name)
+        self._allocations += 1
+        self._files[name] = os.path.join(self.folder,name+'_'+str(self._allocations)+'.npy')
+        buffer = np.lib.format.open_memmap(self._files[name],mode='w+',dtype=dtype,shape=shape)
+        if old is not None:
+            os.remove(old) #the mapping of the old buffer stays valid until it is released
+        return buffer
+
+    def _add_column(self,name:str,dtype,value,width:int=None) -> None:
+        """
+        :param name: name of the attribute
+        :param dtype: data type of the column
+        :param value: initial value of all agents
+        :param width: number of entries per row for per-observable columns, None for scalar columns
+        :return:
+        """
+        buffer = self._allocate(name,self.size,dtype,width)
+        for chunk in self.chunks():
+            buffer[chunk] = value
+        self.columns[name] = buffer
+        self._set_view(name,buffer)
+
+    def _set_view(self,name:str,buffer:np.array) -> None:
+        """
+        Points the attribute of a column to the first size rows of its buffer
+        :param name: name of the attribute
+        :param buffer: underlying buffer
+        :return:
+        """
+        if name=='immune':
+            setattr(self,name,PackedFlags(buffer[:self.size],len(self.observables)))
+        else:
+            setattr(self,name,buffer[:self.size])
+
+    def chunks(self,idx:np.array=None):
+        """
+        Iterates over the agents in chunks of chunkSize
+        :param idx: optional indices of the agents to iterate over, defaults to all agents
+        :return: generator of index arrays
+        """
+        if idx is None:
+            for start in range(0,self.size,self.chunkSize):
+                yield np.arange(start,min(start+self.chunkSize,self.size))
+        else:
+            for start in range(0,len(idx),self.chunkSize):
+                yield idx[start:start+self.chunkSize]
+
+    def close(self) -> None:
+        """
+        Releases the memory-mapped files, if any. The population must not be used afterwards.
+        :return:
+        """
+        self.columns = dict()
+        if self.folder is not None:
+            self._finalizer()
+
+    def detach(self) -> None:
+        """
+        Remaps the memory-mapped columns privately, i.e. copy-on-write, e.g. in a forked process which continues the simulation on its own. Changes are kept in memory, the files are left untouched and remain owned by the parent process.
+        :return:
+        """
+        if self.folder is None:
+            return
+        self._finalizer.detach()
+        for name,filename in self._files.items():
+            buffer = np.load(filename,mmap_mode='c')
+            self.columns[name] = buffer
+            self._set_view(name,buffer)
+        self.folder = None
+        self._files = dict()
+
+    def __getstate__(self) -> dict:
+        """
+        The columns are pickled as plain arrays trimmed to the number of agents, e.g. to save a checkpoint.
+        :return: state of the population
+        """
+        return {'size':self.size,'observables':self.observables,'chunkSize':self.chunkSize,
+                'folder':None if self.folder is None else os.path.dirname(self.folder),
+                'columns':{name:np.asarray(buffer[:self.size]) for name,buffer in self.columns.items()}}
+
+    def __setstate__(self,state:dict) -> None:
+        """
+        Restores a pickled population. Memory-mapped columns are restored into a new temporary subfolder of the former folder.
+        :param state: state of the population
+        :return:
+        """
+        self.__init__(0,state['observables'],state['folder'],state['chunkSize'])
+        self.size = state['size']
+        for name,values in state['columns'].items():
+            buffer = self._allocate(name,self.size,values.dtype,values.shape[1] if values.ndim>1 else None)
+            for chunk in self.chunks():
+                buffer[chunk] = values[chunk]
+            self.columns[name] = buffer
+            self._set_view(name,buffer)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nbytes(self) -> int:
+        """
+        :return: memory consumption of all agent columns in bytes
+        """
+        return sum(x.nbytes for x in self.columns.values())
+
+    def append(self,idx:np.array) -> np.array:
+        """
+        Appends copies of the given agents to the population. The buffers grow by doubling, so that repeated appending costs amortized O(number of copies).
+        :param idx: indices of the agents to copy
+        :return: indices of the copies
+        """
+        newSize = self.size+len(idx)
+        for name,buffer in self.columns.items():
+            if newSize>len(buffer):
+                grown = self._allocate(name,max(newSize,2*len(buffer)),buffer.dtype,buffer.shape[1] if buffer.ndim>1 else None)
+                for chunk in self.chunks():
+                    grown[chunk] = buffer[chunk]
+                buffer = grown
+                self.columns[name] = buffer
+            buffer[self.size:newSize] = buffer[idx]
+        copies = np.arange(self.size,newSize)
+        self.size = newSize
+        for name,buffer in self.columns.items():
+            self._set_view(name,buffer)
+        return copies
+
+    def compact(self,idx:np.array) -> None:
+        """
+        Removes all agents except the given ones. The remaining agents are renumbered in the given order.
+        :param idx: indices of the agents to keep
+        :return:
+        """
+        for name,buffer in self.columns.items():
+            compacted = self._allocate(name,len(idx),buffer.dtype,buffer.shape[1] if buffer.ndim>1 else None)
+            for start in range(0,len(idx),self.chunkSize):
+                compacted[start:start+self.chunkSize] = buffer[idx[start:start+self.chunkSize]]
+            self.columns[name] = compacted
+        self.size = len(idx)
+        for name,buffer in self.columns.items():
+            self._set_view(name,buffer)
+
+    def apply_events(self,day:int,events:dict) -> None:
+        """
+        Applies the state changes (immunization, immunity loss, recovery and confirmation) scheduled for the given day.
+        Events which do not match the current day columns anymore, e.g. since the agent got rescheduled, are skipped.
+        The order equals the former per-agent evaluation, i.e. immunization before immunity loss.
+        :param day: current simulation day
+        :param events: dict mapping event types to tuples of agent indices and observable indices, see :class:EventCalendar
+        """
+        if EventType.StartImmune in events.keys():
+            agents,observables = events[EventType.StartImmune]
+            mask = self.immDate[agents,observables]==day
+            agents,observables = agents[mask],observables[mask]
+            self.immDate[agents,observables] = NONE
+            self.immune[agents,observables] = True
+        if EventType.EndImmune in events.keys():
+            agents,observables = events[EventType.EndImmune]
+            mask = self.lossDate[agents,observables]==day
+            agents,observables = agents[mask],observables[mask]
+            self.lossDate[agents,observables] = NONE
+            self.immune[agents,observables] = False
+        for eventType in [EventType.EndDetActive,EventType.EndUndetActive]:
+            if eventType in events.keys():
+                agents = events[eventType][0]
+                agents = agents[self.recDate[agents]==day]
+                self.recDate[agents] = NONE
+                self.active[agents] = False
+                self.rec[agents] = True
+        if EventType.SwitchUndetDet in events.keys():
+            agents = events[EventType.SwitchUndetDet][0]
+            agents = agents[self.confDate[agents]==day]
+            self.confDate[agents] = NONE
+            self.conf[agents] = True
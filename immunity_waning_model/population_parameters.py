@@ -10,8 +10,8 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
 
-import csv
 from config import Config
+from csv_columns import CsvColumns
 import datetime as dt
 
 from detection_parameters import DetectionParameters
@@ -28,13 +28,9 @@ class PopulationParameters:
         file = config.filenamePopulationdata
 
         #parse data
-        with open(file, 'r') as f:
-            r = csv.reader(f, delimiter=';')
-            next(r)
-            for line in r:
-                fed = line[0]
-                count = int(line[1])
-                self.population[fed]=count
+        columns = CsvColumns(file)
+        for fed,count in zip(columns[columns.header[0]].tolist(),columns[columns.header[1]].tolist()):
+            self.population[fed]=count
         self.federalstates = list(self.population.keys())
 
     def get_federalstates(self) ->  list:
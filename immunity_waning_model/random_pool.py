@@ -0,0 +1,52 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+from typing import Callable
+
+import numpy as np
+
+BUFFERSIZE = 4096 #default number of pre-sampled values per pool
+
+
+class RandomPool:
+    def __init__(self,sampleFun:Callable[[int],np.array],bufferSize:int=BUFFERSIZE) -> None:
+        """
+        Refillable buffer of pre-sampled random values. Values are generated in batches by the given sample function and handed out in order, so that the overhead of the random number generator is amortized over many draws.
+        Since the batches are drawn from the seeded generator in a deterministic order, seeded runs stay reproducible.
+        :param sampleFun: function returning an array of n samples along the first axis
+        :param bufferSize: number of values sampled per refill
+        """
+        self.sampleFun = sampleFun
+        self.bufferSize = bufferSize
+        self.buffer = sampleFun(0)
+        self.position = 0
+
+    def _refill(self,n:int) -> None:
+        """
+        Refills the buffer such that at least n values are available
+        :param n: number of required values
+        :return:
+        """
+        rest = self.buffer[self.position:]
+        self.buffer = np.concatenate([rest,self.sampleFun(max(self.bufferSize,n-len(rest)))])
+        self.position = 0
+
+    def draw(self,n:int) -> np.array:
+        """
+        :param n: number of values
+        :return: the next n values of the pool
+        """
+        if self.position+n>len(self.buffer):
+            self._refill(n)
+        out = self.buffer[self.position:self.position+n]
+        self.position += n
+        return out
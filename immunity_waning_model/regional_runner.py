@@ -0,0 +1,102 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import copy
+import os
+import numpy as np
+
+from batch_sampler import BatchSampler
+from config import Config
+from simulation import Simulation
+from worker_pool import WorkerPool
+
+
+class RegionalRunner:
+    def __init__(self,config:Config) -> None:
+        """
+        Runs the simulation for all federalstates of the population data from a single config and aggregates the results on national level.
+        The input data is parsed only once, the regions are simulated in forked worker processes which inherit it from this process, see :class:WorkerPool. Each region is simulated exactly like a single run with the corresponding federalstate.
+        If config.singlePass is set, all regions are simulated in one pass over the days within this process instead, see :func:run_single_pass.
+        :param config: config instance, its federalstate field is ignored
+        """
+        self.simulation = Simulation(config) #parses the input data of all federalstates
+        self.federalstates = self.simulation.populationParameters.get_federalstates()
+        self.configs = {fed:config.for_federalstate(fed) for fed in self.federalstates+[None]} #config of each region, None refers to the national aggregate
+        self.processes = min(len(self.federalstates),os.cpu_count() or 1) #number of regions simulated at once
+
+    def run_region(self,fed:str) -> dict:
+        """
+        :param fed: regionID
+        :return: simulation result of the federalstate as dictionary
+        """
+        simulation = copy.copy(self.simulation)
+        simulation.config = self.configs[fed]
+        return simulation.run()
+
+    def run_single_pass(self) -> dict:
+        """
+        Simulates the national population in a single pass over the days. The agents are grouped by their region, each region has its own engine which receives the quotas of the region.
+        On every day, all regions are stepped one after the other, drawing from one shared random stream, and the daily aggregates are recorded per region. Checkpoints are not supported in this mode.
+        :return: dict mapping the regionIDs to their simulation results
+        """
+        config = self.configs[None]
+        self.simulation.batchSampler = BatchSampler(config,self.simulation.immunizationTable,config.seed)
+        times = self.simulation.get_times()
+        simulations = dict()
+        for fed in self.federalstates:
+            simulation = copy.copy(self.simulation) #shares the input data and the random streams
+            simulation.config = self.configs[fed]
+            simulation.checkpointStore = None
+            simulations[fed] = simulation
+        cached = {fed:simulation.try_to_load_from_cached() for fed,simulation in simulations.items()}
+        if all(result!={} for result in cached.values()):
+            return cached
+        print('start simulation of all regions')
+        records = {fed:np.zeros((len(times),simulation.get_record_length())) for fed,simulation in simulations.items()}
+        engines = {fed:simulation.create_engine(simulation.get_size(),len(times)) for fed,simulation in simulations.items()}
+        days = [simulations[fed].iterate_days(engines[fed],times,records[fed],0,len(times)) for fed in self.federalstates]
+        for i in range(len(times)):
+            print('\r{: 4d}/{: 4d}'.format(i+1,len(times)),end='')
+            for regionDays in days:
+                next(regionDays)
+        print()
+        results = dict()
+        for fed,simulation in simulations.items():
+            engines[fed].close()
+            results[fed] = simulation.get_result(records[fed],times)
+            simulation.save_as_pickle(results[fed])
+        return results
+
+    def aggregate(self,results:dict) -> dict:
+        """
+        Aggregates regional results on national level. All result fields are absolute numbers of persons, so their sum corresponds to the population-weighted national result.
+        :param results: dict mapping regionIDs to simulation results
+        :return: national simulation result as dictionary
+        """
+        results = list(results.values())
+        national = {'time':results[0]['time']}
+        for key in results[0].keys():
+            if key!='time':
+                national[key] = np.sum([np.asarray(r[key]) for r in results],axis=0)
+        return national
+
+    def run(self) -> dict:
+        """
+        Simulates all federalstates, at most processes at once or in a single pass, and aggregates their results
+        :return: dict mapping the regionIDs to their simulation results and None to the national aggregate
+        """
+        if self.configs[None].singlePass:
+            results = self.run_single_pass()
+        else:
+            results = dict(WorkerPool(self.processes).imap(self.run_region,self.federalstates))
+        results[None] = self.aggregate(results)
+        return results
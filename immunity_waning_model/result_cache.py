@@ -0,0 +1,138 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+
+INDEXFILE = 'index.json' #name of the index file within the cache folder
+
+
+class ResultCache:
+    def __init__(self,folder:str,maxSize:float) -> None:
+        """
+        Content-addressed cache for simulation results, see :func:Simulation.get_cache_key. Every result is stored in its own pickle file named by its key.
+        An index file lists the size and the time of the last use of every entry, so that lookups do not need to open any pickle file except the one of a hit. Files and index are written to temporary files first and renamed afterwards, so concurrent runs never read incomplete files.
+        If the total size of the entries exceeds maxSize, the least recently used ones are removed. Since concurrent runs may overwrite each other's index updates, the index is reconciled with the files in the folder whenever entries are added.
+        :param folder: cache folder
+        :param maxSize: maximum total size of the cached results in bytes
+        """
+        self.folder = folder
+        self.maxSize = maxSize
+        os.makedirs(folder,exist_ok=True)
+
+    @staticmethod
+    def hash_file(filename:str) -> str:
+        """
+        :param filename: path to a file
+        :return: md5 hash of the file content
+        """
+        digest = hashlib.md5()
+        with open(filename,'rb') as f:
+            for block in iter(lambda: f.read(1<<20),b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_code() -> str:
+        """
+        :return: md5 hash of the source files of the model, i.e. a version of the model code which changes with every modification
+        """
+        digest = hashlib.md5()
+        for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),'*.py'))):
+            digest.update(os.path.basename(filename).encode('utf-8'))
+            with open(filename,'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def _get_filename(self,key:str) -> str:
+        """
+        :param key: key of the entry
+        :return: path of the pickle file of the entry
+        """
+        return os.path.join(self.folder,key+'.pickle')
+
+    def _write(self,filename:str,write) -> None:
+        """
+        Writes a file atomically, i.e. into a temporary file which is renamed afterwards
+        :param filename: path of the file
+        :param write: function writing the content into the given binary file object
+        :return:
+        """
+        temporary = filename+'.'+str(os.getpid())
+        with open(temporary,'wb') as f:
+            write(f)
+        os.replace(temporary,filename)
+
+    def _load_index(self) -> dict:
+        """
+        :return: dict mapping the keys to lists of size in bytes and time of the last use, empty if there is no index yet
+        """
+        try:
+            with open(os.path.join(self.folder,INDEXFILE),'r') as f:
+                return json.load(f)
+        except (OSError,ValueError):
+            return dict()
+
+    def _save_index(self,index:dict) -> None:
+        """
+        :param index: dict mapping the keys to lists of size in bytes and time of the last use
+        :return:
+        """
+        self._write(os.path.join(self.folder,INDEXFILE),lambda f: f.write(json.dumps(index).encode('utf-8')))
+
+    def load(self,key:str) -> dict:
+        """
+        :param key: key of the result
+        :return: cached result, None if there is none
+        """
+        index = self._load_index()
+        if key not in index.keys():
+            return None
+        try:
+            with open(self._get_filename(key),'rb') as f:
+                result = pickle.load(f)
+        except OSError:
+            return None #removed by a concurrent run
+        index[key][1] = time.time()
+        self._save_index(index)
+        return result
+
+    def save(self,key:str,result:dict) -> None:
+        """
+        Adds a result to the cache and removes the least recently used entries if the maximum size is exceeded
+        :param key: key of the result
+        :param result: simulation result as dictionary
+        :return:
+        """
+        filename = self._get_filename(key)
+        self._write(filename,lambda f: pickle.dump(result,f,protocol=pickle.HIGHEST_PROTOCOL))
+        index = self._load_index()
+        files = {os.path.basename(x)[:-len('.pickle')]:x for x in glob.glob(os.path.join(self.folder,'*.pickle'))}
+        index = {k:v for k,v in index.items() if k in files.keys()} #reconcile with the files in the folder
+        for k,x in files.items():
+            if k not in index.keys():
+                index[k] = [os.path.getsize(x),os.path.getmtime(x)]
+        index[key] = [os.path.getsize(filename),time.time()]
+        total = sum(v[0] for v in index.values())
+        for k in sorted(index.keys(),key=lambda k: index[k][1]):
+            if total<=self.maxSize or k==key:
+                continue
+            total -= index.pop(k)[0]
+            try:
+                os.remove(files[k])
+            except OSError:
+                pass #removed by a concurrent run
+        self._save_index(index)
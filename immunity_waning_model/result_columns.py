@@ -0,0 +1,50 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import json
+import os
+from collections.abc import Mapping
+import datetime as dt
+import numpy as np
+
+
+class ResultColumns(Mapping):
+    def __init__(self,filename:str,asLists:bool=False) -> None:
+        """
+        Read-only dict view on a simulation result exported with :func:ResultExporter.export_to_binary.
+        The columns are stored column-major in a memory-mapped .npy file, so only the pages of the accessed columns are read from disk. Result keys, dates and metadata are read from the .meta.json file with the same name.
+        :param filename: path to the .npy file of the result
+        :param asLists: return the columns as lists like :func:ResultExporter.load_from_csv does, e.g. for the plotter, instead of read-only arrays
+        """
+        base = os.path.splitext(filename)[0]
+        with open(base+'.meta.json','r') as f:
+            self.metadata = json.load(f)
+        self.data = np.load(base+'.npy',mmap_mode='r') #days x keys
+        self.columns = {k:j for j,k in enumerate(self.metadata['keys'])} #result key -> column index
+        self.time = [dt.datetime.strptime(x,'%Y-%m-%d') for x in self.metadata['time']]
+        self.asLists = asLists
+
+    def __getitem__(self,key:str):
+        """
+        :param key: result key
+        :return: dates for the key time, the daily values of the result key otherwise
+        """
+        if key=='time':
+            return list(self.time)
+        column = self.data[:,self.columns[key]]
+        return column.tolist() if self.asLists else column
+
+    def __iter__(self):
+        return iter(['time']+list(self.columns.keys()))
+
+    def __len__(self) -> int:
+        return len(self.columns)+1
@@ -10,12 +10,14 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
 import csv
+import json
 import os
 from typing import Tuple
 
 import numpy as np
 
 from config import Config
+from result_columns import ResultColumns
 import datetime as dt
 
 class ResultExporter:
@@ -25,14 +27,69 @@ class ResultExporter:
         """
         self.timestamp = dt.datetime.now().strftime('%Y%m%d_%H%M%S')
 
-    def export_to_csv(self,config:Config,result:dict) -> str:
+    def export(self,config:Config,result:dict,name:str=None) -> str:
+        """
+        Exports the simulation result to the columnar binary format, see :func:export_to_binary, and additionally to a csv file if exportCsv is set in the config
+        :param config: config instance of the simulation
+        :param result: simulation result as dict object
+        :param name: optional name of the files within the result folder without extension, defaults to the scenario name
+        :return: path of the binary result
+        """
+        if name is None:
+            name = config.scenario
+        if config.exportCsv:
+            self.export_to_csv(config,result,name+'.csv')
+        return self.export_to_binary(config,result,name)
+
+    def export_to_binary(self,config:Config,result:dict,name:str=None) -> str:
+        """
+        Exports the simulation result to a columnar binary format: a .npy file containing one float column per result key (days x keys, column-major) and a .meta.json file with the result keys, the dates and metadata.
+        The array is written at once and can be memory-mapped column by column, see :class:ResultColumns. Values are not rounded.
+        :param config: config instance of the simulation
+        :param result: simulation result as dict object
+        :param name: optional name of the files within the result folder without extension, defaults to the scenario name
+        :return: path of the .npy file
+        """
+        if name is None:
+            name = config.scenario
+        base = os.path.join(config.get_result_folder(),name)
+        keys = sorted(k for k in result.keys() if k!='time')
+        data = np.empty((len(result['time']),len(keys)),order='F')
+        for j,k in enumerate(keys):
+            data[:,j] = result[k]
+        np.save(base+'.npy',data)
+        metadata = {'keys':keys,
+                    'time':[t.strftime('%Y-%m-%d') for t in result['time']],
+                    'scenario':config.scenario,
+                    'federalstate':config.federalstate,
+                    'scale':config.scale,
+                    'config':config.hash()}
+        with open(base+'.meta.json','w') as f:
+            json.dump(metadata,f)
+        return base+'.npy'
+
+    def load_from_binary(self,filename:str,asLists:bool=False) -> Tuple[ResultColumns,list]:
+        """
+        Load a result exported with :func:export_to_binary. The columns are memory-mapped and only read when accessed.
+        :param filename: path to the .npy file of the result
+        :param asLists: return the columns as lists like :func:load_from_csv does instead of read-only arrays
+        :return: dict view on the loaded results and list of variants that occur in the result
+        """
+        result = ResultColumns(filename,asLists)
+        variants = [x[16:] for x in result.keys() if x.startswith('active detected ')]
+        return result, variants
+
+    def export_to_csv(self,config:Config,result:dict,filename:str=None) -> str:
         """
         Exports the simulation result in doct format to a csv file
         :param config: config instance of the simulation
         :param result: simulation result as dict object
+        :param filename: optional name of the csv file within the result folder, defaults to the one of the config
         :return:
         """
-        outputfile = os.path.join(config.get_result_folder(),config.get_csv_filename())
+        if filename is None:
+            filename = config.get_csv_filename()
+        outputfile = os.path.join(config.get_result_folder(),filename)
         X = list()
         header = list(result.keys())
         header.sort()
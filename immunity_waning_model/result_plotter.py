@@ -60,9 +60,12 @@ class ResultPlotter:
 		self.darkBG = False
 		self.dpi = 500
 
-	def load_result(self,csvfilename:str):
+	def load_result(self,filename:str):
 		re = ResultExporter()
-		self.Results, self.Variants = re.load_from_csv(csvfilename)
+		if filename.endswith('.csv'):
+			self.Results, self.Variants = re.load_from_csv(filename)
+		else:
+			self.Results, self.Variants = re.load_from_binary(filename,True) #columns are only read when plotted
 		try:
 			self.Variants.remove('WILDTYPE')
 			self.Variants.insert(0,'WILDTYPE')
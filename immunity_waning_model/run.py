@@ -14,8 +14,11 @@ import os
 import sys
 
 from config import Config
+from ensemble_runner import EnsembleRunner
+from regional_runner import RegionalRunner
 from result_exporter import ResultExporter
 from result_plotter import ResultPlotter
+from scenario_runner import ScenarioRunner
 from simulation import Simulation
 import datetime as dt
 
@@ -34,12 +37,33 @@ if __name__=='__main__':
 
     for filename in files:
         config = Config(filename,nowStamp) #new config instance
-        s = Simulation(config) #initialize simulation
-        result = s.run() #run simulation
-        del(s) #free RAM space for plots
+        if config.federalstate == 'all':
+            runner = RegionalRunner(config) #simulates all federalstates in parallel
+            results = runner.run()
+            for fed in runner.federalstates:
+                ResultExporter().export(runner.configs[fed],results[fed])
+            config = runner.configs[None] #the national aggregate is exported and plotted like a single run
+            result = results[None]
+            del(runner) #free RAM space for plots
+        elif len(config.branches) > 0:
+            runner = ScenarioRunner(config) #simulates the shared history once and all branches in parallel
+            results = runner.run()
+            for name in config.branches.keys():
+                ResultExporter().export(runner.configs[name],results[name])
+            result = results[None] #the config itself is exported and plotted like a single run
+            del(runner) #free RAM space for plots
+        elif config.replicates > 1:
+            runner = EnsembleRunner(config) #simulates all replicates in parallel
+            result,statistics = runner.run()
+            ResultExporter().export(config,statistics,config.scenario+'_ensemble')
+            del(runner) #free RAM space for plots
+        else:
+            s = Simulation(config) #initialize simulation
+            result = s.run() #run simulation
+            del(s) #free RAM space for plots
 
-        # export to csv
-        filename = ResultExporter().export_to_csv(config, result)
+        # export to the binary result format and optionally to csv
+        filename = ResultExporter().export(config, result)
 
         # plot result in various ways
         rp = ResultPlotter()
@@ -0,0 +1,92 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import copy
+import os
+import numpy as np
+
+from batch_sampler import BatchSampler
+from config import Config
+from simulation import Simulation
+from worker_pool import WorkerPool
+
+FIXEDFIELDS = ['t0','tend','seed','scale','engine','federalstate','lossResolution','filenamePopulationdata'] #config fields defining the shared history, branches must not replace them
+
+
+class ScenarioRunner:
+    def __init__(self,config:Config) -> None:
+        """
+        Runs several scenarios which share their history up to config.forkDate and differ only afterwards, e.g. different future vaccination uptakes or waning assumptions.
+        The history is simulated only once with the config itself. Afterwards, the simulation is forked into worker processes, one per branch, which inherit the agent population copy-on-write, see :class:WorkerPool. Each branch continues with its own config (see :func:Config.for_branch), i.e. its data files and parameters take effect from the fork date on.
+        All branches continue the same random streams, so that differences between the branches are due to the scenarios rather than to sampling noise. The config itself is continued as reference scenario. Branches are not sharded.
+        :param config: config instance with branches and forkDate
+        """
+        for name,overrides in config.branches.items():
+            fixed = [k for k in overrides.keys() if k in FIXEDFIELDS]
+            if len(fixed)>0:
+                raise ValueError('Branch {} must not replace the fields {}'.format(name,fixed))
+        self.config = config
+        self.simulation = Simulation(config)
+        self.times = self.simulation.get_times()
+        self.forkDay = (config.forkDate-config.t0).days
+        if not 0<self.forkDay<len(self.times):
+            raise ValueError('forkDate must lie between t0 and tend')
+        self.simulations = {None:self.simulation} #branch name -> simulation, None refers to the config itself
+        for name,overrides in config.branches.items():
+            simulation = Simulation(config.for_branch(name,overrides))
+            if simulation.variantParameters.get_variants()!=self.simulation.variantParameters.get_variants() or list(simulation.config.observables.keys())!=list(config.observables.keys()):
+                raise ValueError('Branch {} must have the same variants and observables'.format(name))
+            self.simulations[name] = simulation
+        self.configs = {name:simulation.config for name,simulation in self.simulations.items()}
+        self.processes = min(len(self.simulations),os.cpu_count() or 1) #number of branches simulated at once
+
+    def run_branch(self,name:str) -> dict:
+        """
+        Continues the shared history with the config of a branch
+        :param name: name of the branch, None for the config itself
+        :return: simulation result of the branch as dictionary
+        """
+        simulation = self.simulations[name]
+        config = simulation.config
+        engine,records = self.engine,self.records
+        if os.getpid()==self.pid:
+            engine,records = copy.deepcopy(engine),records.copy() #the branches are simulated one after the other in this process if it cannot fork
+        else:
+            engine.detach()
+        keepPools = config.detDelay==self.config.detDelay and config.recoveryDelay==self.config.recoveryDelay and config.observables==self.config.observables
+        simulation.batchSampler = BatchSampler(config,simulation.immunizationTable,config.seed)
+        simulation.batchSampler.set_state(self.samplerState,keepPools)
+        simulation.setup_checkpoints(simulation.get_size(),self.times)
+        if simulation.digests is not None and (self.simulation.digests is None or simulation.digests[self.forkDay-1]!=self.simulation.digests[self.forkDay-1]):
+            simulation.checkpointStore = None #the history differs from the one of a separate run of the branch, so its states must not be shared
+        engine.attach(simulation)
+        simulation.simulate_days(engine,self.times,records,self.forkDay,len(self.times))
+        engine.close()
+        return simulation.get_result(records,self.times)
+
+    def run(self) -> dict:
+        """
+        Simulates the shared history and afterwards all branches, at most processes at once
+        :return: dict mapping the branch names to their simulation results and None to the result of the config itself
+        """
+        simulation = self.simulation
+        simulation.batchSampler = BatchSampler(self.config,simulation.immunizationTable,self.config.seed)
+        print('simulate shared history until {}'.format(self.config.forkDate.strftime('%Y-%m-%d')))
+        self.records = np.zeros((len(self.times),simulation.get_record_length()))
+        self.engine,first = simulation.start(simulation.get_size(),self.times,self.records,until=self.forkDay)
+        simulation.simulate_days(self.engine,self.times,self.records,first,self.forkDay)
+        self.samplerState = simulation.batchSampler.get_state()
+        self.pid = os.getpid()
+        print()
+        results = dict(WorkerPool(self.processes).imap(self.run_branch,list(self.simulations.keys())))
+        self.engine.close()
+        return results
@@ -10,20 +10,34 @@ https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
 
-import os
-import pickle
+import hashlib
+import multiprocessing as mp
 import numpy as np
 import datetime as dt
 
 from base_immunization_parameters import BaseImmunizationParameters
-from person import Person
+from batch_sampler import BatchSampler
+from agent_engine import AgentEngine
+from aggregate_counters import AggregateCounters
 from case_parameters import CaseParameters
+from checkpoint_store import CheckpointStore
+from cohort_engine import CohortEngine
 from config import Config
+from event_calendar import EventCalendar
+from immunization_table import ImmunizationTable
+from indexed_engine import IndexedEngine
 from loss_parameters import LossParameters
+from population import Population
 from population_parameters import PopulationParameters
+from result_cache import ResultCache
 from utils import *
 from vaccination_parameters import VaccinationParameters
 from variant_parameters import VariantParameters
+from vectorized_engine import VectorizedEngine
+from weighted_engine import WeightedEngine
+
+TOTALS = ['vaccinated','past detected','past undetected','past detected + vaccinated','past undetected + vaccinated','active detected','active undetected'] #aggregates recorded per day
+IMMUNES = TOTALS[:5] #aggregates whose immunes are recorded per day and observable
 
 class Simulation:
     def __init__(self,config:Config) -> None:
@@ -39,6 +53,9 @@ class Simulation:
         self.variantParameters = VariantParameters(config)
         self.populationParameters = PopulationParameters(config)
         self.config = config
+        #resolve the immunization parameters of all causes once
+        causes = self.variantParameters.get_variants() + ['VACC'+str(dose) for dose in range(1,5)]
+        self.immunizationTable = ImmunizationTable(self.baseImmunizationParameters,self.lossParameters,causes,list(config.observables.keys()))
 
     def add_together(self,array1:np.array, index1:int, array2:np.array) -> None:
         """
@@ -60,372 +77,480 @@ class Simulation:
         else:
             array1[index1:] += array2[:n2]
 
-    def get_cache_filename(self) -> str:
+    def create_engine(self,size:int,steps:int):
+        """
+        Creates the engine specified in the config which distributes the daily cases and vaccinations among the agents
+        :param size: number of agents
+        :param steps: number of simulation days
+        :return: engine instance
+        """
+        if self.config.engine == 'cohort':
+            return CohortEngine(self,size,steps) #works on aggregated cohorts instead of agents
+        observables = list(self.config.observables.keys())
+        if self.config.engine == 'weighted':
+            population = Population(1,observables,self.config.populationFolder,self.config.chunkSize) #a single super-agent representing all persons, split on demand
+            population.weight[0] = size
+        else:
+            population = Population(size,observables,self.config.populationFolder,self.config.chunkSize)
+        calendar = EventCalendar(steps,self.config.checkpointFolder is not None) #checkpoints keep the events after the horizon, so that later runs can extend it
+        counters = AggregateCounters(population)
+        if self.config.engine == 'agent':
+            return AgentEngine(self,population,calendar,counters)
+        elif self.config.engine == 'vectorized':
+            return VectorizedEngine(self,population,calendar,counters)
+        elif self.config.engine == 'indexed':
+            return IndexedEngine(self,population,calendar,counters)
+        elif self.config.engine == 'weighted':
+            return WeightedEngine(self,population,calendar,counters)
+        else:
+            raise ValueError('Engine specified in config is unknown')
+
+    def get_quotas(self,t:dt.datetime) -> list[int]:
+        """
+        :param t: current date
+        :return: number of new detected and undetected cases and of first, second, third and fourth doses for the scaled population
+        """
+        fed = self.config.federalstate
+        scale = self.config.scale
+        c1 = int(round(self.caseParameters.get(t,True,fed)*scale,0))
+        c2 = int(round(self.caseParameters.get(t,False,fed)*scale,0))
+        v1 = int(round(self.vaccinations.get(t, 1,fed)*scale,0))
+        v2 = int(round(self.vaccinations.get(t, 2,fed)*scale,0))
+        v3 = int(round(self.vaccinations.get(t, 3,fed)*scale,0))
+        v4 = int(round(self.vaccinations.get(t, 4,fed)*scale,0))
+        return [c1,c2,v1,v2,v3,v4]
+
+    @staticmethod
+    def split_quota(count:int,sizes:list[int],i:int) -> np.array:
+        """
+        Splits a daily quota among shards proportional to their sizes. Each shard gets the integer part of its share, the remainder is assigned to the shards with the largest fractional parts.
+        Ties are resolved by a rotation depending on the day, so that no shard is preferred systematically and the split is reproducible.
+        :param count: quota to split
+        :param sizes: number of agents of each shard
+        :param i: current simulation day
+        :return: quota of each shard, sums up to count
+        """
+        sizes = np.array(sizes,dtype=np.int64)
+        total = sizes.sum()
+        shares = count*sizes
+        quotas = shares//total
+        order = np.lexsort(((np.arange(len(sizes))-i)%len(sizes),-(shares%total)))
+        quotas[order[:count-quotas.sum()]] += 1
+        return quotas
+
+    def get_times(self) -> list[dt.datetime]:
+        """
+        :return: dates of the simulation days from t0 to tend
+        """
+        steps = (self.config.tend-self.config.t0).days+1
+        return [self.config.t0 + dt.timedelta(x) for x in range(steps)]
+
+    def get_size(self) -> int:
+        """
+        :return: number of agents, i.e. the scaled population of the federalstate
+        """
+        return int(self.populationParameters.get_population(self.config.federalstate)*self.config.scale)
+
+    def get_record_length(self) -> int:
+        """
+        :return: number of aggregates stored per day by :func:simulate
+        """
+        nVariants = len(self.variantParameters.get_variants())
+        return len(TOTALS)+len(IMMUNES)*len(self.config.observables)+(nVariants+1)*nVariants
+
+    def get_input_digests(self,size:int,times:list[dt.datetime]) -> list[str]:
+        """
+        Chained digests of the inputs of every simulation day. The digest of day i covers the config fields the simulation state depends on (see :func:Config.state_hash), the number of agents and the daily quotas and variant ratios of all days up to i.
+        Hence, two runs with equal digests on day i have the same simulation state after day i, no matter whether their data or tend differ afterwards. The cohort engine additionally depends on the simulation horizon.
+        :param size: total number of agents
+        :param times: dates of the simulation days
+        :return: list of hex digests, one per day
+        """
+        digest = self.config.state_hash()+str(size)+str(self.variantParameters.get_variants())
+        if self.config.engine == 'cohort':
+            digest += str(len(times))
+        digests = list()
+        for t in times:
+            digest = hashlib.md5((digest+str(self.get_quotas(t))+str(list(self.variantParameters.get_variant_ratio(t.date())))).encode('utf-8')).hexdigest()
+            digests.append(digest)
+        return digests
+
+    def resume(self,store:CheckpointStore,digests:list[str],records:np.array,shard:int=0):
+        """
+        Restores the engine and the random streams from the latest checkpoint matching the inputs of this run
+        :param store: checkpoint store
+        :param digests: input digests of all simulation days, see :func:get_input_digests
+        :param records: array for the daily aggregates, the ones up to the checkpoint are filled in
+        :param shard: index of the shard
+        :return: the restored engine and the day of the checkpoint, or None and -1 if there is no matching checkpoint
+        """
+        day,state = store.load_latest(digests,shard)
+        if state is None:
+            return None,-1
+        engine = state['engine']
+        engine.attach(self)
+        engine.extend(len(records))
+        self.batchSampler.set_state(state['sampler'])
+        records[:day+1] = state['records']
+        return engine,day
+
+    def setup_checkpoints(self,size:int,times:list[dt.datetime]) -> None:
+        """
+        Prepares saving checkpoints if a checkpoint folder is configured, see :class:CheckpointStore
+        :param size: total number of agents
+        :param times: dates of the simulation days
+        :return:
+        """
+        self.checkpointStore = None
+        self.digests = None
+        if self.config.checkpointFolder is not None:
+            self.checkpointStore = CheckpointStore(self.config.checkpointFolder,self.config.checkpointInterval,self.config.checkpointKeep)
+            self.digests = self.get_input_digests(size,times)
+
+    def start(self,size:int,times:list[dt.datetime],records:np.array,shard:int=0,sizes:list[int]=None,until:int=None) -> tuple:
+        """
+        Creates the engine specified in the config. If a checkpoint folder is configured, the engine is restored from the latest checkpoint whose inputs equal the ones of this run instead, see :func:get_input_digests.
+        :param size: number of agents to simulate
+        :param times: dates of the simulation days
+        :param records: array for the daily aggregates, see :func:simulate_days
+        :param shard: index of the shard the engine simulates
+        :param sizes: number of agents of all shards, if the engine only simulates a shard of the population
+        :param until: optional day, only checkpoints of earlier days are used
+        :return: engine and the first day left to simulate
+        """
+        self.setup_checkpoints(size if sizes is None else sum(sizes),times)
+        if self.checkpointStore is not None:
+            engine,day = self.resume(self.checkpointStore,self.digests[:until],records,shard)
+            if engine is not None:
+                if shard==0:
+                    print('resume from checkpoint of {}'.format(times[day].strftime('%Y-%m-%d')))
+                return engine,day+1
+        return self.create_engine(size,len(times)),0
+
+    def simulate(self,size:int,times:list[dt.datetime],records:np.array,shard:int=0,sizes:list[int]=None) -> None:
+        """
+        Simulates all days with the engine specified in the config, resuming from a checkpoint if possible, see :func:start
+        :param size: number of agents to simulate
+        :param times: dates of the simulation days
+        :param records: array for the daily aggregates, see :func:simulate_days
+        :param shard: index of the shard the engine simulates, only relevant if sizes is given
+        :param sizes: number of agents of all shards, if the engine only simulates a shard of the population. The daily quotas are split accordingly.
+        :return:
+        """
+        engine,first = self.start(size,times,records,shard,sizes)
+        self.simulate_days(engine,times,records,first,len(times),shard,sizes)
+        engine.close()
+
+    def simulate_days(self,engine,times:list[dt.datetime],records:np.array,first:int,last:int,shard:int=0,sizes:list[int]=None) -> None:
+        """
+        Main loop of the simulation, see :func:iterate_days. Prints the simulation progress.
+        :param engine: engine to run
+        :param times: dates of the simulation days
+        :param records: array for the daily aggregates, see :func:iterate_days
+        :param first: first day to simulate
+        :param last: day to stop at, i.e. the last simulated day is last-1
+        :param shard: index of the shard the engine simulates, only relevant if sizes is given
+        :param sizes: number of agents of all shards, if the engine only simulates a shard of the population. The daily quotas are split accordingly.
+        :return:
+        """
+        for i in self.iterate_days(engine,times,records,first,last,shard,sizes):
+            if shard==0:
+                print('\r{: 4d}/{: 4d}'.format(i+1,len(times)),end='')
+
+    def iterate_days(self,engine,times:list[dt.datetime],records:np.array,first:int,last:int,shard:int=0,sizes:list[int]=None):
+        """
+        Generator simulating the days one by one. Distributes the daily cases and vaccinations with the engine and stores the daily aggregates.
+        If checkpoints are set up, the state of the simulation is saved every checkpointInterval days, see :func:setup_checkpoints.
+        :param engine: engine to run
+        :param times: dates of the simulation days
+        :param records: array (days x :func:get_record_length) for the daily aggregates, i.e. the totals (see TOTALS), the immunes per aggregate (see IMMUNES) and observable, and the detected (re)infections per previous and new variant. An array with a single row is overwritten every day instead, e.g. if the days are consumed one by one and no checkpoints are saved
+        :param first: first day to simulate
+        :param last: day to stop at, i.e. the last simulated day is last-1
+        :param shard: index of the shard the engine simulates, only relevant if sizes is given
+        :param sizes: number of agents of all shards, if the engine only simulates a shard of the population. The daily quotas are split accordingly.
+        :return: generator of the simulated days, each yielded as soon as its aggregates are stored
+        """
+        OBSERVABLES = list(self.config.observables.keys())
+        for i in range(first,last):
+            t = times[i]
+            #get cases and vaccinations for the current date
+            quotas = self.get_quotas(t)
+            if sizes is not None:
+                quotas = [int(self.split_quota(q,sizes,i)[shard]) for q in quotas]
+            c1,c2,v1,v2,v3,v4 = quotas
+
+            #distribute cases and vaccinations among the agents
+            reinfections = engine.step(i,t,[c1,c2],[v1,v2,v3,v4])
+            #################### EVALUATE STATE CHANGES ###################
+            # agents are only modified at their own turn, so evaluating all state changes after the distribution is equivalent
+            engine.apply_events(i)
+            #################### SUMMARIZE ###################
+            totals = engine.get_totals()
+            immunes = engine.get_immunes()
+            record = records[i%len(records)]
+            record[:len(TOTALS)] = [totals[k] for k in TOTALS]
+            for j,k in enumerate(IMMUNES):
+                record[len(TOTALS)+j*len(OBSERVABLES):len(TOTALS)+(j+1)*len(OBSERVABLES)] = immunes[k]
+            record[len(TOTALS)+len(IMMUNES)*len(OBSERVABLES):] = reinfections.ravel()
+            if self.checkpointStore is not None and self.checkpointStore.is_due(i):
+                self.checkpointStore.save(self.digests[i],{'engine':engine,'sampler':self.batchSampler.get_state(),'records':records[:i+1]},shard)
+                self.checkpointStore.prune(self.digests,i,shard)
+            yield i
+
+    def _simulate_shard(self,shard:int,sizes:list[int],times:list[dt.datetime],buffer) -> None:
+        """
+        Simulates one shard of the population with its own random stream, entry point of the worker processes
+        :param shard: index of the shard
+        :param sizes: number of agents of all shards
+        :param times: dates of the simulation days
+        :param buffer: shared buffer for the records of all shards (shards x days x :func:get_record_length)
+        :return:
+        """
+        self.batchSampler = BatchSampler(self.config,self.immunizationTable,np.random.SeedSequence(self.config.seed,spawn_key=(shard,))) #independent streams of each shard
+        records = np.frombuffer(buffer).reshape(len(sizes),len(times),-1)[shard]
+        self.simulate(sizes[shard],times,records,shard,sizes)
+
+    def simulate_sharded(self,size:int,times:list[dt.datetime]) -> np.array:
+        """
+        Splits the population into config.shards shards of almost equal size which are simulated independently in parallel worker processes. Each shard gets its share of the daily quotas, see :func:split_quota.
+        Since infections and vaccinations are distributed uniformly among the agents anyway, the merged result is statistically equivalent to a single-process run.
+        The daily aggregates are written to shared memory and summed up afterwards. If processes cannot be forked on this platform, the shards are simulated one after the other with identical results.
+        :param size: total number of agents
+        :param times: dates of the simulation days
+        :return: summed daily aggregates, see :func:simulate
+        """
+        shards = self.config.shards
+        sizes = [size//shards+(k<size%shards) for k in range(shards)]
+        length = shards*len(times)*self.get_record_length()
+        if 'fork' in mp.get_all_start_methods():
+            ctx = mp.get_context('fork') #workers inherit the simulation instead of pickling it
+            buffer = ctx.RawArray('d',length)
+            processes = [ctx.Process(target=self._simulate_shard,args=(k,sizes,times,buffer)) for k in range(shards)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+            for k,p in enumerate(processes):
+                if p.exitcode!=0:
+                    raise RuntimeError('Simulation of shard {} failed with exit code {}'.format(k,p.exitcode))
+        else:
+            print('processes cannot be forked, shards are simulated sequentially')
+            buffer = bytearray(8*length)
+            for k in range(shards):
+                self._simulate_shard(k,sizes,times,buffer)
+        return np.frombuffer(buffer).reshape(shards,len(times),-1).sum(axis=0)
+
+    def get_cache_key(self) -> str:
+        """
+        Returns the key of the simulation result in the result cache, i.e. a hash of the config, the contents of all input data files and the model code. Hence, modified data files or code changes never lead to stale results.
+        :return: hex digest as string
+        """
+        digest = hashlib.md5(self.config.hash().encode('utf-8'))
+        for filename in [self.config.filenameEpidata,self.config.filenameVaccdata,self.config.filenameVariantdata,self.config.filenamePopulationdata]:
+            digest.update(ResultCache.hash_file(filename).encode('utf-8'))
+        digest.update(ResultCache.hash_code().encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_cache(self) -> ResultCache:
         """
-        Return a filename for saving and loading cached simulation results
-        :return: filepath as string
+        :return: result cache specified in the config, None if caching is disabled
         """
-        folder = 'cache'
-        if not os.path.isdir(folder):
-            os.mkdir(folder)
-        filename = os.path.join(folder,self.config.hash() + '.pickle')
-        return filename
+        if self.config.cacheSize<=0:
+            return None
+        return ResultCache(self.config.cacheFolder,self.config.cacheSize*1e6)
 
     def try_to_load_from_cached(self) -> dict:
         """
-        Attempts to load a simulation result from a cached file.
-        :return: empty dict, if no file was found, a simulation result as dict otherwise
+        Attempts to load a simulation result from the result cache.
+        :return: empty dict, if no result was found, a simulation result as dict otherwise
         """
-        filename = self.get_cache_filename()
-        try:
-            with open(filename,'rb') as f:
-                result = pickle.load(f)
-            print('loaded cached result')
-            return result
-        except:
+        cache = self.get_cache()
+        result = None if cache is None else cache.load(self.get_cache_key())
+        if result is None:
             print('no cached result found')
             return {}
+        print('loaded cached result')
+        return result
 
     def save_as_pickle(self,result:dict) -> None:
         """
-        Save a simulation result to a pickle binary file for caching.
+        Save a simulation result to the result cache.
         :param result: result as dictionary
         :return:
         """
-        filename = self.get_cache_filename()
-        with open(filename, 'wb') as f:
-            pickle.dump(result,f)
+        cache = self.get_cache()
+        if cache is not None:
+            cache.save(self.get_cache_key(),result)
+
+    def get_aggregates(self,records:np.array,times:list[dt.datetime]) -> dict:
+        """
+        Converts the daily aggregates of the main loop into the simulated part of the simulation result, i.e. all result keys except the ones taken from the case and population data
+        :param records: daily aggregates, see :func:iterate_days
+        :param times: dates of the simulation days
+        :return: dictionary with the result keys
+        """
+        OBSERVABLES = list(self.config.observables.keys())
+        steps = len(times)
+        scale = self.config.scale
+        variants = self.variantParameters.get_variants()
+        #specify arrays for output
+        Vaccinated,Recovered,RecoveredUndet,VaccinatedAndRecovered,VaccinatedAndRecoveredUndet,Active,ActiveUndet = [records[:,k].copy() for k in range(len(TOTALS))]
+        immunes = records[:,len(TOTALS):len(TOTALS)+len(IMMUNES)*len(OBSERVABLES)].reshape(steps,len(IMMUNES),len(OBSERVABLES))
+        ImmunesVaccinated = dict()
+        ImmunesRecovered = dict()
+        ImmunesRecoveredUndet = dict()
+        ImmunesVaccinatedAndRecovered = dict()
+        ImmunesVaccinatedAndRecoveredUndet = dict()
+        for k,o in enumerate(OBSERVABLES):
+            ImmunesVaccinated[o] = immunes[:,0,k].copy()
+            ImmunesRecovered[o] = immunes[:,1,k].copy()
+            ImmunesRecoveredUndet[o] = immunes[:,2,k].copy()
+            ImmunesVaccinatedAndRecovered[o] = immunes[:,3,k].copy()
+            ImmunesVaccinatedAndRecoveredUndet[o] = immunes[:,4,k].copy()
+        reinfections = records[:,len(TOTALS)+len(IMMUNES)*len(OBSERVABLES):].reshape(steps,len(variants)+1,len(variants))
+        DetReinfections = dict()
+        for k1,v in enumerate([None]+variants):
+            for k2,v2 in enumerate(variants):
+                DetReinfections[(v,v2)] = reinfections[:,k1,k2].copy()
+        # simulation results are given in relative numbers. I.e. divide numbers by N*scale
+        Vaccinated /= (scale)
+        Recovered /= (scale)
+        RecoveredUndet /= (scale)
+        VaccinatedAndRecovered /= (scale)
+        VaccinatedAndRecoveredUndet /= (scale)
+        for target in OBSERVABLES:
+            ImmunesVaccinated[target] /= (scale)
+            ImmunesRecovered[target] /= (scale)
+            ImmunesRecoveredUndet[target] /= (scale)
+            ImmunesVaccinatedAndRecovered[target] /= (scale)
+            ImmunesVaccinatedAndRecoveredUndet[target] /= (scale)
+        Active /= (scale)
+        ActiveUndet /= (scale)
+        for v1 in self.variantParameters.variants:
+            for v2 in self.variantParameters.variants:
+                DetReinfections[(v1,v2)]/= (scale)
+        for v2 in self.variantParameters.variants:
+            DetReinfections[(None, v2)] /= (scale)
+
+        #setup result dictionary
+        result = {'vaccinated':Vaccinated,
+            'past detected':Recovered,
+            'past undetected':RecoveredUndet,
+            'past detected + vaccinated':VaccinatedAndRecovered,
+            'past undetected + vaccinated':VaccinatedAndRecoveredUndet,
+            'active detected':Active,
+            'active undetected':ActiveUndet,
+            'time':times}
+
+        ratios = self.variantParameters.get_variant_ratios(times)
+        for j, k in enumerate(self.variantParameters.get_variants()):
+            result['active detected ' + k] = Active * ratios[:, j]
+            result['active undetected ' + k] = ActiveUndet * ratios[:, j]
+
+        for target in OBSERVABLES:
+            result['vaccinated immune '+target] = ImmunesVaccinated[target]
+            result['past detected immune '+target] = ImmunesRecovered[target]
+            result['past undetected immune '+target] = ImmunesRecoveredUndet[target]
+            result['past detected + vaccinated immune '+target] = ImmunesVaccinatedAndRecovered[target]
+            result['past undetected + vaccinated immune '+target] = ImmunesVaccinatedAndRecoveredUndet[target]
+
+            result['vaccinated susceptible ' + target] = Vaccinated - ImmunesVaccinated[target]
+            result['past detected susceptible ' + target] = Recovered - ImmunesRecovered[target]
+            result['past undetected susceptible ' + target] = RecoveredUndet - ImmunesRecoveredUndet[target]
+            result['past detected + vaccinated susceptible ' + target] = VaccinatedAndRecovered - ImmunesVaccinatedAndRecovered[target]
+            result['past undetected + vaccinated susceptible ' + target] = VaccinatedAndRecoveredUndet - ImmunesVaccinatedAndRecoveredUndet[target]
+            result['immune' + target] = ImmunesRecovered[target] + ImmunesRecoveredUndet[target] + ImmunesVaccinated[target] + ImmunesVaccinatedAndRecovered[target] + ImmunesVaccinatedAndRecoveredUndet[target]
+
+        for v1 in self.variantParameters.variants:
+            for v2 in self.variantParameters.variants:
+                result['detected reinfection ({},{})'.format(v1,v2)] = DetReinfections[(v1,v2)]
+        for v2 in self.variantParameters.variants:
+            result['detected reinfection (None,{})'.format(v2)] = DetReinfections[(None,v2)]
+        return result
+
+    def get_result(self,records:np.array,times:list[dt.datetime]) -> dict:
+        """
+        Converts the daily aggregates of the main loop into the simulation result
+        :param records: daily aggregates, see :func:iterate_days
+        :param times: dates of the simulation days
+        :return: simulation result as dictionary
+        """
+        result = self.get_aggregates(records,times)
+        fed = self.config.federalstate
+        N = self.populationParameters.get_population(fed)
+        ratios = self.variantParameters.get_variant_ratios(times)
+        for t, ratio in zip(times, ratios.tolist()):
+            cases = self.caseParameters.get_daily(t, True, fed)
+            cases2 = self.caseParameters.get(t, True, fed) + self.caseParameters.get(t, False, fed)
+            for v, s in zip(self.variantParameters.get_variants(), ratio):
+                try:
+                    result['new confirmed ' + v].append(int(cases * s))
+                    result['new infected ' + v].append(int(cases2 * s))
+                except:
+                    result['new confirmed ' + v] = [int(cases * s)]
+                    result['new infected ' + v] = [int(cases2 * s)]
+            try:
+                result['new confirmed'].append(int(cases))
+                result['new infected'].append(int(cases2))
+            except:
+                result['new confirmed'] = [int(cases)]
+                result['new infected'] = [int(cases2)]
+        result['population'] = [N for x in result['time']]
+        return result
+
+    def stream(self):
+        """
+        Generator variant of :func:run which yields the simulated aggregates of every day as soon as they are computed, e.g. to write them to disk, to update a live dashboard or to stop early.
+        The full result dictionary is never built. Leaving the loop early, e.g. once the immunity against an observable crosses a threshold, stops the simulation and releases the engine.
+        The days are simulated in this process, i.e. config.shards is ignored, and the result cache is not used. Days restored from a checkpoint are yielded first.
+        :return: generator of dicts with the date of the day as 'time' and the values of the day for all simulated result keys, see :func:get_aggregates
+        """
+        self.batchSampler = BatchSampler(self.config,self.immunizationTable,self.config.seed)
+        times = self.get_times()
+        history = len(times) if self.config.checkpointFolder is not None else 1 #the aggregates of the former days are only needed for saving and restoring checkpoints
+        records = np.zeros((history,self.get_record_length()))
+        engine,first = self.start(self.get_size(),times,records)
+        try:
+            for i in range(first):
+                yield self.get_day(records,times,i)
+            for i in self.iterate_days(engine,times,records,first,len(times)):
+                yield self.get_day(records,times,i)
+        finally:
+            engine.close()
+
+    def get_day(self,records:np.array,times:list[dt.datetime],i:int) -> dict:
+        """
+        :param records: daily aggregates, see :func:iterate_days
+        :param times: dates of the simulation days
+        :param i: simulation day
+        :return: dict with the date of the day as 'time' and the values of the day for all simulated result keys, see :func:get_aggregates
+        """
+        k = i%len(records)
+        aggregates = self.get_aggregates(records[k:k+1],times[i:i+1])
+        return {k:(times[i] if k=='time' else float(v[0])) for k,v in aggregates.items()}
 
     def run(self) -> dict:
         """
         Routine to run the simulation. Automatically iterates over the simulation time window specified in the config and evaluates infections and vaccinations for immunization.
         :return: simulation result as dictionary
         """
-        np.random.seed(self.config.seed) #set the seed of the random number generator for reproducibility reasons
-        OBSERVABLES = list(self.config.observables.keys())
+        self.batchSampler = BatchSampler(self.config,self.immunizationTable,self.config.seed) #pre-sampled random pools with seeded random streams for reproducibility reasons
         result = self.try_to_load_from_cached() #try to load a cached result
         if result != {}:
             return result
         else:
             print('start simulation')
-            steps = (self.config.tend-self.config.t0).days+1
-            times = [self.config.t0 + dt.timedelta(x) for x in range(steps)]
-
-            #specify arrays for output
-            ImmunesVaccinated = dict()
-            ImmunesRecovered = dict()
-            ImmunesRecoveredUndet = dict()
-            ImmunesVaccinatedAndRecovered = dict()
-            ImmunesVaccinatedAndRecoveredUndet = dict()
-            for o in OBSERVABLES:
-                ImmunesVaccinated[o] = np.zeros(steps)
-                ImmunesRecovered[o] = np.zeros(steps)
-                ImmunesRecoveredUndet[o] = np.zeros(steps)
-                ImmunesVaccinatedAndRecovered[o] = np.zeros(steps)
-                ImmunesVaccinatedAndRecoveredUndet[o] = np.zeros(steps)
-            DetReinfections = dict()
-            for v in self.variantParameters.get_variants():
-                for v2 in self.variantParameters.get_variants():
-                    DetReinfections[(v,v2)] = np.zeros(steps)
-            for v2 in self.variantParameters.get_variants():
-                DetReinfections[(None, v2)] = np.zeros(steps)
-            Vaccinated = np.zeros(steps)
-            Recovered = np.zeros(steps)
-            RecoveredUndet = np.zeros(steps)
-            VaccinatedAndRecovered = np.zeros(steps)
-            VaccinatedAndRecoveredUndet = np.zeros(steps)
-            Active = np.zeros(steps)
-            ActiveUndet = np.zeros(steps)
-
-            #initialize population
-            fed = self.config.federalstate
-            N = self.populationParameters.get_population(fed)
-            scale = self.config.scale
-            Persons = [Person(x) for x in range(int(N*scale))]
-            for p in Persons:
-                p.immune = {o:False for o in OBSERVABLES}
-                p.immDate = {o:None for o in OBSERVABLES}
-                p.lossDate = {o:None for o in OBSERVABLES}
-
-            #main loop
-            for i in range(steps):
-                print('\r{: 4d}/{: 4d}'.format(i+1,steps),end='')
-
-                t = times[i]
-                #get cases and vaccinations for the current date
-                v1 = int(round(self.vaccinations.get(t, 1,fed)*scale,0))
-                v2 = int(round(self.vaccinations.get(t, 2,fed)*scale,0))
-                v3 = int(round(self.vaccinations.get(t, 3,fed)*scale,0))
-                v4 = int(round(self.vaccinations.get(t, 4,fed)*scale,0))
-                c1 = int(round(self.caseParameters.get(t,True,fed)*scale,0))
-                c2 = int(round(self.caseParameters.get(t,False,fed)*scale,0))
-
-                #shuffle the list - expensive but necessary
-                np.random.shuffle(Persons)
-
-                #loop ofer agents
-                for p in Persons:
-                    #as long as cases (c1,c2) or vaccines (v1,v2,v3) are available, we try to distribute them among the persons
-                    if c1>0 and not p.active:
-                        cause = self.variantParameters.sample_variant(t.date())
-                        if p.immune[cause]==False:
-                            p.confDate = i + np.random.choice(self.config.detDelay) # day of detection
-                            rday = i + np.random.choice(self.config.recoveryDelay[0]) # day of recovery
-                            p.recDate = rday
-                            baseImm = self.baseImmunizationParameters.sample_base_immunity_all(cause,
-                                                                                               OBSERVABLES)  # sample where recovery leads to immunity at all
-                            loseDays = self.lossParameters.sample_loss(cause,
-                                                                       OBSERVABLES)  # sample day of immunity loss
-                            for target, bi, ld in zip(OBSERVABLES, baseImm, loseDays):
-                                if bi:
-                                    p.immDate[target] = rday # render immune after recovery
-                                    lossDate = rday+ld
-                                    # if the agent currently has a future immunity loss date defined, take the maximum
-                                    if (p.lossDate[target]!=None):
-                                        p.lossDate[target] = max(p.lossDate[target],lossDate)
-                                    else:
-                                        p.lossDate[target] = lossDate
-                            #state changes
-                            p.conf = False
-                            p.active = True
-                            DetReinfections[(p.variant,cause)][i]+=1
-                            p.variant = cause #p.variant is only CONFIRMED variant
-                            c1-=1 #reduce number of confirmed infections
-                    elif c2>0 and not p.active: #analogous to detected infections
-                        cause = self.variantParameters.sample_variant(t.date())
-                        if p.immune[cause] == False:
-                            rday = i + np.random.choice(self.config.recoveryDelay[1])
-                            p.recDate = rday
-                            baseImm = self.baseImmunizationParameters.sample_base_immunity_all(cause,
-                                                                                 OBSERVABLES)
-                            loseDays = self.lossParameters.sample_loss(cause, OBSERVABLES)
-                            for target,bi,ld in zip(OBSERVABLES,baseImm,loseDays):
-                                if bi:
-                                    p.immDate[target] = rday
-                                    lossDate = rday + ld
-                                    if (p.lossDate[target] != None):
-                                        p.lossDate[target] = max(p.lossDate[target], lossDate)
-                                    else:
-                                        p.lossDate[target] = lossDate
-                            p.conf = False
-                            p.active = True
-                            c2-=1
-                    elif p.vacc==0 and p.active==False and v1>0: #first vaccinations only for persons who are not active and are not vaccinated yet
-                        p.vaccDate = i
-                        baseImm = self.baseImmunizationParameters.sample_base_immunity_all('VACC1',
-                                                                                           OBSERVABLES)
-                        loseDays = self.lossParameters.sample_loss('VACC1', OBSERVABLES)
-                        for target, bi, ld in zip(OBSERVABLES, baseImm, loseDays):
-                            if bi:
-                                p.immDate[target] = i + self.config.vaccDelay
-                                lossDate = i + self.config.vaccDelay + ld
-                                if (p.lossDate[target] != None):
-                                    p.lossDate[target] = max(p.lossDate[target], lossDate)
-                                else:
-                                    p.lossDate[target] = lossDate
-                                p.lossDate[target] = lossDate
-                        p.vacc = 1
-                        v1 -= 1
-                    elif p.vacc==1 and p.active== False and v2>0 and (i-p.vaccDate)>self.config.vaccIntervals[0]: #second vaccinations only for persons who are not active, have already got a first shot, and time between vaccinations is at least x -days
-                        p.vaccDate = i
-                        baseImm = self.baseImmunizationParameters.sample_base_immunity_all('VACC2',
-                                                                                           OBSERVABLES)
-                        loseDays = self.lossParameters.sample_loss('VACC2', OBSERVABLES)
-                        for target, bi, ld in zip(OBSERVABLES, baseImm, loseDays):
-                            if bi:
-                                p.immDate[target] = i + self.config.vaccDelay
-                                lossDate = i + self.config.vaccDelay + ld
-                                if (p.lossDate[target] != None):
-                                    p.lossDate[target] = max(p.lossDate[target], lossDate)
-                                else:
-                                    p.lossDate[target] = lossDate
-                                p.lossDate[target] = lossDate
-                        p.vacc = 2
-                        v2 -= 1
-                    elif p.vacc==2 and p.active== False and v3>0 and (i-p.vaccDate)>self.config.vaccIntervals[1]: #third vaccinations only for persons who are not active, have already got a second shot, and time between vaccinations is at least x -days
-                        p.vaccDate = i
-                        baseImm = self.baseImmunizationParameters.sample_base_immunity_all('VACC3',
-                                                                                           OBSERVABLES)
-                        loseDays = self.lossParameters.sample_loss('VACC3', OBSERVABLES)
-                        for target, bi, ld in zip(OBSERVABLES, baseImm, loseDays):
-                            if bi:
-                                p.immDate[target] = i + self.config.vaccDelay
-                                lossDate = i + self.config.vaccDelay + ld
-                                if (p.lossDate[target] != None):
-                                    p.lossDate[target] = max(p.lossDate[target], lossDate)
-                                else:
-                                    p.lossDate[target] = lossDate
-                                p.lossDate[target] = lossDate
-                        p.vacc = 3
-                        v3 -= 1
-                    elif p.vacc==3 and p.active== False and v4>0 and (i-p.vaccDate)>self.config.vaccIntervals[2]: #fourth vaccinations only for persons who are not active, have already got a second shot, and time between vaccinations is at least x -days
-                        p.vaccDate = i
-                        baseImm = self.baseImmunizationParameters.sample_base_immunity_all('VACC4',
-                                                                                           OBSERVABLES)
-                        loseDays = self.lossParameters.sample_loss('VACC4', OBSERVABLES)
-                        for target, bi, ld in zip(OBSERVABLES, baseImm, loseDays):
-                            if bi:
-                                p.immDate[target] = i + self.config.vaccDelay
-                                lossDate = i + self.config.vaccDelay + ld
-                                if (p.lossDate[target] != None):
-                                    p.lossDate[target] = max(p.lossDate[target], lossDate)
-                                else:
-                                    p.lossDate[target] = lossDate
-                                p.lossDate[target] = lossDate
-                        p.vacc = 4
-                        v4 -= 1
-                    #################### EVALUATE STATE CHANGES ###################
-                    for target in OBSERVABLES:
-                        if p.immDate[target] == i:
-                            p.immDate[target] = None
-                            p.immune[target] = True
-                        if p.lossDate[target] == i:
-                            p.lossDate[target] = None
-                            p.immune[target] = False
-                    if p.recDate == i:
-                        p.recDate = None
-                        p.active = False
-                        p.rec = True
-                    if p.confDate == i:
-                        p.confDate = None
-                        p.conf = True
-                    #################### SUMMARIZE ###################
-                    if p.active == True:
-                        if p.conf:
-                            Active[i] += 1
-                            if p.vacc > 0:
-                                VaccinatedAndRecovered[i] += 1
-                                for target in OBSERVABLES:
-                                    ImmunesVaccinatedAndRecovered[target][i] += 1
-                            else:
-                                Recovered[i] += 1
-                                for target in OBSERVABLES:
-                                    ImmunesRecovered[target][i] += 1
-                        else:
-                            ActiveUndet[i] += 1
-                            if p.vacc>0:
-                                VaccinatedAndRecoveredUndet[i] += 1
-                                for target in OBSERVABLES:
-                                    ImmunesVaccinatedAndRecoveredUndet[target][i] += 1
-                            else:
-                                RecoveredUndet[i] += 1
-                                for target in OBSERVABLES:
-                                    ImmunesRecoveredUndet[target][i] += 1
-                    elif p.vacc>0 and not p.rec:
-                        Vaccinated[i]+=1
-                        for target in OBSERVABLES:
-                            if p.immune[target]:
-                                ImmunesVaccinated[target][i]+=1
-                    elif p.vacc>0 and p.rec:
-                        if p.conf:
-                            VaccinatedAndRecovered[i]+=1
-                            for target in OBSERVABLES:
-                                if p.immune[target]:
-                                    ImmunesVaccinatedAndRecovered[target][i]+=1
-                        else:
-                            VaccinatedAndRecoveredUndet[i] += 1
-                            for target in OBSERVABLES:
-                                if p.immune[target]:
-                                    ImmunesVaccinatedAndRecoveredUndet[target][i] += 1
-                    elif p.rec:
-                        if p.conf:
-                            Recovered[i]+=1
-                            for target in OBSERVABLES:
-                                if p.immune[target]:
-                                    ImmunesRecovered[target][i]+=1
-                        else:
-                            RecoveredUndet[i] += 1
-                            for target in OBSERVABLES:
-                                if p.immune[target]:
-                                    ImmunesRecoveredUndet[target][i] += 1
-            # simulation results are given in relative numbers. I.e. divide numbers by N*scale
-            Vaccinated /= (scale)
-            Recovered /= (scale)
-            RecoveredUndet /= (scale)
-            VaccinatedAndRecovered /= (scale)
-            VaccinatedAndRecoveredUndet /= (scale)
-            for target in OBSERVABLES:
-                ImmunesVaccinated[target] /= (scale)
-                ImmunesRecovered[target] /= (scale)
-                ImmunesRecoveredUndet[target] /= (scale)
-                ImmunesVaccinatedAndRecovered[target] /= (scale)
-                ImmunesVaccinatedAndRecoveredUndet[target] /= (scale)
-            Active /= (scale)
-            ActiveUndet /= (scale)
-            for v1 in self.variantParameters.variants:
-                for v2 in self.variantParameters.variants:
-                    DetReinfections[(v1,v2)]/= (scale)
-            for v2 in self.variantParameters.variants:
-                DetReinfections[(None, v2)] /= (scale)
-
-            #setup result dictionary
-            result = {'vaccinated':Vaccinated,
-                'past detected':Recovered,
-                'past undetected':RecoveredUndet,
-                'past detected + vaccinated':VaccinatedAndRecovered,
-                'past undetected + vaccinated':VaccinatedAndRecoveredUndet,
-                'active detected':Active,
-                'active undetected':ActiveUndet,
-                'time':times}
-
-            variants = self.variantParameters.get_variants()
-            ratiosList = self.variantParameters.get_variant_ratios(times)
-            ratios = {v: list() for v in variants}
-            for rl in ratiosList:
-                for v, r in zip(variants, rl):
-                    ratios[v].append(r)
-            for k, v in ratios.items():
-                result['active detected ' + k] = Active * np.array(v)
-                result['active undetected ' + k] = ActiveUndet * np.array(v)
-
-            for target in OBSERVABLES:
-                result['vaccinated immune '+target] = ImmunesVaccinated[target]
-                result['past detected immune '+target] = ImmunesRecovered[target]
-                result['past undetected immune '+target] = ImmunesRecoveredUndet[target]
-                result['past detected + vaccinated immune '+target] = ImmunesVaccinatedAndRecovered[target]
-                result['past undetected + vaccinated immune '+target] = ImmunesVaccinatedAndRecoveredUndet[target]
-
-                result['vaccinated susceptible ' + target] = Vaccinated - ImmunesVaccinated[target]
-                result['past detected susceptible ' + target] = Recovered - ImmunesRecovered[target]
-                result['past undetected susceptible ' + target] = RecoveredUndet - ImmunesRecoveredUndet[target]
-                result['past detected + vaccinated susceptible ' + target] = VaccinatedAndRecovered - ImmunesVaccinatedAndRecovered[target]
-                result['past undetected + vaccinated susceptible ' + target] = VaccinatedAndRecoveredUndet - ImmunesVaccinatedAndRecoveredUndet[target]
-                result['immune' + target] = ImmunesRecovered[target] + ImmunesRecoveredUndet[target] + ImmunesVaccinated[target] + ImmunesVaccinatedAndRecovered[target] + ImmunesVaccinatedAndRecoveredUndet[target]
-
-            for v1 in self.variantParameters.variants:
-                for v2 in self.variantParameters.variants:
-                    result['detected reinfection ({},{})'.format(v1,v2)] = DetReinfections[(v1,v2)]
-            for v2 in self.variantParameters.variants:
-                result['detected reinfection (None,{})'.format(v2)] = DetReinfections[(None,v2)]
-
-            fed = self.config.federalstate
-            for t in times:
-                if fed == None:
-                    try:
-                        cases = self.caseParameters.cases[t][True]
-                    except:
-                        cases = 0
-                else:
-                    try:
-                        cases = self.caseParameters.casesFed[fed][t][True]
-                    except:
-                        cases = 0
-                cases2 = self.caseParameters.get(t, True, fed) + self.caseParameters.get(t, False, fed)
-                for v, s in zip(self.variantParameters.get_variants(), self.variantParameters.get_variant_ratio(t.date())):
-                    try:
-                        result['new confirmed ' + v].append(int(cases * s))
-                        result['new infected ' + v].append(int(cases2 * s))
-                    except:
-                        result['new confirmed ' + v] = [int(cases * s)]
-                        result['new infected ' + v] = [int(cases2 * s)]
-                try:
-                    result['new confirmed'].append(int(cases))
-                    result['new infected'].append(int(cases2))
-                except:
-                    result['new confirmed'] = [int(cases)]
-                    result['new infected'] = [int(cases2)]
-            result['population'] = [N for x in result['time']]
+            times = self.get_times()
+
+            #initialize population and run the main loop
+            if self.config.shards>1:
+                records = self.simulate_sharded(self.get_size(),times)
+            else:
+                records = np.zeros((len(times),self.get_record_length()))
+                self.simulate(self.get_size(),times,records)
+
+            result = self.get_result(records,times)
 
             self.save_as_pickle(result)
             print() #interrupt \r printing from time-counter
-            return result
\ No newline at end of file
+            return result
@@ -9,47 +9,53 @@ martin.bicher@dwh.at or visit
 https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
 """
 
-import csv
 import datetime as dt
+import numpy as np
 from config import Config
+from csv_columns import CsvColumns
 
 class VaccinationParameters:
     def __init__(self,config:Config) -> None:
         """
         Interface class between vaccination data and simulation.
+        The data is stored in a dense array (days x regions x shot numbers) whereas the last region holds the national totals. Hence, lookups and whole timelines are plain array indexing.
         :param config: config instance of the simulation
         """
         self.config = config
-        self.vaccinations = dict()
-        self.vaccinationsFed = dict()
-        #parse CSV file
-        file = config.filenameVaccdata
-        with open(file,'r') as f:
-          r = csv.reader(f,delimiter=';')
-          next(r)
-          for line in r:
-              date = dt.datetime.strptime(line[0],"%Y-%m-%d")
-              fed = line[1]
-              shotNo = int(line[2])
-              count = int(line[3])
-              try:
-                  self.vaccinations[date][shotNo]+=count
-              except:
-                  try:
-                      self.vaccinations[date][shotNo] = count
-                  except:
-                      self.vaccinations[date] = dict()
-                      self.vaccinations[date][shotNo] = count
-              if fed not in self.vaccinationsFed.keys():
-                  self.vaccinationsFed[fed]=dict()
-              try:
-                  self.vaccinationsFed[fed][date][shotNo] += count
-              except:
-                  try:
-                      self.vaccinationsFed[fed][date][shotNo] = count
-                  except:
-                      self.vaccinationsFed[fed][date] = dict()
-                      self.vaccinationsFed[fed][date][shotNo] = count
+        self._set_data(*self.parse(config.filenameVaccdata))
+
+    @staticmethod
+    def parse(file:str) -> tuple:
+        """
+        Converts the columns of the csv file into the dense array with vectorized operations, see :class:CsvColumns
+        :param file: path to the csv file with columns date, region, shotNo and doses
+        :return: first date as string (YYYY-mm-dd), list of the regionIDs and array (days x regions+1 x shot numbers) of doses whereas the last region holds the national totals
+        """
+        columns = CsvColumns(file)
+        dates = columns['date']
+        regions,regionIdx = np.unique(columns['region'],return_inverse=True)
+        shotNo = columns['shotNo']
+        count = columns['doses']
+        t0 = dates.min()
+        days = (dates-t0).astype(np.int64)
+        doses = np.zeros((days.max()+1,len(regions)+1,shotNo.max()+1),dtype=np.int64)
+        np.add.at(doses,(days,regionIdx,shotNo),count)
+        doses[:,-1] = doses[:,:-1].sum(axis=1) #national totals
+        return str(t0),[str(x) for x in regions],doses
+
+    def _set_data(self,t0:str,regions:list[str],doses:np.array) -> None:
+        """
+        :param t0: date of the first day of the array (YYYY-mm-dd)
+        :param regions: list of the regionIDs
+        :param doses: array (days x regions+1 x shot numbers) of doses, see :func:parse
+        :return:
+        """
+        self.t0 = dt.datetime.strptime(t0,'%Y-%m-%d')
+        self.regionIndex = {fed:k for k,fed in enumerate(regions)} #regionID -> index of the region axis
+        self.regionIndex[None] = len(regions) #national totals
+        self.doses = doses
+        self._rows = doses.tolist() #nested lists for fast scalar lookups
+        self._days = {self.t0+dt.timedelta(k):k for k in range(len(doses))} #date -> index of the day axis
 
     def get(self,date:dt.datetime,shotNo:int,fed=None) -> int:
         """
@@ -59,13 +65,24 @@ class VaccinationParameters:
         :param fed: optional, federalstate
         :return: number of shots for the date
         """
-        if fed==None:
-            try:
-                return self.vaccinations[date][shotNo]
-            except:
-                return 0
-        else:
-            try:
-                return self.vaccinationsFed[fed][date][shotNo]
-            except:
-                return 0
+        day = self._days.get(date)
+        region = self.regionIndex.get(fed)
+        if day is None or region is None or not 0<=shotNo<len(self._rows[0][0]):
+            return 0
+        return self._rows[day][region][shotNo]
+
+    def get_timeline(self,times:list[dt.datetime],fed=None) -> np.array:
+        """
+        Returns the number of shots of all shot numbers for consecutive dates in one slice
+        :param times: consecutive dates, e.g. the simulation days
+        :param fed: optional, federalstate
+        :return: array (dates x shot numbers) whereas column k refers to shot number k, zero outside the data
+        """
+        timeline = np.zeros((len(times),self.doses.shape[2]),dtype=np.int64)
+        if len(times)==0 or fed not in self.regionIndex.keys():
+            return timeline
+        first = (times[0]-self.t0).days
+        start,stop = max(first,0),min(first+len(times),len(self.doses))
+        if start<stop:
+            timeline[start-first:stop-first] = self.doses[start:stop,self.regionIndex[fed]]
+        return timeline
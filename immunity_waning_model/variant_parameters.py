@@ -10,8 +10,8 @@ https://github.com/dwhGmbH/covid19_model_family/LICENSE.txt
 """
 
 from config import Config
+from csv_columns import CsvColumns
 import numpy as np
-import csv
 import datetime as dt
 
 
@@ -20,28 +20,29 @@ class VariantParameters:
         """
         Interface between variant information and simulation. The variant .csv file is specified as follows:
         Each column of the file corresponds to a variant. The value in each line corresponds to the ratio of daily cases
+        The ratios are stored as dense matrix (days x variants) from the first to the last date of the file, days missing in the file repeat the previous ratios. Dates outside the file are clamped to the first or last date.
         Instance is also used to randomly sample a variant for a given case.
         :param config: config instance of the simulation
         """
-        self.variants = list()
-        self.ratios = dict()
         # parse variant csv file
         if config == None:
             filename = 'variant_data.csv'
         else:
             filename = config.filenameVariantdata
-        with open(filename, 'r') as f:
-            r = csv.reader(f, delimiter=';')
-            hdr = next(r)
-            self.variants = hdr[1:]
-            for line in r:
-                date = dt.datetime.strptime(line[0], '%Y-%m-%d').date()
-                ratios = [float(x) for x in line[1:]]
-                sm = sum(ratios)  # just to make sure...
-                ratios = [x / sm for x in ratios]
-                self.ratios[date] = ratios
-        self.maxtime = max(self.ratios.keys())
-        self.mintime = max(self.ratios.keys())
+        columns = CsvColumns(filename)
+        self.variants = columns.header[1:]
+        dates = columns[columns.header[0]]
+        ratios = np.stack([columns[v] for v in self.variants], axis=1).astype(float)
+        ratios /= ratios.sum(axis=1, keepdims=True)  # just to make sure...
+        days = (dates - dates.min()).astype(np.int64)
+        filled = np.zeros(days.max() + 1, dtype=bool)
+        filled[days] = True
+        self.matrix = np.zeros((days.max() + 1, len(self.variants)))
+        self.matrix[days] = ratios
+        self.matrix = self.matrix[np.maximum.accumulate(np.where(filled, np.arange(len(filled)), 0))]  # repeat the previous ratios on missing days
+        self.mintime = dt.datetime.strptime(str(dates.min()), '%Y-%m-%d').date()
+        self.maxtime = dt.datetime.strptime(str(dates.max()), '%Y-%m-%d').date()
+        self._rows = self.matrix.tolist()  # nested lists for fast scalar lookups
 
     def get_variants(self) -> list:
         """
@@ -50,38 +51,26 @@ class VariantParameters:
         """
         return self.variants
 
-    def get_variant_ratios(self, times: list) -> list:
+    def _get_day(self, time: dt.date) -> int:
         """
-        Evaluates the variant splits for a given time list. Utilizes the :func:get_variant_ratio function for each date.
-        :param times: list of date values
-        :return: list of lists with length of the input timeline. The inner lists sum up to one and correspond to the outcome of :func:get_variants
+        :param time: date
+        :return: row of the date in the ratio matrix, clamped to the dates of the file
         """
-        ratios = list()
-        for t in times:
-            ratios.append(self.get_variant_ratio(t.date()))
-        return ratios
+        return min(max((time - self.mintime).days, 0), len(self._rows) - 1)
 
-    def get_variant_ratio(self, time: dt.date) -> list:
+    def get_variant_ratios(self, times: list) -> np.array:
         """
-        Evaluates the variant splits for a given time. Utilizes the :func:_get_value function for each date.
+        Evaluates the variant splits for a given time list in one slice of the ratio matrix
         :param times: list of date values
-        :return: the list sums up to one and corresponds to the outcome of :func:get_variants
+        :return: matrix with one row per date of the input timeline. The rows sum up to one and their columns correspond to the outcome of :func:get_variants
         """
-        try:
-            return self.ratios[time]
-        except:
-            if time > self.maxtime:
-                return self.ratios[self.maxtime]
-            elif time < self.mintime:
-                return self.ratios[self.mintime]
-            else:
-                raise ValueError
+        days = np.array([(t.date() - self.mintime).days for t in times], dtype=np.int64)
+        return self.matrix[np.clip(days, 0, len(self.matrix) - 1)]
 
-    def sample_variant(self, time: dt.date) -> str:
+    def get_variant_ratio(self, time: dt.date) -> list:
         """
-        Samples a random variant for the given date
-        :param time: current date
-        :return: variant name as string
+        Evaluates the variant splits for a given time.
+        :param time: date value
+        :return: the list sums up to one and corresponds to the outcome of :func:get_variants
         """
-        lst = self.get_variant_ratio(time)
-        return np.random.choice(self.variants, p=lst)
\ No newline at end of file
+        return self._rows[self._get_day(time)]
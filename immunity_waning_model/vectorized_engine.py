@@ -0,0 +1,207 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AggregateCounters
+from engine import Engine
+from event_calendar import EventCalendar
+from event_type import EventType
+from population import Population, NONE
+
+MINBATCH = 256 #minimum number of candidates checked at once when distributing infections
+
+
+class VectorizedEngine(Engine):
+    def __init__(self,simulation,population:Population,calendar:EventCalendar,counters:AggregateCounters) -> None:
+        """
+        Engine distributing the daily cases and vaccinations with array operations instead of a per-agent loop.
+        It mimics the per-agent walk of the :class:AgentEngine: the non-active agents are visited in random order, the first ones are used for infection attempts until the case quotas are filled, the remaining ones receive the vaccine doses they are eligible for.
+        Hence, the results are statistically equivalent to the ones of the reference engine.
+        :param simulation: simulation instance providing config and parameter classes
+        :param population: population store to operate on
+        :param calendar: event calendar to schedule the state changes of the agents
+        :param counters: aggregate counters to keep up to date when agents change their category
+        """
+        super().__init__(simulation,population,calendar,counters)
+        self.variantTargets = np.array([self.observables.index(v) for v in self.variants]) #observable column of each variant
+
+    def _immunize(self,idx:np.array,cause:str,immDays:np.array,keepLater:bool) -> None:
+        """
+        Samples base immunity and immunity loss of an immunization event for several agents at once and schedules their immunization and loss dates.
+        :param idx: indices of the agents, must be unique
+        :param cause: immunization cause, i.e. VACC1,2,.. or ALPHA,DELTA,...
+        :param immDays: days at which the agents become immune
+        :param keepLater: if true, currently scheduled later immunity loss dates are kept (recoveries), otherwise they are overwritten (vaccinations)
+        :return:
+        """
+        if len(idx)==0:
+            return
+        baseImm,loseDays = self.batchSampler.sample_immunization(cause,len(idx))
+        self._apply_immunization(idx,immDays,baseImm,loseDays,keepLater)
+
+    def _apply_immunization(self,idx:np.array,immDays:np.array,baseImm:np.array,loseDays:np.array,keepLater:bool) -> None:
+        """
+        Sets and schedules the immunization and loss dates of several agents for given samples of base immunity and immunity loss.
+        :param idx: indices of the agents, must be unique
+        :param immDays: days at which the agents become immune
+        :param baseImm: boolean base immunity array with shape (agents, observables)
+        :param loseDays: waning duration array with shape (agents, observables)
+        :param keepLater: if true, currently scheduled later immunity loss dates are kept (recoveries), otherwise they are overwritten (vaccinations)
+        :return:
+        """
+        pop = self.pop
+        immDays = np.asarray(immDays)[:,None]
+        lossDates = immDays + loseDays
+        current = pop.lossDate[idx]
+        if keepLater:
+            lossDates = np.where(current!=NONE,np.maximum(current,lossDates),lossDates)
+        pop.immDate[idx] = np.where(baseImm,immDays,pop.immDate[idx])
+        pop.lossDate[idx] = np.where(baseImm,lossDates,current)
+        agents,observables = np.nonzero(baseImm)
+        self.calendar.schedule_many(EventType.StartImmune,immDays[agents,0],idx[agents],observables)
+        self.calendar.schedule_many(EventType.EndImmune,lossDates[agents,observables],idx[agents],observables)
+
+    def _draw_infections(self,candidates:np.array,t:dt.datetime,n:int) -> tuple[np.array,np.array,int]:
+        """
+        Visits the candidates in the given order, samples a variant for each of them and accepts the ones which are not immune against it until n infections are found.
+        :param candidates: indices of non-active agents in random order
+        :param t: current date
+        :param n: number of infections to distribute
+        :return: positions of the infected agents within candidates, variant codes of the infections, and number of visited candidates
+        """
+        ratios = self.variantParameters.get_variant_ratio(t.date())
+        positions = list()
+        codes = list()
+        pos = 0
+        while n>0 and pos<len(candidates):
+            chunk = candidates[pos:pos+max(2*n,MINBATCH)]
+            sampled = self.batchSampler.sample_variant_codes(ratios,len(chunk))
+            hits = np.flatnonzero(~self.pop.immune[chunk,self.variantTargets[sampled]])[:n]
+            positions.append(pos+hits)
+            codes.append(sampled[hits])
+            n -= len(hits)
+            if n==0:
+                pos += hits[-1]+1
+            else:
+                pos += len(chunk)
+        if len(positions)==0:
+            return np.zeros(0,dtype=int),np.zeros(0,dtype=int),0
+        return np.concatenate(positions),np.concatenate(codes),pos
+
+    def _infect(self,idx:np.array,codes:np.array,i:int,detected:bool,reinfections:np.array) -> None:
+        """
+        Renders the given agents active cases and schedules confirmation, recovery and immunization.
+        :param idx: indices of the agents
+        :param codes: variant codes of the infections
+        :param i: current simulation day
+        :param detected: whether the infections are confirmed cases
+        :param reinfections: matrix of the detected (re)infections of the day, updated in place
+        :return:
+        """
+        if len(idx)==0:
+            return
+        pop = self.pop
+        self.counters.remove(idx)
+        if detected:
+            pop.confDate[idx] = i + self.batchSampler.sample_det_delays(len(idx))
+            rdays = i + self.batchSampler.sample_recovery_delays(True,len(idx))
+            self.calendar.schedule_many(EventType.SwitchUndetDet,pop.confDate[idx],idx)
+            self.calendar.schedule_many(EventType.EndDetActive,rdays,idx)
+            np.add.at(reinfections,(pop.variant[idx]+1,codes),1)
+            pop.variant[idx] = codes
+        else:
+            rdays = i + self.batchSampler.sample_recovery_delays(False,len(idx))
+            self.calendar.schedule_many(EventType.EndUndetActive,rdays,idx)
+        pop.recDate[idx] = rdays
+        for code in np.unique(codes):
+            mask = codes==code
+            self._immunize(idx[mask],self.variants[code],rdays[mask],True)
+        pop.conf[idx] = False
+        pop.active[idx] = True
+        self.counters.add(idx)
+
+    def _vaccinate(self,idx:np.array,i:int,dose:int) -> None:
+        """
+        Administers the given dose to the agents and schedules their immunization.
+        :param idx: indices of the agents
+        :param i: current simulation day
+        :param dose: number of the dose (1,2,3,4)
+        :return:
+        """
+        if len(idx)==0:
+            return
+        pop = self.pop
+        self.counters.remove(idx)
+        pop.vaccDate[idx] = i
+        self._immunize(idx,'VACC'+str(dose),np.full(len(idx),i + self.config.vaccDelay),False)
+        pop.vacc[idx] = dose
+        self.counters.add(idx)
+
+    def _select_infections(self,t:dt.datetime,n:int) -> tuple[np.array,np.array,np.array]:
+        """
+        Selects the agents to be infected. The non-active agents are visited in random order and the first ones are used for infection attempts.
+        :param t: current date
+        :param n: total number of infections
+        :return: indices of the infected agents, variant codes of the infections, and the remaining non-active agents in visiting order
+        """
+        candidates = self.batchSampler.generator.permutation(np.concatenate([chunk[~self.pop.active[chunk]] for chunk in self.pop.chunks()]))
+        positions,codes,visited = self._draw_infections(candidates,t,n)
+        return candidates[positions],codes,candidates[visited:]
+
+    def _select_vaccinations(self,i:int,vaccinations:list[int],candidates:np.array) -> list[np.array]:
+        """
+        Selects the agents to be vaccinated. Candidates receive the doses they are eligible for in the given order.
+        The candidates are checked in chunks until all doses are distributed.
+        :param i: current simulation day
+        :param vaccinations: number of first, second, third and fourth doses
+        :param candidates: non-active agents not visited by the infection attempts, in visiting order
+        :return: list with indices of the agents for each dose
+        """
+        pop = self.pop
+        chosen = [[candidates[:0]] for _ in vaccinations]
+        remaining = [max(count,0) for count in vaccinations]
+        for chunk in pop.chunks(candidates):
+            if sum(remaining)==0:
+                break
+            vacc = pop.vacc[chunk]
+            for dose in range(1,5):
+                if remaining[dose-1]==0:
+                    continue
+                mask = vacc==dose-1
+                if dose>1:
+                    mask &= (i-pop.vaccDate[chunk])>self.config.vaccIntervals[dose-2]
+                selected = chunk[mask][:remaining[dose-1]]
+                chosen[dose-1].append(selected)
+                remaining[dose-1] -= len(selected)
+        return [np.concatenate(x) for x in chosen]
+
+    def step(self,i:int,t:dt.datetime,cases:list[int],vaccinations:list[int]) -> np.array:
+        """
+        Distributes the cases and vaccinations of one day among the agents.
+        :param i: current simulation day
+        :param t: current date
+        :param cases: number of new detected and undetected cases
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: detected (re)infections of the day as matrix (previous variant x new variant), whereas the first row corresponds to no previous confirmed infection
+        """
+        c1,c2 = cases
+        reinfections = np.zeros((len(self.variants)+1,len(self.variants)))
+        # infection attempts come first, confirmed cases first
+        infected,codes,rest = self._select_infections(t,c1+c2)
+        self._infect(infected[:c1],codes[:c1],i,True,reinfections)
+        self._infect(infected[c1:],codes[c1:],i,False,reinfections)
+        chosen = self._select_vaccinations(i,vaccinations,rest)
+        for dose,idx in zip(range(1,5),chosen):
+            self._vaccinate(idx,i,dose)
+        return reinfections
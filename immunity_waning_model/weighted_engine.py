@@ -0,0 +1,296 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import datetime as dt
+import numpy as np
+
+from aggregate_counters import AggregateCounters
+from event_calendar import EventCalendar
+from event_type import EventType
+from population import Population, NONE
+from vectorized_engine import VectorizedEngine
+
+MERGEINTERVAL = 7 #number of days between two merges of identical agents
+
+
+class WeightedEngine(VectorizedEngine):
+    def __init__(self,simulation,population:Population,calendar:EventCalendar,counters:AggregateCounters) -> None:
+        """
+        Engine working on weighted super-agents. Each agent represents weight persons with identical histories, typically the simulation starts with a single agent representing the whole population.
+        Cases and vaccinations are distributed among persons, i.e. agents are selected proportional to their weight and the selected persons are split off into a new agent. Stochastic outcomes (delays, base immunity and immunity loss) are not drawn per person, but the persons of an agent are distributed among the distinct outcomes with one multinomial draw, and the agent is split into one agent per outcome drawn.
+        Waning durations are binned to the lossResolution of the config for this purpose, so the number of agents created by an event is bounded by the number of distinct outcomes instead of the number of persons.
+        Agents whose histories became indistinguishable again, e.g. since their immunity was lost, are merged regularly.
+        :param simulation: simulation instance providing config and parameter classes
+        :param population: population store to operate on, grows whenever agents are split
+        :param calendar: event calendar to schedule the state changes of the agents
+        :param counters: aggregate counters to keep up to date when agents change their category
+        """
+        super().__init__(simulation,population,calendar,counters)
+        self.lossResolution = self.config.lossResolution
+
+    def _sample_persons(self,agents:np.array,k:int) -> tuple[np.array,np.array]:
+        """
+        Samples k distinct persons uniformly among the persons represented by the given agents
+        :param agents: indices of candidate agents
+        :param k: number of persons, capped at the total weight of the agents
+        :return: indices of the agents with at least one sampled person, and number of sampled persons for each of them
+        """
+        cumulative = np.cumsum(self.pop.weight[agents])
+        total = cumulative[-1] if len(agents)>0 else 0
+        k = min(k,total)
+        if k<=0:
+            return np.zeros(0,dtype=int),np.zeros(0,dtype=int)
+        # draw the smaller one of the sample and its complement, redrawing duplicates
+        m = min(k,total-k)
+        positions = np.zeros(0,dtype=np.int64)
+        while len(positions)<m:
+            drawn = np.concatenate([positions,(self.batchSampler.uniforms.draw(m-len(positions))*total).astype(np.int64)])
+            positions = np.unique(drawn)
+        counts = np.bincount(np.searchsorted(cumulative,positions,side='right'),minlength=len(agents))
+        if m<k:
+            counts = self.pop.weight[agents]-counts
+        mask = counts>0
+        return agents[mask],counts[mask]
+
+    def _reschedule(self,idx:np.array,i:int) -> None:
+        """
+        Schedules the pending events of copied agents according to their day columns
+        :param idx: indices of the copies
+        :param i: current simulation day
+        :return:
+        """
+        pop = self.pop
+        for eventType,dates in [(EventType.StartImmune,pop.immDate[idx]),(EventType.EndImmune,pop.lossDate[idx])]:
+            agents,observables = np.nonzero(dates>=i)
+            self.calendar.schedule_many(eventType,dates[agents,observables],idx[agents],observables)
+        mask = pop.recDate[idx]>=i
+        self.calendar.schedule_many(EventType.EndDetActive,pop.recDate[idx[mask]],idx[mask])
+        mask = pop.confDate[idx]>=i
+        self.calendar.schedule_many(EventType.SwitchUndetDet,pop.confDate[idx[mask]],idx[mask])
+
+    def _split(self,idx:np.array,counts:np.array,i:int) -> np.array:
+        """
+        Splits the given numbers of persons off the agents. Agents may occur several times, as long as the total count does not exceed their weight.
+        :param idx: indices of the agents
+        :param counts: number of persons to split off
+        :param i: current simulation day
+        :return: indices of agents representing exactly the given numbers of persons, i.e. the agent itself if all of its persons are selected or a new copy otherwise
+        """
+        pop = self.pop
+        partial = counts<pop.weight[idx]
+        if not partial.any():
+            return idx
+        sources = idx[partial]
+        unique = np.unique(sources)
+        self.counters.remove(unique)
+        copies = pop.append(sources)
+        pop.weight[copies] = counts[partial]
+        np.subtract.at(pop.weight,sources,counts[partial])
+        self.counters.add(unique)
+        self.counters.add(copies)
+        self._reschedule(copies,i)
+        out = idx.copy()
+        out[partial] = copies
+        return out
+
+    def _split_by_counts(self,idx:np.array,counts:np.array,i:int) -> tuple[np.array,np.array,np.array]:
+        """
+        Splits agents into one agent for each class of outcomes drawn for at least one of their persons
+        :param idx: indices of the agents, must be unique
+        :param counts: number of persons of each agent in each class with shape (len(idx), number of classes), the rows sum up to the weights of the agents
+        :param i: current simulation day
+        :return: indices of the resulting agents, positions of their source agents in idx, and the class of each of them
+        """
+        owners,classes = np.nonzero(counts)
+        # the first class of each agent keeps the agent, the others are split off
+        first = np.ones(len(owners),dtype=bool)
+        first[1:] = owners[1:]!=owners[:-1]
+        out = idx[owners]
+        out[~first] = self._split(out[~first],counts[owners,classes][~first],i)
+        return out,owners,classes
+
+    def _split_immunization(self,idx:np.array,cause:str,i:int) -> tuple[np.array,np.array,np.array,np.array]:
+        """
+        Distributes the persons of the agents among the outcomes of an immunization event, i.e. combinations of base immunity and waning duration bin, and splits the agents accordingly
+        :param idx: indices of the agents, must be unique
+        :param cause: immunization cause, i.e. VACC1,2,.. or ALPHA,DELTA,...
+        :param i: current simulation day
+        :return: indices of the resulting agents, positions of their source agents in idx, their base immunity and their waning durations
+        """
+        baseImm,loseDays,counts = self.batchSampler.sample_immunization_counts(cause,self.pop.weight[idx],self.lossResolution)
+        out,owners,classes = self._split_by_counts(idx,counts,i)
+        return out,owners,baseImm[classes],loseDays[classes]
+
+    def _select_infections(self,t:dt.datetime,n:int,i:int) -> tuple[np.array,np.array]:
+        """
+        Selects the persons to be infected. Like in the per-agent walk, a person-variant pair is chosen with probability proportional to the variant ratio if the person is susceptible to the variant.
+        :param t: current date
+        :param n: number of infections
+        :param i: current simulation day
+        :return: indices of the (split) agents to be infected and variant codes of the infections
+        """
+        pop = self.pop
+        ratios = np.array(self.variantParameters.get_variant_ratio(t.date()))
+        infected = list()
+        codes = list()
+        while n>0:
+            # persons selected in previous rounds are not active yet, but must not be selected again
+            candidates = np.flatnonzero(~pop.active)
+            if len(infected)>0:
+                candidates = candidates[~np.isin(candidates,np.concatenate(infected))]
+            susceptible = ~pop.immune[candidates][:,self.variantTargets]
+            weights = ratios*(pop.weight[candidates][:,None]*susceptible).sum(axis=0)
+            if weights.sum()<=0:
+                break #nobody left to infect
+            counts = self.batchSampler.sample_variant_counts(weights/weights.sum(),n)
+            found = 0
+            for code in np.flatnonzero(counts):
+                agents = candidates[susceptible[:,code]]
+                if len(infected)>0:
+                    agents = agents[~np.isin(agents,np.concatenate(infected))]
+                agents,k = self._sample_persons(agents,counts[code])
+                if len(agents)==0:
+                    continue
+                infected.append(self._split(agents,k,i))
+                codes.append(np.full(len(agents),code))
+                found += k.sum()
+            if found==0:
+                break
+            n -= found
+        if len(infected)==0:
+            return np.zeros(0,dtype=int),np.zeros(0,dtype=int)
+        return np.concatenate(infected),np.concatenate(codes)
+
+    def _infect(self,idx:np.array,codes:np.array,i:int,detected:bool,reinfections:np.array) -> None:
+        """
+        Renders the given agents active cases and schedules confirmation, recovery and immunization. Agents are split by the delays and immunization outcomes of their persons first.
+        :param idx: indices of the agents
+        :param codes: variant codes of the infections
+        :param i: current simulation day
+        :param detected: whether the infections are confirmed cases
+        :param reinfections: matrix of the detected (re)infections of the day, updated in place
+        :return:
+        """
+        if len(idx)==0:
+            return
+        pop = self.pop
+        classes,counts = self.batchSampler.sample_delay_counts(detected,pop.weight[idx])
+        idx,owners,k = self._split_by_counts(idx,counts,i)
+        delays = classes[k]
+        codes = codes[owners]
+        splitIdx,splitCodes,splitDelays,immunizations = list(),list(),list(),list()
+        for code in np.unique(codes):
+            mask = codes==code
+            agents,owners,baseImm,loseDays = self._split_immunization(idx[mask],self.variants[code],i)
+            splitIdx.append(agents)
+            splitCodes.append(np.full(len(agents),code))
+            splitDelays.append(delays[mask][owners])
+            immunizations.append((agents,baseImm,loseDays))
+        idx = np.concatenate(splitIdx)
+        codes = np.concatenate(splitCodes)
+        delays = np.concatenate(splitDelays)
+        self.counters.remove(idx)
+        rdays = i+delays[:,1]
+        if detected:
+            pop.confDate[idx] = i+delays[:,0]
+            self.calendar.schedule_many(EventType.SwitchUndetDet,pop.confDate[idx],idx)
+            self.calendar.schedule_many(EventType.EndDetActive,rdays,idx)
+            np.add.at(reinfections,(pop.variant[idx]+1,codes),pop.weight[idx])
+            pop.variant[idx] = codes
+        else:
+            self.calendar.schedule_many(EventType.EndUndetActive,rdays,idx)
+        pop.recDate[idx] = rdays
+        for agents,baseImm,loseDays in immunizations:
+            self._apply_immunization(agents,pop.recDate[agents],baseImm,loseDays,True)
+        pop.conf[idx] = False
+        pop.active[idx] = True
+        self.counters.add(idx)
+
+    def _vaccinate(self,idx:np.array,i:int,dose:int) -> None:
+        """
+        Administers the given dose to the agents and schedules their immunization. Agents are split by the immunization outcomes of their persons first.
+        :param idx: indices of the agents
+        :param i: current simulation day
+        :param dose: number of the dose (1,2,3,4)
+        :return:
+        """
+        if len(idx)==0:
+            return
+        pop = self.pop
+        idx,_,baseImm,loseDays = self._split_immunization(idx,'VACC'+str(dose),i)
+        self.counters.remove(idx)
+        pop.vaccDate[idx] = i
+        self._apply_immunization(idx,np.full(len(idx),i + self.config.vaccDelay),baseImm,loseDays,False)
+        pop.vacc[idx] = dose
+        self.counters.add(idx)
+
+    def _select_vaccinations(self,i:int,vaccinations:list[int]) -> list[np.array]:
+        """
+        Selects the persons to be vaccinated uniformly among the eligible ones
+        :param i: current simulation day
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: list with indices of the (split) agents for each dose
+        """
+        pop = self.pop
+        chosen = list()
+        for dose,count in zip(range(1,5),vaccinations):
+            agents = np.flatnonzero(~pop.active & (pop.vacc==dose-1))
+            if dose>1:
+                agents = agents[(i-pop.vaccDate[agents])>self.config.vaccIntervals[dose-2]]
+            agents,k = self._sample_persons(agents,count)
+            chosen.append(self._split(agents,k,i))
+        return chosen
+
+    def step(self,i:int,t:dt.datetime,cases:list[int],vaccinations:list[int]) -> np.array:
+        """
+        Distributes the cases and vaccinations of one day among the persons.
+        :param i: current simulation day
+        :param t: current date
+        :param cases: number of new detected and undetected cases
+        :param vaccinations: number of first, second, third and fourth doses
+        :return: detected (re)infections of the day as matrix (previous variant x new variant), whereas the first row corresponds to no previous confirmed infection
+        """
+        reinfections = np.zeros((len(self.variants)+1,len(self.variants)))
+        for detected,count in zip([True,False],cases):
+            infected,codes = self._select_infections(t,count,i)
+            self._infect(infected,codes,i,detected,reinfections)
+        chosen = self._select_vaccinations(i,vaccinations)
+        for dose,idx in zip(range(1,5),chosen):
+            self._vaccinate(idx,i,dose)
+        return reinfections
+
+    def _merge(self,i:int) -> None:
+        """
+        Merges agents which are identical with respect to their future evolution. Past days are already reset by the event processing, the day of the last vaccination only matters until the interval to the next dose has passed.
+        The agents are renumbered, so all pending events are rescheduled.
+        :param i: current simulation day, all events of this day must be applied already
+        :return:
+        """
+        pop = self.pop
+        intervals = np.array([0]+self.config.vaccIntervals+[0])
+        vaccDate = np.where((pop.vacc>0) & (pop.vacc<4) & ((i+1-pop.vaccDate)<=intervals[pop.vacc]),pop.vaccDate,NONE)
+        keys = np.column_stack([pop.vacc,pop.conf,pop.active,pop.rec,vaccDate,pop.recDate,pop.confDate,pop.variant,pop.immune[:],pop.immDate,pop.lossDate]).astype(np.int32)
+        keys = np.ascontiguousarray(keys).view(np.dtype((np.void,keys.dtype.itemsize*keys.shape[1]))).ravel()
+        _,first,inverse = np.unique(keys,return_index=True,return_inverse=True)
+        if len(first)==len(pop):
+            return
+        weights = np.bincount(inverse.ravel(),weights=pop.weight,minlength=len(first)).astype(np.int64)
+        pop.compact(first)
+        pop.weight[:] = weights
+        self.calendar.clear(i+1)
+        self._reschedule(np.arange(len(pop)),i+1)
+
+    def apply_events(self,i:int) -> dict:
+        events = super().apply_events(i)
+        if (i+1)%MERGEINTERVAL==0:
+            self._merge(i) #the number of agents only grows by splitting, so it is reduced again regularly
+        return events
@@ -0,0 +1,82 @@
+"""
+Copyright (C) 2023 dwh GmbH - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the MIT license.
+
+You should have received a copy of the MIT license with
+this file. If not, please write to:
+martin.bicher@dwh.at or visit
+https://github.com/dwhGmbH/covid19_model_family/blob/main/LICENSE.txt
+"""
+
+
+import multiprocessing as mp
+import multiprocessing.connection
+
+
+class WorkerPool:
+    def __init__(self,processes:int) -> None:
+        """
+        Minimal process pool for tasks whose inputs cannot be pickled, e.g. simulations holding parsed input data and samplers.
+        Each task runs in a freshly forked worker process which inherits the state of this process, only the results are pickled and sent back through a pipe.
+        Forked workers are not daemonic, so tasks may start worker processes themselves (e.g. sharded simulations). If processes cannot be forked on this platform, the tasks are run sequentially with identical results.
+        :param processes: maximum number of worker processes running at once
+        """
+        self.processes = max(processes,1)
+
+    @staticmethod
+    def _run_task(function,argument,sender) -> None:
+        """
+        Entry point of the worker processes
+        :param function: task function
+        :param argument: argument of the task
+        :param sender: connection to send the result to the parent process
+        :return:
+        """
+        sender.send(function(argument))
+        sender.close()
+
+    def imap(self,function,arguments:list):
+        """
+        Applies the function to all arguments in worker processes. The results are yielded in the order of the arguments, results finished early are kept until it is their turn.
+        :param function: task function taking one argument, its result must be picklable
+        :param arguments: list of task arguments
+        :return: generator of (argument, result) tuples. If a task fails, a RuntimeError is raised and the remaining workers are terminated
+        """
+        arguments = list(arguments)
+        if 'fork' not in mp.get_all_start_methods():
+            print('processes cannot be forked, tasks are run sequentially')
+            for argument in arguments:
+                yield argument,function(argument)
+            return
+        ctx = mp.get_context('fork')
+        running = dict() #receiving connection -> (task number, process)
+        finished = dict() #task number -> result
+        started = 0
+        try:
+            for k in range(len(arguments)):
+                while k not in finished.keys():
+                    while started<len(arguments) and len(running)<self.processes:
+                        receiver,sender = ctx.Pipe(False)
+                        process = ctx.Process(target=self._run_task,args=(function,arguments[started],sender))
+                        process.start()
+                        sender.close()
+                        running[receiver] = (started,process)
+                        started += 1
+                    for receiver in mp.connection.wait(list(running.keys())):
+                        task,process = running.pop(receiver)
+                        try:
+                            finished[task] = receiver.recv() #receive before joining, large results block the sender otherwise
+                        except EOFError:
+                            finished[task] = None
+                        receiver.close()
+                        process.join()
+                        if process.exitcode!=0:
+                            raise RuntimeError('Task {} failed in worker process with exit code {}'.format(arguments[task],process.exitcode))
+                yield arguments[k],finished.pop(k)
+        finally:
+            # stops the remaining workers if a task failed or the results are not consumed completely
+            for receiver,(task,process) in running.items():
+                process.terminate()
+                process.join()
+                receiver.close()